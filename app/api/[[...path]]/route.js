@@ -2,637 +2,1029 @@ import { NextResponse } from 'next/server';
 import { v4 as uuidv4 } from 'uuid';
 import { isSupabaseConfigured, supabase, supabaseAdmin, getSupabaseStatus } from '@/lib/supabase';
 import { isStripeConfigured, getStripe, getStripeStatus } from '@/lib/stripe';
-import { getWeb3Status, NOVA_TOKEN_ADDRESS, NFT_CONTRACT_ADDRESS, CHAIN_ID } from '@/lib/web3-config';
-import { generateSlug, QR_TYPES, validateDestinationConfig, buildQRUrl } from '@/lib/qr-utils';
-import { getMongoDb, getMemoryStore, getDemoUser } from '@/lib/mongo-fallback';
-import { getUserPlan, createUserPlan, updateUserPlan, checkPlanLimit, getPlanComparison, PLANS, PLAN_LIMITS } from '@/lib/user-plans';
+import { getWeb3Status } from '@/lib/web3-config';
+import { QR_TYPES, validateDestinationConfig, buildQRUrl } from '@/lib/qr-utils';
+import { allocateSlug, allocateSlugs, getSlugAllocatorStats } from '@/lib/slug-allocator';
+import { getMongoDb, getFallbackStore, getDemoUser, isMongoConfigured } from '@/lib/mongo-fallback';
+import { getUserPlan, createUserPlan, updateUserPlan, checkPlanLimit, getPlanComparison, getPlanCacheStats, PLANS, PLAN_LIMITS } from '@/lib/user-plans';
+import { ApiRouter } from '@/lib/api-router';
+import { counter, gauge, onCollect, renderMetrics, METRICS_CONTENT_TYPE } from '@/lib/metrics';
+import { resolveUser, getBearerToken, revokeToken, getAuthCacheStats, signInLocalUser, resolveLocalUser, revokeLocalSession } from '@/lib/auth';
+import { getCachedQr, invalidateQr, getQrCacheStats } from '@/lib/qr-cache';
+import { getScanCounterStats } from '@/lib/scan-counter';
+import { getQrAnalytics, buildAnalyticsResponse, rollupEvents, getAnalyticsWindow } from '@/lib/analytics';
+import { getScanQuotaStats } from '@/lib/scan-quota';
+import { parseListQuery, buildPage } from '@/lib/qr-list';
+import { getImportFormat, parseImport, ImportError, QR_BULK_MAX_ROWS, QR_BULK_INSERT_CHUNK } from '@/lib/qr-import';
+import { parseImageOptions, getImageEtag, renderQrImage, getQrImageCacheStats } from '@/lib/qr-image';
+import { getCachedJson, cachedJsonResponse, serializeJson, matchesEtag, getHttpCacheStats, CACHE_POLICIES } from '@/lib/http-cache';
+import { getNft, getNfts, getListing, isValidTokenId, isIndexerConfigured, getNftIndexerStats, MAX_TOKENS_PER_REQUEST } from '@/lib/nft-indexer';
+import { getRpcStats, RpcError } from '@/lib/chain-rpc';
+import { resolveScan, findActiveQr, toPublicQr } from '@/lib/qr-resolver';
+import { isWebhookConfigured, verifyWebhookEvent, enqueueWebhookEvent, getWebhookStats } from '@/lib/stripe-webhooks';
+import { ensureFiatPrice, provisionFiatPrice, getCheckoutSession, getStripeCatalogStats } from '@/lib/stripe-catalog';
+import { enqueueEvents, normalizeEvent, forgetQrId, getEventIngestStats, MAX_EVENTS_PER_REQUEST } from '@/lib/event-ingest';
+import { getRequestEnrichment, getEnrichmentStats } from '@/lib/event-enrichment';
+import { openEventStream, publishEvents, getEventHubStats } from '@/lib/event-hub';
+import { parseExportQuery, exportQrPages, exportEventPages, exportResponse, QR_EXPORT_COLUMNS, EVENT_EXPORT_COLUMNS } from '@/lib/qr-export';
+import { getUserAgentStats } from '@/lib/user-agent';
 
 // CORS headers
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-  'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+  'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key',
+  'Access-Control-Expose-Headers': 'Server-Timing',
 };
 
-// Helper to get path segments
-function getPathSegments(request) {
-  const url = new URL(request.url);
-  const path = url.pathname.replace('/api/', '').replace('/api', '');
-  return path.split('/').filter(Boolean);
-}
-
-// Memory store for demo mode
-let demoQrCodes = [];
-let demoEvents = [];
+// Last demo sign-in, used for requests without a token when the memory store
+// backs demo mode (MongoDB always needs a session token)
 let demoSession = null;
-let demoUserPlans = new Map();
+
+const router = new ApiRouter({ prefix: '/api', headers: corsHeaders });
+
+// Optional bearer token for GET /api/metrics
+const METRICS_TOKEN = process.env.METRICS_TOKEN;
+
+// Cache and write-behind buffer state, copied into /api/metrics on each scrape
+const cacheEntries = gauge('cache_entries', 'Entries held per in-process cache', ['cache']);
+const cacheLookups = counter('cache_lookups_total', 'Cache lookups by result', ['cache', 'result']);
+const cacheEvictions = counter('cache_evictions_total', 'Entries evicted to stay within maxEntries', ['cache']);
+const bufferDepth = gauge('write_buffer_depth', 'Items waiting in write-behind buffers', ['buffer']);
+const bufferFlushes = counter('write_buffer_flushes_total', 'Write-behind flushes by outcome', ['buffer', 'outcome']);
+const eventsDropped = counter('events_dropped_total', 'Analytics events dropped because the buffer was full');
+
+onCollect('caches', () => {
+  const caches = {
+    qr: getQrCacheStats(),
+    qrImages: getQrImageCacheStats(),
+    auth: getAuthCacheStats(),
+    plans: getPlanCacheStats(),
+    http: getHttpCacheStats(),
+    userAgents: getUserAgentStats()
+  };
+  for (const [cache, stats] of Object.entries(caches)) {
+    cacheEntries.set({ cache }, stats.size);
+    cacheLookups.set({ cache, result: 'hit' }, stats.hits);
+    cacheLookups.set({ cache, result: 'miss' }, stats.misses);
+    cacheEvictions.set({ cache }, stats.evictions);
+  }
+  
+  const scans = getScanCounterStats();
+  const events = getEventIngestStats();
+  const webhooks = getWebhookStats();
+  bufferDepth.set({ buffer: 'scans' }, scans.pendingScans);
+  bufferDepth.set({ buffer: 'events' }, events.buffered);
+  bufferDepth.set({ buffer: 'webhooks' }, webhooks.queued);
+  eventsDropped.set({}, events.dropped);
+  for (const [buffer, stats] of Object.entries({ scans, events, webhooks })) {
+    bufferFlushes.set({ buffer, outcome: 'ok' }, stats.flushes);
+    bufferFlushes.set({ buffer, outcome: 'failed' }, stats.failedFlushes);
+  }
+});
 
 // =============================================
-// HANDLERS
+// MIDDLEWARE
 // =============================================
 
-export async function OPTIONS() {
-  return NextResponse.json({}, { headers: corsHeaders });
+// Without Supabase, resolve the session token against the fallback store
+// (the memory store falls back to the last demo sign-in)
+async function resolveFallbackUser(ctx) {
+  const store = await getFallbackStore();
+  const user = await ctx.time('auth', () => resolveLocalUser(ctx.request, store));
+  ctx.user = user || (store.persistent ? null : demoSession);
+  return store;
 }
 
-export async function GET(request) {
-  const segments = getPathSegments(request);
-  const url = new URL(request.url);
-  
-  try {
-    // GET /api/status - System status
-    if (segments[0] === 'status') {
-      return NextResponse.json({
-        supabase: getSupabaseStatus(),
-        stripe: getStripeStatus(),
-        web3: getWeb3Status(),
-        demo: !isSupabaseConfigured
-      }, { headers: corsHeaders });
+// Resolve the user for ctx.user, answering 401 without one (the demo memory
+// store lets anonymous requests through with ctx.user = null)
+async function requireUser(ctx) {
+  if (!(isSupabaseConfigured && supabase)) {
+    const store = await resolveFallbackUser(ctx);
+    if (!ctx.user && store.persistent) {
+      return ctx.json({ error: 'Unauthorized' }, { status: 401 });
     }
+    return;
+  }
+  ctx.user = await ctx.time('auth', () => resolveUser(ctx.request));
+  if (!ctx.user) {
+    return ctx.json({ error: 'Unauthorized' }, { status: 401 });
+  }
+}
 
-    // GET /api/plans - Get plan comparison data
-    if (segments[0] === 'plans' && !segments[1]) {
-      return NextResponse.json(getPlanComparison(), { headers: corsHeaders });
-    }
+// Like requireUser, but anonymous requests carry on with ctx.user = null
+async function optionalUser(ctx) {
+  if (isSupabaseConfigured && supabase) {
+    ctx.user = await ctx.time('auth', () => resolveUser(ctx.request));
+  } else {
+    await resolveFallbackUser(ctx);
+  }
+}
 
-    // GET /api/user/plan - Get current user's plan
-    if (segments[0] === 'user' && segments[1] === 'plan') {
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        const plan = await getUserPlan(user.id);
-        return NextResponse.json({ plan }, { headers: corsHeaders });
-      }
-      // Demo mode
-      if (demoSession) {
-        const plan = await getUserPlan(demoSession.id);
-        return NextResponse.json({ plan, isDemo: true }, { headers: corsHeaders });
-      }
-      return NextResponse.json({ error: 'Not logged in' }, { status: 401, headers: corsHeaders });
+// =============================================
+// ROUTES
+// =============================================
+
+// GET /api/status - System configuration status (fixed until the next deploy)
+router.get('/status', async (ctx) => {
+  const entry = getCachedJson('status', () => ({
+    supabase: getSupabaseStatus(),
+    stripe: getStripeStatus(),
+    web3: getWeb3Status(),
+    storage: isSupabaseConfigured ? 'supabase' : isMongoConfigured ? 'mongodb' : 'memory',
+    demo: !isSupabaseConfigured
+  }));
+  return cachedJsonResponse(ctx.request, entry, CACHE_POLICIES.config);
+});
+
+// GET /api/status/stats - Live cache, buffer, quota and per-route latency stats
+router.get('/status/stats', async (ctx) => {
+  return ctx.json({
+    cache: {
+      qr: getQrCacheStats(),
+      qrImages: getQrImageCacheStats(),
+      slugs: getSlugAllocatorStats(),
+      auth: getAuthCacheStats(),
+      plans: getPlanCacheStats(),
+      http: getHttpCacheStats()
+    },
+    routes: router.stats(),
+    stripe: {
+      catalog: getStripeCatalogStats(),
+      webhooks: getWebhookStats()
+    },
+    chain: {
+      indexer: getNftIndexerStats(),
+      rpc: getRpcStats()
+    },
+    buffers: {
+      scans: getScanCounterStats(),
+      events: getEventIngestStats()
+    },
+    quotas: {
+      scans: getScanQuotaStats()
+    },
+    enrichment: getEnrichmentStats(),
+    streams: getEventHubStats()
+  }, { headers: { 'Cache-Control': 'no-store' } });
+});
+
+// GET /api/metrics - Prometheus metrics (bearer METRICS_TOKEN when set)
+router.get('/metrics', async (ctx) => {
+  if (METRICS_TOKEN && getBearerToken(ctx.request) !== METRICS_TOKEN) {
+    return ctx.json({ error: 'Unauthorized' }, { status: 401 });
+  }
+  const body = ctx.time('serialize', renderMetrics);
+  return new NextResponse(body, {
+    headers: { 'Content-Type': METRICS_CONTENT_TYPE, 'Cache-Control': 'no-store' }
+  });
+});
+
+// GET /api/plans - Get plan comparison data
+router.get('/plans', async (ctx) => {
+  return cachedJsonResponse(ctx.request, getCachedJson('plans', getPlanComparison), CACHE_POLICIES.catalog);
+});
+
+// GET /api/user/plan - Get current user's plan
+router.get('/user/plan', requireUser, async (ctx) => {
+  if (isSupabaseConfigured && supabase) {
+    const plan = await getUserPlan(ctx.user.id);
+    return ctx.json({ plan });
+  }
+  // Demo mode
+  if (ctx.user) {
+    const plan = await getUserPlan(ctx.user.id);
+    return ctx.json({ plan, isDemo: true });
+  }
+  return ctx.json({ error: 'Not logged in' }, { status: 401 });
+});
+
+// GET /api/auth/session - Get current session
+router.get('/auth/session', optionalUser, async (ctx) => {
+  if (isSupabaseConfigured && supabase) {
+    if (ctx.user) {
+      return ctx.json({ user: ctx.user, isDemo: false });
     }
+    return ctx.json({ user: null });
+  }
+  // Demo mode
+  return ctx.json({ 
+    user: ctx.user || null, 
+    isDemo: true 
+  });
+});
 
-    // GET /api/auth/session - Get current session
-    if (segments[0] === 'auth' && segments[1] === 'session') {
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (authHeader) {
-          const token = authHeader.replace('Bearer ', '');
-          const { data: { user }, error } = await supabase.auth.getUser(token);
-          if (user) {
-            return NextResponse.json({ user, isDemo: false }, { headers: corsHeaders });
-          }
-        }
-        return NextResponse.json({ user: null }, { headers: corsHeaders });
-      }
-      // Demo mode
-      return NextResponse.json({ 
-        user: demoSession || null, 
-        isDemo: true 
-      }, { headers: corsHeaders });
+// GET /api/qr - List user's QR codes (?limit=&cursor=&fields=&view=summary)
+router.get('/qr', requireUser, async (ctx) => {
+  const query = parseListQuery(ctx.searchParams);
+  if (query.error) {
+    return ctx.json({ error: query.error }, { status: 400 });
+  }
+  const { limit, cursor, fields } = query;
+
+  if (isSupabaseConfigured && supabase) {
+    let listQuery = supabase
+      .from('qr_codes')
+      .select(fields ? fields.join(',') : '*')
+      .eq('user_id', ctx.user.id);
+    if (cursor) {
+      // Keyset: rows strictly after (created_at, id) in newest-first order
+      listQuery = listQuery.or(
+        `created_at.lt."${cursor.createdAt}",and(created_at.eq."${cursor.createdAt}",id.lt.${cursor.id})`
+      );
     }
+    const { data, error } = await listQuery
+      .order('created_at', { ascending: false })
+      .order('id', { ascending: false })
+      .limit(limit + 1);
+    
+    if (error) throw error;
+    return ctx.json(buildPage(data || [], limit));
+  }
+  // Demo mode
+  const store = await getFallbackStore();
+  const rows = await store.listQrsPage({ userId: ctx.user?.id, cursor, limit, fields });
+  return ctx.json({ ...buildPage(rows, limit), isDemo: true });
+});
 
-    // GET /api/qr - List user's QR codes
-    if (segments[0] === 'qr' && !segments[1]) {
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        const { data, error } = await supabase
-          .from('qr_codes')
-          .select('*')
-          .eq('user_id', user.id)
-          .order('created_at', { ascending: false });
-        
-        if (error) throw error;
-        return NextResponse.json({ qrCodes: data }, { headers: corsHeaders });
-      }
-      // Demo mode
-      return NextResponse.json({ qrCodes: demoQrCodes, isDemo: true }, { headers: corsHeaders });
+// GET /api/stream - Server-Sent Events: live scan counters and events for the user's codes
+router.get('/stream', requireUser, async (ctx) => {
+  const stream = openEventStream(ctx.user?.id || null, ctx.request.signal);
+  if (!stream) {
+    return ctx.json({ 
+      error: 'Too many live connections, retry later' 
+    }, { status: 503, headers: { 'Retry-After': '5' } });
+  }
+  return new NextResponse(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream; charset=utf-8',
+      // no-transform keeps compression middleware from buffering the stream
+      'Cache-Control': 'no-cache, no-transform',
+      'X-Accel-Buffering': 'no'
     }
+  });
+});
 
-    // GET /api/qr/[slug] - Get QR by slug (public)
-    if (segments[0] === 'qr' && segments[1]) {
-      const slug = segments[1];
-      
-      if (isSupabaseConfigured && supabaseAdmin) {
-        const { data, error } = await supabaseAdmin
-          .from('qr_codes')
-          .select('*')
-          .eq('slug', slug)
-          .eq('is_active', true)
-          .single();
-        
-        if (error || !data) {
-          return NextResponse.json({ error: 'QR code not found' }, { status: 404, headers: corsHeaders });
-        }
-        
-        // Increment scan count
-        await supabaseAdmin.rpc('increment_scan_count', { qr_slug: slug });
-        
-        return NextResponse.json({ qr: data }, { headers: corsHeaders });
-      }
-      // Demo mode
-      const qr = demoQrCodes.find(q => q.slug === slug && q.is_active);
-      if (!qr) {
-        return NextResponse.json({ error: 'QR code not found' }, { status: 404, headers: corsHeaders });
+// GET /api/export/qr?format=csv|ndjson&from=&to= - Stream the user's QR codes
+router.get('/export/qr', requireUser, async (ctx) => {
+  const query = parseExportQuery(ctx.searchParams);
+  if (query.error) {
+    return ctx.json({ error: query.error }, { status: 400 });
+  }
+  const pages = exportQrPages({ userId: ctx.user?.id, since: query.since, until: query.until });
+  return exportResponse(ctx.request, pages, { kind: 'qr', columns: QR_EXPORT_COLUMNS, format: query.format });
+});
+
+// GET /api/export/events?format=csv|ndjson&from=&to=&slug=&event_type= - Stream events for the user's codes (or one code)
+router.get('/export/events', requireUser, async (ctx) => {
+  const query = parseExportQuery(ctx.searchParams);
+  if (query.error) {
+    return ctx.json({ error: query.error }, { status: 400 });
+  }
+  
+  let qr = null;
+  if (query.slug) {
+    if (isSupabaseConfigured && supabaseAdmin) {
+      const { data } = await supabaseAdmin
+        .from('qr_codes')
+        .select('id, slug')
+        .eq('slug', query.slug)
+        .eq('user_id', ctx.user.id)
+        .maybeSingle();
+      qr = data;
+    } else {
+      const store = await getFallbackStore();
+      qr = await store.getQrBySlug(query.slug);
+      if (qr && ctx.user && qr.user_id !== ctx.user.id) {
+        qr = null;
       }
-      qr.scan_count = (qr.scan_count || 0) + 1;
-      return NextResponse.json({ qr, isDemo: true }, { headers: corsHeaders });
     }
+    if (!qr) {
+      return ctx.json({ error: 'QR code not found' }, { status: 404 });
+    }
+  }
+  
+  // Same window as analytics: nothing older than the plan's retention
+  let { since } = query;
+  if (ctx.user) {
+    const plan = await getUserPlan(ctx.user.id);
+    const window = getAnalyticsWindow(plan.limits.analyticsRetentionDays);
+    since = window.since > since ? window.since : since;
+  }
+  
+  const pages = exportEventPages({ userId: ctx.user?.id, qr, since, until: query.until, eventType: query.eventType });
+  return exportResponse(ctx.request, pages, { kind: 'events', columns: EVENT_EXPORT_COLUMNS, format: query.format });
+});
 
-    // GET /api/qr/[slug]/analytics - Get QR analytics
-    if (segments[0] === 'qr' && segments[2] === 'analytics') {
-      const slug = segments[1];
-      
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        // Get QR code
-        const { data: qr } = await supabase
-          .from('qr_codes')
-          .select('*')
-          .eq('slug', slug)
-          .eq('user_id', user.id)
-          .single();
-        
-        if (!qr) {
-          return NextResponse.json({ error: 'QR code not found' }, { status: 404, headers: corsHeaders });
-        }
-        
-        // Get events
-        const { data: events } = await supabase
-          .from('qr_events')
-          .select('*')
-          .eq('qr_code_id', qr.id)
-          .order('created_at', { ascending: false })
-          .limit(100);
-        
-        return NextResponse.json({ 
-          qr, 
-          events: events || [],
-          stats: {
-            totalScans: qr.scan_count || 0,
-            recentEvents: events?.length || 0
-          }
-        }, { headers: corsHeaders });
-      }
-      // Demo mode
-      const qr = demoQrCodes.find(q => q.slug === slug);
-      const events = demoEvents.filter(e => e.qr_code_id === qr?.id);
-      return NextResponse.json({ 
-        qr, 
-        events,
-        stats: { totalScans: qr?.scan_count || 0, recentEvents: events.length },
-        isDemo: true 
-      }, { headers: corsHeaders });
+// GET /api/qr/[slug]/analytics - Get QR analytics (served from rollups)
+router.get('/qr/:slug/analytics', requireUser, async (ctx) => {
+  const { slug } = ctx.params;
+  const requestedDays = parseInt(ctx.searchParams.get('days') || '', 10);
+  
+  if (isSupabaseConfigured && supabase) {
+    // Get QR code
+    const { data: qr } = await supabase
+      .from('qr_codes')
+      .select('*')
+      .eq('slug', slug)
+      .eq('user_id', ctx.user.id)
+      .single();
+    
+    if (!qr) {
+      return ctx.json({ error: 'QR code not found' }, { status: 404 });
     }
+    
+    const plan = await getUserPlan(ctx.user.id);
+    const analytics = await getQrAnalytics(qr, plan.limits.analyticsRetentionDays, requestedDays);
+    return ctx.json(analytics);
+  }
+  // Demo mode - roll up the in-memory events on the fly
+  const store = await getFallbackStore();
+  const qr = await store.getQrBySlug(slug);
+  if (!qr || (ctx.user && qr.user_id !== ctx.user.id)) {
+    return ctx.json({ error: 'QR code not found' }, { status: 404 });
+  }
+  const plan = await getUserPlan(qr.user_id);
+  const { days, since, hourlySince } = getAnalyticsWindow(plan.limits.analyticsRetentionDays, requestedDays);
+  const events = await store.getEventsForQr(qr.id);
+  const daily = rollupEvents(events, 'day').filter(row => new Date(row.bucket) >= since);
+  const hourly = rollupEvents(events, 'hour').filter(row => new Date(row.bucket) >= hourlySince);
+  return ctx.json({ 
+    ...buildAnalyticsResponse(qr, days, daily, hourly),
+    isDemo: true 
+  });
+});
 
-    // GET /api/nft/[id] - Get NFT details (mock for now)
-    if (segments[0] === 'nft' && segments[1]) {
-      const nftId = segments[1];
-      // TODO: Fetch from contract or indexer
-      return NextResponse.json({
-        nft: {
-          id: nftId,
-          name: `NovaTok NFT #${nftId}`,
-          description: 'A unique NovaTok collectible',
-          image: `https://picsum.photos/seed/${nftId}/400/400`,
-          contract: NFT_CONTRACT_ADDRESS,
-          chainId: CHAIN_ID
-        }
-      }, { headers: corsHeaders });
+// GET /api/qr/[slug]/image - Print-ready QR image (?format=svg|png&size=&margin=&ecc=)
+router.get('/qr/:slug/image', async (ctx) => {
+  const { slug } = ctx.params;
+  const options = parseImageOptions(ctx.searchParams);
+  if (options.error) {
+    return ctx.json({ error: options.error }, { status: 400 });
+  }
+  
+  let exists;
+  if (isSupabaseConfigured && supabaseAdmin) {
+    exists = !!getCachedQr(slug);
+    if (!exists) {
+      const { data, error } = await supabaseAdmin
+        .from('qr_codes')
+        .select('id')
+        .eq('slug', slug)
+        .maybeSingle();
+      if (error) throw error;
+      exists = !!data;
     }
+  } else {
+    const store = await getFallbackStore();
+    exists = !!(await store.getQrBySlug(slug));
+  }
+  if (!exists) {
+    return ctx.json({ error: 'QR code not found' }, { status: 404 });
+  }
+  
+  const qrUrl = buildQRUrl(slug, process.env.NEXT_PUBLIC_BASE_URL || ctx.url.origin);
+  const etag = getImageEtag(qrUrl, options);
+  const imageHeaders = {
+    'ETag': etag,
+    'Cache-Control': 'public, max-age=86400'
+  };
+  if (matchesEtag(ctx.request.headers.get('if-none-match'), etag)) {
+    return new NextResponse(null, { status: 304, headers: imageHeaders });
+  }
+  
+  const image = ctx.time('render', () => renderQrImage(qrUrl, options));
+  return new NextResponse(image.body, {
+    headers: { ...imageHeaders, 'Content-Type': image.contentType }
+  });
+});
 
-    // GET /api/marketplace/[id] - Get marketplace listing
-    if (segments[0] === 'marketplace' && segments[1]) {
-      const listingId = segments[1];
-      // TODO: Fetch from marketplace contract or indexer
-      return NextResponse.json({
-        listing: {
-          id: listingId,
-          nftId: listingId,
-          name: `NovaTok NFT #${listingId}`,
-          description: 'Available on NovaTok Marketplace',
-          image: `https://picsum.photos/seed/listing${listingId}/400/400`,
-          price: '0.01',
-          currency: 'ETH',
-          seller: '0x0000...0000',
-          contract: NFT_CONTRACT_ADDRESS,
-          chainId: CHAIN_ID
-        }
-      }, { headers: corsHeaders });
+// GET /api/qr/[slug] - Get QR by slug (public)
+router.get('/qr/:slug', async (ctx) => {
+  const result = await resolveScan(ctx.params.slug);
+  if (!result) {
+    return ctx.json({ error: 'QR code not found' }, { status: 404 });
+  }
+  
+  if (result.quotaExceeded) {
+    return ctx.json({ 
+      error: result.reason,
+      quotaExceeded: true,
+      ...(result.isDemo && { isDemo: true })
+    }, { status: 429 });
+  }
+  
+  // Public: owner, counters and timestamps stay private
+  const qr = toPublicQr(result.qr);
+  if (result.isDemo) {
+    return ctx.json({ qr, isDemo: true });
+  }
+  const headers = result.softLimitReached ? { 'X-Scan-Quota': 'soft-limit' } : {};
+  return ctx.json({ qr }, { headers });
+});
+
+// GET /api/nft?ids=1,2,3 - Get several NFTs at once (one batched chain read)
+router.get('/nft', async (ctx) => {
+  const ids = (ctx.searchParams.get('ids') || '').split(',').map(id => id.trim()).filter(Boolean);
+  if (ids.length === 0 || ids.length > MAX_TOKENS_PER_REQUEST) {
+    return ctx.json({ error: `Pass between 1 and ${MAX_TOKENS_PER_REQUEST} comma-separated ids` }, { status: 400 });
+  }
+  if (isIndexerConfigured && !ids.every(isValidTokenId)) {
+    return ctx.json({ error: 'Token ids must be unsigned integers' }, { status: 400 });
+  }
+  const results = await getNfts(ids);
+  return ctx.json({
+    nfts: results.map(result => result.nft || { id: result.id, error: result.error })
+  }, { headers: { 'Cache-Control': CACHE_POLICIES.chain } });
+});
+
+// GET /api/nft/[id] - Get NFT details (indexed from the chain when configured)
+router.get('/nft/:id', async (ctx) => {
+  const nftId = ctx.params.id;
+  if (isIndexerConfigured && !isValidTokenId(nftId)) {
+    return ctx.json({ error: 'Token id must be an unsigned integer' }, { status: 400 });
+  }
+  let result;
+  try {
+    result = await getNft(nftId);
+  } catch (error) {
+    // A revert means the token does not exist (or was burned)
+    if (error instanceof RpcError) {
+      return ctx.json({ error: 'NFT not found' }, { status: 404 });
     }
+    throw error;
+  }
+  if (result.placeholder) {
+    const entry = getCachedJson(`nft:${nftId}`, () => ({ nft: result.nft }));
+    return cachedJsonResponse(ctx.request, entry, CACHE_POLICIES.immutable);
+  }
+  const entry = ctx.time('serialize', () => serializeJson({ nft: result.nft, stale: result.stale }, result.fetchedAt));
+  return cachedJsonResponse(ctx.request, entry, CACHE_POLICIES.chain);
+});
 
-    return NextResponse.json({ error: 'Not found' }, { status: 404, headers: corsHeaders });
+// GET /api/marketplace/[id] - Get marketplace listing (indexed from the chain when configured)
+router.get('/marketplace/:id', async (ctx) => {
+  const listingId = ctx.params.id;
+  if (isIndexerConfigured && !isValidTokenId(listingId)) {
+    return ctx.json({ error: 'Listing id must be an unsigned integer' }, { status: 400 });
+  }
+  let result;
+  try {
+    result = await getListing(listingId);
   } catch (error) {
-    console.error('GET Error:', error);
-    return NextResponse.json({ error: error.message }, { status: 500, headers: corsHeaders });
+    if (error instanceof RpcError) {
+      return ctx.json({ error: 'Listing not found' }, { status: 404 });
+    }
+    throw error;
   }
-}
+  if (result.placeholder) {
+    const entry = getCachedJson(`marketplace:${listingId}`, () => ({ listing: result.listing }));
+    return cachedJsonResponse(ctx.request, entry, CACHE_POLICIES.immutable);
+  }
+  const entry = ctx.time('serialize', () => serializeJson({ listing: result.listing, stale: result.stale }, result.fetchedAt));
+  return cachedJsonResponse(ctx.request, entry, CACHE_POLICIES.chain);
+});
 
-export async function POST(request) {
-  const segments = getPathSegments(request);
+// POST /api/qr/bulk - Create QR codes from a streamed CSV or NDJSON body
+// (reads the body stream itself rather than through ctx.readJson)
+router.post('/qr/bulk', requireUser, async (ctx) => {
+  const format = getImportFormat(ctx.request.headers.get('content-type'));
+  if (!format) {
+    return ctx.json({ 
+      error: 'Send text/csv or application/x-ndjson'
+    }, { status: 415 });
+  }
   
+  const userId = ctx.user?.id || 'demo';
+  
+  let parsed;
   try {
-    const body = await request.json().catch(() => ({}));
-
-    // POST /api/auth/signup - Sign up
-    if (segments[0] === 'auth' && segments[1] === 'signup') {
-      const { email, password } = body;
+    parsed = await parseImport(ctx.request.body || [], format);
+  } catch (error) {
+    if (error instanceof ImportError) {
+      return ctx.json({ error: error.message }, { status: 400 });
+    }
+    throw error;
+  }
+  const { rows, errors, tooMany } = parsed;
+  if (tooMany) {
+    return ctx.json({ 
+      error: `Imports are limited to ${QR_BULK_MAX_ROWS} rows per request`
+    }, { status: 413 });
+  }
+  if (rows.length === 0) {
+    return ctx.json({ error: 'No valid rows to import', errors }, { status: 400 });
+  }
+  
+  const store = isSupabaseConfigured && supabase ? null : await getFallbackStore();
+  
+  // One count and one plan check for the whole batch
+  let currentQrCount;
+  if (store) {
+    currentQrCount = await store.countQrsByUser(userId);
+  } else {
+    const { count, error } = await supabase
+      .from('qr_codes')
+      .select('*', { count: 'exact', head: true })
+      .eq('user_id', userId);
+    if (error) throw error;
+    currentQrCount = count || 0;
+  }
+  const limitCheck = await checkPlanLimit(userId, 'create_qr', { currentQrCount, requestedCount: rows.length });
+  if (!limitCheck.allowed) {
+    return ctx.json({ 
+      error: limitCheck.reason,
+      limitReached: true,
+      remaining: limitCheck.remaining,
+      requested: rows.length,
+      errors
+    }, { status: 403 });
+  }
+  
+  // Slugs for the whole batch come from one counter lease
+  const slugs = await allocateSlugs(rows.length);
+  const created = [];
+  const baseUrl = process.env.NEXT_PUBLIC_BASE_URL;
+  for (let i = 0; i < rows.length; i += QR_BULK_INSERT_CHUNK) {
+    const chunk = rows.slice(i, i + QR_BULK_INSERT_CHUNK);
+    const chunkSlugs = slugs.slice(i, i + QR_BULK_INSERT_CHUNK);
+    try {
+      const now = new Date().toISOString();
+      const newQrs = chunk.map(({ qr }, j) => ({
+        ...(store ? { id: uuidv4(), created_at: now, updated_at: now } : {}),
+        user_id: userId,
+        ...qr,
+        slug: chunkSlugs[j],
+        is_active: true,
+        scan_count: 0
+      }));
       
-      if (isSupabaseConfigured && supabase) {
-        const { data, error } = await supabase.auth.signUp({
-          email,
-          password,
-        });
-        
-        if (error) {
-          return NextResponse.json({ error: error.message }, { status: 400, headers: corsHeaders });
-        }
-        
-        // Create user plan (in case trigger didn't fire or for safety)
-        if (data.user) {
-          try {
-            await createUserPlan(data.user.id, email);
-          } catch (planError) {
-            console.log('Plan creation handled by trigger or already exists');
-          }
-        }
-        
-        return NextResponse.json({ 
-          user: data.user, 
-          session: data.session,
-          message: 'Check your email for confirmation'
-        }, { headers: corsHeaders });
+      let inserted;
+      if (store) {
+        inserted = await store.insertQrs(newQrs);
+      } else {
+        const { data, error } = await supabase
+          .from('qr_codes')
+          .insert(newQrs)
+          .select('id, slug');
+        if (error) throw error;
+        inserted = data;
       }
-      // Demo mode - instant signup
-      const userId = uuidv4();
-      demoSession = {
-        id: userId,
-        email: email || 'demo@novatok.app',
-        isDemo: true
-      };
-      
-      // Create demo user plan
-      await createUserPlan(userId, email);
       
-      return NextResponse.json({ 
-        user: demoSession, 
-        session: { access_token: 'demo-token' },
-        isDemo: true 
-      }, { headers: corsHeaders });
+      const idsBySlug = new Map(inserted.map(qr => [qr.slug, qr.id]));
+      chunk.forEach(({ row }, j) => {
+        const slug = chunkSlugs[j];
+        created.push({ row, id: idsBySlug.get(slug), slug, qrUrl: buildQRUrl(slug, baseUrl) });
+      });
+    } catch (error) {
+      // Earlier chunks stay committed; report this and later rows as not created
+      console.error('Error importing QR codes:', error);
+      rows.slice(i).forEach(({ row }) => errors.push({ row, error: 'Insert failed; row was not created' }));
+      break;
     }
+  }
+  
+  errors.sort((a, b) => a.row - b.row);
+  return ctx.json({ 
+    created,
+    errors,
+    summary: { received: created.length + errors.length, created: created.length, failed: errors.length },
+    ...(store ? { isDemo: true } : {})
+  }, { status: created.length > 0 ? 201 : 500 });
+});
 
-    // POST /api/auth/login - Login
-    if (segments[0] === 'auth' && segments[1] === 'login') {
-      const { email, password } = body;
-      
-      if (isSupabaseConfigured && supabase) {
-        const { data, error } = await supabase.auth.signInWithPassword({
-          email,
-          password,
-        });
-        
-        if (error) {
-          return NextResponse.json({ error: error.message }, { status: 400, headers: corsHeaders });
-        }
-        
-        // Ensure user plan exists (migration safety)
-        if (data.user) {
-          try {
-            await createUserPlan(data.user.id, email);
-          } catch (planError) {
-            // Plan already exists, which is fine
-          }
-        }
-        
-        return NextResponse.json({ 
-          user: data.user, 
-          session: data.session 
-        }, { headers: corsHeaders });
+// POST /api/auth/signup - Sign up
+router.post('/auth/signup', async (ctx) => {
+  const body = await ctx.readJson();
+  const { email, password } = body;
+  
+  if (isSupabaseConfigured && supabase) {
+    const { data, error } = await supabase.auth.signUp({
+      email,
+      password,
+    });
+    
+    if (error) {
+      return ctx.json({ error: error.message }, { status: 400 });
+    }
+    
+    // Create user plan (in case trigger didn't fire or for safety)
+    if (data.user) {
+      try {
+        await createUserPlan(data.user.id, email);
+      } catch (planError) {
+        console.log('Plan creation handled by trigger or already exists');
       }
-      // Demo mode - instant login
-      const userId = uuidv4();
-      demoSession = {
-        id: userId,
-        email: email || 'demo@novatok.app',
-        isDemo: true
-      };
-      
-      // Create demo user plan
-      await createUserPlan(userId, email);
-      
-      return NextResponse.json({ 
-        user: demoSession, 
-        session: { access_token: 'demo-token' },
-        isDemo: true 
-      }, { headers: corsHeaders });
     }
+    
+    return ctx.json({ 
+      user: data.user, 
+      session: data.session,
+      message: 'Check your email for confirmation'
+    });
+  }
+  // MongoDB accounts or demo sign-up (see signInLocalUser)
+  const store = await getFallbackStore();
+  const result = await signInLocalUser(store, { email, password }, { signup: true });
+  if (result.error) {
+    return ctx.json({ error: result.error }, { status: 400 });
+  }
+  if (!store.persistent) {
+    demoSession = result.user;
+  }
+  
+  // Create the user's plan (keeps an existing one)
+  await createUserPlan(result.user.id, result.user.email);
+  
+  return ctx.json({ 
+    user: result.user, 
+    session: result.session,
+    isDemo: true 
+  });
+});
 
-    // POST /api/auth/logout - Logout
-    if (segments[0] === 'auth' && segments[1] === 'logout') {
-      if (isSupabaseConfigured && supabase) {
-        await supabase.auth.signOut();
+// POST /api/auth/login - Login
+router.post('/auth/login', async (ctx) => {
+  const body = await ctx.readJson();
+  const { email, password } = body;
+  
+  if (isSupabaseConfigured && supabase) {
+    const { data, error } = await supabase.auth.signInWithPassword({
+      email,
+      password,
+    });
+    
+    if (error) {
+      return ctx.json({ error: error.message }, { status: 400 });
+    }
+    
+    // Ensure user plan exists (migration safety)
+    if (data.user) {
+      try {
+        await createUserPlan(data.user.id, email);
+      } catch (planError) {
+        // Plan already exists, which is fine
       }
-      demoSession = null;
-      return NextResponse.json({ success: true }, { headers: corsHeaders });
     }
+    
+    return ctx.json({ 
+      user: data.user, 
+      session: data.session 
+    });
+  }
+  // MongoDB accounts or demo sign-in (see signInLocalUser)
+  const store = await getFallbackStore();
+  const result = await signInLocalUser(store, { email, password }, { signup: false });
+  if (result.error) {
+    return ctx.json({ error: result.error }, { status: 400 });
+  }
+  if (!store.persistent) {
+    demoSession = result.user;
+  }
+  
+  // Create the user's plan (keeps an existing one)
+  await createUserPlan(result.user.id, result.user.email);
+  
+  return ctx.json({ 
+    user: result.user, 
+    session: result.session,
+    isDemo: true 
+  });
+});
 
-    // POST /api/qr - Create QR code
-    if (segments[0] === 'qr' && !segments[1]) {
-      const { name, type, destination_config } = body;
-      
-      // Validate
-      if (!name || !type) {
-        return NextResponse.json({ error: 'Name and type are required' }, { status: 400, headers: corsHeaders });
-      }
-      
-      const validation = validateDestinationConfig(type, destination_config || {});
-      if (!validation.valid) {
-        return NextResponse.json({ error: validation.error }, { status: 400, headers: corsHeaders });
-      }
-      
-      const slug = generateSlug();
-      const qrUrl = buildQRUrl(slug, process.env.NEXT_PUBLIC_BASE_URL);
-      
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        // Check plan limits
-        const { count: currentQrCount } = await supabase
-          .from('qr_codes')
-          .select('*', { count: 'exact', head: true })
-          .eq('user_id', user.id);
-        
-        const limitCheck = await checkPlanLimit(user.id, 'create_qr', { currentQrCount: currentQrCount || 0 });
-        if (!limitCheck.allowed) {
-          return NextResponse.json({ 
-            error: limitCheck.reason,
-            limitReached: true 
-          }, { status: 403, headers: corsHeaders });
-        }
-        
-        const { data, error } = await supabase
-          .from('qr_codes')
-          .insert({
-            user_id: user.id,
-            name,
-            slug,
-            type,
-            destination_config: destination_config || {},
-            is_active: true,
-            scan_count: 0
-          })
-          .select()
-          .single();
-        
-        if (error) throw error;
-        
-        return NextResponse.json({ qr: data, qrUrl }, { status: 201, headers: corsHeaders });
-      }
-      // Demo mode - check plan limits
-      const userId = demoSession?.id || 'demo';
-      const currentQrCount = demoQrCodes.filter(q => q.user_id === userId).length;
-      const limitCheck = await checkPlanLimit(userId, 'create_qr', { currentQrCount });
-      if (!limitCheck.allowed) {
-        return NextResponse.json({ 
-          error: limitCheck.reason,
-          limitReached: true,
-          isDemo: true 
-        }, { status: 403, headers: corsHeaders });
-      }
-      
-      const newQr = {
-        id: uuidv4(),
-        user_id: userId,
+// POST /api/auth/logout - Logout
+router.post('/auth/logout', async (ctx) => {
+  if (isSupabaseConfigured && supabase) {
+    await revokeToken(getBearerToken(ctx.request));
+  } else {
+    await revokeLocalSession(getBearerToken(ctx.request), await getFallbackStore());
+  }
+  demoSession = null;
+  return ctx.json({ success: true });
+});
+
+// POST /api/qr - Create QR code
+router.post('/qr', requireUser, async (ctx) => {
+  const body = await ctx.readJson();
+  const { name, type, destination_config } = body;
+  
+  // Validate
+  if (!name || !type) {
+    return ctx.json({ error: 'Name and type are required' }, { status: 400 });
+  }
+  
+  const validation = validateDestinationConfig(type, destination_config || {});
+  if (!validation.valid) {
+    return ctx.json({ error: validation.error }, { status: 400 });
+  }
+  
+  if (isSupabaseConfigured && supabase) {
+    // Check plan limits
+    const { count: currentQrCount } = await supabase
+      .from('qr_codes')
+      .select('*', { count: 'exact', head: true })
+      .eq('user_id', ctx.user.id);
+    
+    const limitCheck = await checkPlanLimit(ctx.user.id, 'create_qr', { currentQrCount: currentQrCount || 0 });
+    if (!limitCheck.allowed) {
+      return ctx.json({ 
+        error: limitCheck.reason,
+        limitReached: true 
+      }, { status: 403 });
+    }
+    
+    const slug = await allocateSlug();
+    const qrUrl = buildQRUrl(slug, process.env.NEXT_PUBLIC_BASE_URL);
+    const { data, error } = await supabase
+      .from('qr_codes')
+      .insert({
+        user_id: ctx.user.id,
         name,
         slug,
         type,
         destination_config: destination_config || {},
         is_active: true,
-        scan_count: 0,
-        created_at: new Date().toISOString(),
-        updated_at: new Date().toISOString()
-      };
-      demoQrCodes.unshift(newQr);
-      return NextResponse.json({ qr: newQr, qrUrl, isDemo: true }, { status: 201, headers: corsHeaders });
+        scan_count: 0
+      })
+      .select()
+      .single();
+    
+    if (error) throw error;
+    
+    // Give fiat codes their Stripe Price now rather than on the first checkout
+    if (type === QR_TYPES.FIAT) {
+      await provisionFiatPrice(data);
     }
+    
+    return ctx.json({ qr: data, qrUrl }, { status: 201 });
+  }
+  // Demo mode - check plan limits
+  const userId = ctx.user?.id || 'demo';
+  const store = await getFallbackStore();
+  const currentQrCount = await store.countQrsByUser(userId);
+  const limitCheck = await checkPlanLimit(userId, 'create_qr', { currentQrCount });
+  if (!limitCheck.allowed) {
+    return ctx.json({ 
+      error: limitCheck.reason,
+      limitReached: true,
+      isDemo: true 
+    }, { status: 403 });
+  }
+  
+  const slug = await allocateSlug();
+  const qrUrl = buildQRUrl(slug, process.env.NEXT_PUBLIC_BASE_URL);
+  const newQr = {
+    id: uuidv4(),
+    user_id: userId,
+    name,
+    slug,
+    type,
+    destination_config: destination_config || {},
+    is_active: true,
+    scan_count: 0,
+    created_at: new Date().toISOString(),
+    updated_at: new Date().toISOString()
+  };
+  await store.insertQr(newQr);
+  if (type === QR_TYPES.FIAT) {
+    await provisionFiatPrice(newQr);
+  }
+  return ctx.json({ qr: newQr, qrUrl, isDemo: true }, { status: 201 });
+});
 
-    // POST /api/qr/[slug]/event - Track event
-    if (segments[0] === 'qr' && segments[2] === 'event') {
-      const slug = segments[1];
-      const { event_type, country, user_agent, metadata } = body;
-      
-      if (isSupabaseConfigured && supabaseAdmin) {
-        // Get QR code ID
-        const { data: qr } = await supabaseAdmin
-          .from('qr_codes')
-          .select('id')
-          .eq('slug', slug)
-          .single();
-        
-        if (qr) {
-          await supabaseAdmin
-            .from('qr_events')
-            .insert({
-              qr_code_id: qr.id,
-              event_type: event_type || 'scan',
-              country,
-              user_agent,
-              metadata: metadata || {}
-            });
-        }
-      } else {
-        // Demo mode
-        const qr = demoQrCodes.find(q => q.slug === slug);
-        if (qr) {
-          demoEvents.push({
-            id: uuidv4(),
-            qr_code_id: qr.id,
-            event_type: event_type || 'scan',
-            country,
-            user_agent,
-            metadata: metadata || {},
-            created_at: new Date().toISOString()
-          });
-        }
-      }
-      
-      return NextResponse.json({ success: true }, { headers: corsHeaders });
+// POST /api/qr/[slug]/event - Track event (or { events: [...] } for a batch)
+router.post('/qr/:slug/event', async (ctx) => {
+  const body = await ctx.readJson();
+  const { slug } = ctx.params;
+  const events = Array.isArray(body?.events) ? body.events : [body];
+  
+  if (events.length > MAX_EVENTS_PER_REQUEST) {
+    return ctx.json({ 
+      error: `At most ${MAX_EVENTS_PER_REQUEST} events per request` 
+    }, { status: 413 });
+  }
+  
+  // Country and user agent come from the request, whatever the body says
+  const enrichment = getRequestEnrichment(ctx.request.headers);
+  
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const result = enqueueEvents(slug, events, enrichment);
+    
+    if (result.accepted === 0 && result.dropped > 0) {
+      return ctx.json({ 
+        success: false, 
+        error: 'Event buffer full, retry later',
+        ...result 
+      }, { status: 503, headers: { 'Retry-After': '1' } });
     }
-
-    // POST /api/stripe/checkout - Create Stripe checkout session
-    if (segments[0] === 'stripe' && segments[1] === 'checkout') {
-      const stripe = await getStripe();
-      
-      if (!stripe) {
-        return NextResponse.json({ 
-          error: 'Stripe not configured',
-          configured: false 
-        }, { status: 400, headers: corsHeaders });
-      }
-      
-      const { amount, currency, productName, successUrl, cancelUrl, qrSlug } = body;
-      
-      const session = await stripe.checkout.sessions.create({
-        payment_method_types: ['card'],
-        line_items: [{
-          price_data: {
-            currency: currency || 'usd',
-            product_data: {
-              name: productName || 'NovaTok Payment',
-            },
-            unit_amount: Math.round((amount || 1) * 100), // Convert to cents
-          },
-          quantity: 1,
-        }],
-        mode: 'payment',
-        success_url: successUrl || `${process.env.NEXT_PUBLIC_BASE_URL}/pay/success?session_id={CHECKOUT_SESSION_ID}`,
-        cancel_url: cancelUrl || `${process.env.NEXT_PUBLIC_BASE_URL}/pay/cancel`,
-        metadata: {
-          qr_slug: qrSlug || ''
-        }
-      });
-      
-      return NextResponse.json({ 
-        sessionId: session.id, 
-        url: session.url 
-      }, { headers: corsHeaders });
+    if (result.accepted === 0 && result.rejected > 0) {
+      return ctx.json({ error: 'Invalid event or event_type', ...result }, { status: 400 });
     }
-
-    return NextResponse.json({ error: 'Not found' }, { status: 404, headers: corsHeaders });
-  } catch (error) {
-    console.error('POST Error:', error);
-    return NextResponse.json({ error: error.message }, { status: 500, headers: corsHeaders });
+    return ctx.json({ success: true, ...result });
   }
-}
-
-export async function PUT(request) {
-  const segments = getPathSegments(request);
   
-  try {
-    const body = await request.json().catch(() => ({}));
+  // Demo mode
+  const store = await getFallbackStore();
+  const qr = await store.getQrBySlug(slug);
+  const rows = [];
+  let rejected = 0;
+  for (const event of events) {
+    const row = normalizeEvent(slug, event, enrichment);
+    if (!row) {
+      rejected++;
+      continue;
+    }
+    const { slug: _slug, ...fields } = row;
+    rows.push({ id: uuidv4(), qr_code_id: qr?.id, ...fields });
+  }
+  const accepted = rows.length;
+  if (qr) {
+    await store.appendEvents(rows);
+    publishEvents(qr.user_id, rows.map(row => ({ slug, ...row })));
+  }
+  if (accepted === 0 && rejected > 0) {
+    return ctx.json({ error: 'Invalid event or event_type', accepted, rejected, dropped: 0 }, { status: 400 });
+  }
+  
+  return ctx.json({ success: true, accepted, rejected, dropped: 0 });
+});
 
-    // PUT /api/qr/[id] - Update QR code
-    if (segments[0] === 'qr' && segments[1]) {
-      const id = segments[1];
-      const { name, destination_config, is_active } = body;
-      
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        const updates = { updated_at: new Date().toISOString() };
-        if (name !== undefined) updates.name = name;
-        if (destination_config !== undefined) updates.destination_config = destination_config;
-        if (is_active !== undefined) updates.is_active = is_active;
-        
-        const { data, error } = await supabase
-          .from('qr_codes')
-          .update(updates)
-          .eq('id', id)
-          .eq('user_id', user.id)
-          .select()
-          .single();
-        
-        if (error) throw error;
-        
-        return NextResponse.json({ qr: data }, { headers: corsHeaders });
-      }
-      // Demo mode
-      const qrIndex = demoQrCodes.findIndex(q => q.id === id);
-      if (qrIndex >= 0) {
-        if (name !== undefined) demoQrCodes[qrIndex].name = name;
-        if (destination_config !== undefined) demoQrCodes[qrIndex].destination_config = destination_config;
-        if (is_active !== undefined) demoQrCodes[qrIndex].is_active = is_active;
-        demoQrCodes[qrIndex].updated_at = new Date().toISOString();
-        return NextResponse.json({ qr: demoQrCodes[qrIndex], isDemo: true }, { headers: corsHeaders });
+// POST /api/stripe/checkout - Create Stripe checkout session
+router.post('/stripe/checkout', async (ctx) => {
+  const body = await ctx.readJson();
+  const stripe = await getStripe();
+  
+  if (!stripe) {
+    return ctx.json({ 
+      error: 'Stripe not configured',
+      configured: false 
+    }, { status: 400 });
+  }
+  
+  const { amount, currency, productName, successUrl, cancelUrl, qrSlug } = body;
+  
+  // One key per page load; a double tap gets the same session back
+  const clientKey = ctx.request.headers.get('idempotency-key');
+  if (clientKey && clientKey.length > 200) {
+    return ctx.json({ error: 'Idempotency-Key must be at most 200 characters' }, { status: 400 });
+  }
+  
+  // Fiat QR codes pay their provisioned Price; the amount comes from the code, not the client
+  let lineItem = null;
+  if (qrSlug) {
+    const found = await findActiveQr(qrSlug);
+    const catalog = found ? await ensureFiatPrice(found.qr) : null;
+    if (catalog) {
+      lineItem = { price: catalog.priceId };
+    }
+  }
+  if (!lineItem) {
+    lineItem = {
+      price_data: {
+        currency: currency || 'usd',
+        product_data: {
+          name: productName || 'NovaTok Payment',
+        },
+        unit_amount: Math.round((amount || 1) * 100), // Convert to cents
       }
-      return NextResponse.json({ error: 'QR code not found' }, { status: 404, headers: corsHeaders });
+    };
+  }
+  
+  const session = await getCheckoutSession({
+    lineItem,
+    clientKey,
+    successUrl: successUrl || `${process.env.NEXT_PUBLIC_BASE_URL}/pay/success?session_id={CHECKOUT_SESSION_ID}`,
+    cancelUrl: cancelUrl || `${process.env.NEXT_PUBLIC_BASE_URL}/pay/cancel`,
+    metadata: {
+      qr_slug: qrSlug || ''
     }
+  });
+  
+  return ctx.json({ 
+    sessionId: session.id, 
+    url: session.url,
+    reused: session.reused
+  });
+});
 
-    return NextResponse.json({ error: 'Not found' }, { status: 404, headers: corsHeaders });
+// POST /api/stripe/webhook - Verify a Stripe event and queue it (applied in the background)
+router.post('/stripe/webhook', async (ctx) => {
+  const stripe = await getStripe();
+  if (!stripe || !isWebhookConfigured) {
+    return ctx.json({ 
+      error: 'Stripe webhooks not configured',
+      configured: false 
+    }, { status: 400 });
+  }
+  
+  // The signature covers the raw body, so it must not be parsed first
+  let event;
+  try {
+    event = await verifyWebhookEvent(await ctx.request.text(), ctx.request.headers.get('stripe-signature'));
   } catch (error) {
-    console.error('PUT Error:', error);
-    return NextResponse.json({ error: error.message }, { status: 500, headers: corsHeaders });
+    return ctx.json({ error: `Webhook signature verification failed: ${error.message}` }, { status: 400 });
   }
-}
+  
+  const result = await enqueueWebhookEvent(event);
+  if (result.status === 'full') {
+    return ctx.json({ error: 'Webhook queue full, retry later' }, { status: 503, headers: { 'Retry-After': '10' } });
+  }
+  return ctx.json({ received: true, status: result.status });
+});
 
-export async function DELETE(request) {
-  const segments = getPathSegments(request);
+// PUT /api/qr/[id] - Update QR code
+router.put('/qr/:id', requireUser, async (ctx) => {
+  const body = await ctx.readJson();
+  const { id } = ctx.params;
+  const { name, destination_config, is_active } = body;
   
-  try {
-    // DELETE /api/qr/[id] - Delete QR code
-    if (segments[0] === 'qr' && segments[1]) {
-      const id = segments[1];
-      
-      if (isSupabaseConfigured && supabase) {
-        const authHeader = request.headers.get('authorization');
-        if (!authHeader) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        const token = authHeader.replace('Bearer ', '');
-        const { data: { user } } = await supabase.auth.getUser(token);
-        if (!user) {
-          return NextResponse.json({ error: 'Unauthorized' }, { status: 401, headers: corsHeaders });
-        }
-        
-        const { error } = await supabase
-          .from('qr_codes')
-          .delete()
-          .eq('id', id)
-          .eq('user_id', user.id);
-        
-        if (error) throw error;
-        
-        return NextResponse.json({ success: true }, { headers: corsHeaders });
-      }
-      // Demo mode
-      demoQrCodes = demoQrCodes.filter(q => q.id !== id);
-      return NextResponse.json({ success: true, isDemo: true }, { headers: corsHeaders });
+  if (isSupabaseConfigured && supabase) {
+    const updates = { updated_at: new Date().toISOString() };
+    if (name !== undefined) updates.name = name;
+    if (destination_config !== undefined) updates.destination_config = destination_config;
+    if (is_active !== undefined) updates.is_active = is_active;
+    
+    const { data, error } = await supabase
+      .from('qr_codes')
+      .update(updates)
+      .eq('id', id)
+      .eq('user_id', ctx.user.id)
+      .select()
+      .maybeSingle();
+    
+    if (error) throw error;
+    if (!data) {
+      return ctx.json({ error: 'QR code not found' }, { status: 404 });
     }
+    invalidateQr({ id, slug: data.slug });
+    
+    // A new amount, currency or product name needs a new Stripe Price
+    if (data.type === QR_TYPES.FIAT) {
+      await provisionFiatPrice(data);
+    }
+    
+    return ctx.json({ qr: data });
+  }
+  // Demo mode
+  const updates = { updated_at: new Date().toISOString() };
+  if (name !== undefined) updates.name = name;
+  if (destination_config !== undefined) updates.destination_config = destination_config;
+  if (is_active !== undefined) updates.is_active = is_active;
+  const store = await getFallbackStore();
+  const qr = await store.updateQr(id, updates, ctx.user?.id);
+  if (qr) {
+    if (qr.type === QR_TYPES.FIAT) {
+      await provisionFiatPrice(qr);
+    }
+    return ctx.json({ qr, isDemo: true });
+  }
+  return ctx.json({ error: 'QR code not found' }, { status: 404 });
+});
 
-    return NextResponse.json({ error: 'Not found' }, { status: 404, headers: corsHeaders });
-  } catch (error) {
-    console.error('DELETE Error:', error);
-    return NextResponse.json({ error: error.message }, { status: 500, headers: corsHeaders });
+// DELETE /api/qr/[id] - Delete QR code
+router.delete('/qr/:id', requireUser, async (ctx) => {
+  const { id } = ctx.params;
+  
+  if (isSupabaseConfigured && supabase) {
+    const { data: deleted, error } = await supabase
+      .from('qr_codes')
+      .delete()
+      .eq('id', id)
+      .eq('user_id', ctx.user.id)
+      .select('slug');
+    
+    if (error) throw error;
+    invalidateQr({ id, slug: deleted?.[0]?.slug });
+    forgetQrId(deleted?.[0]?.slug);
+    
+    return ctx.json({ success: true });
   }
+  // Demo mode
+  const store = await getFallbackStore();
+  await store.deleteQr(id, ctx.user?.id);
+  return ctx.json({ success: true, isDemo: true });
+});
+
+// =============================================
+// HANDLERS
+// =============================================
+
+export async function OPTIONS() {
+  return NextResponse.json({}, { headers: corsHeaders });
+}
+
+export function GET(request) {
+  return router.dispatch(request);
+}
+
+export function POST(request) {
+  return router.dispatch(request);
+}
+
+export function PUT(request) {
+  return router.dispatch(request);
+}
+
+export function DELETE(request) {
+  return router.dispatch(request);
 }
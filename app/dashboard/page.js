@@ -32,12 +32,29 @@ const TYPE_COLORS = {
   multi_option: 'bg-cyan-500/20 text-cyan-400'
 };
 
+// Reconnect delay after the live stream drops
+const STREAM_RETRY_MS = 5000;
+
+// Parse one Server-Sent Events message block into { event, data }
+function parseSseMessage(block) {
+  let event = 'message';
+  const data = [];
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+  }
+  return { event, data: data.join('\n') };
+}
+
 export default function DashboardPage() {
   const router = useRouter();
   const [user, setUser] = useState(null);
   const [qrCodes, setQrCodes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [configStatus, setConfigStatus] = useState(null);
+  const [live, setLive] = useState(false);
 
   useEffect(() => {
     // Check auth
@@ -57,14 +74,73 @@ export default function DashboardPage() {
     fetchQrCodes();
   }, []);
 
-  const fetchQrCodes = async () => {
+  // Live scan counters from /api/stream. fetch rather than EventSource so the
+  // bearer token can go in a header; one connection per open dashboard.
+  useEffect(() => {
+    const controller = new AbortController();
+    let retryTimer = null;
+
+    const applyUpdate = (update) => {
+      setQrCodes(prev => prev.map(q => {
+        const scans = update.counters?.[q.slug]?.scans;
+        return scans ? { ...q, scan_count: (q.scan_count || 0) + scans } : q;
+      }));
+    };
+
+    const connect = async () => {
+      try {
+        const token = localStorage.getItem('novatok_token');
+        const res = await fetch('/api/stream', {
+          headers: token ? { Authorization: `Bearer ${token}` } : {},
+          signal: controller.signal
+        });
+        if (res.status === 401) return;
+        if (!res.ok || !res.body) throw new Error(`Stream failed: ${res.status}`);
+        setLive(true);
+
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffered = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffered += value;
+          let end;
+          while ((end = buffered.indexOf('\n\n')) !== -1) {
+            const message = parseSseMessage(buffered.slice(0, end));
+            buffered = buffered.slice(end + 2);
+            if (message.event === 'update') {
+              applyUpdate(JSON.parse(message.data));
+            }
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        console.error('Live stream error:', error);
+      }
+      setLive(false);
+      retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+    };
+
+    connect();
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
+  }, []);
+
+  // Pages through the summary view; pass the previous page's cursor to append
+  const fetchQrCodes = async (cursor = null) => {
     try {
       const token = localStorage.getItem('novatok_token');
-      const res = await fetch('/api/qr', {
+      const params = new URLSearchParams({ view: 'summary', limit: '24' });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`/api/qr?${params}`, {
         headers: token ? { Authorization: `Bearer ${token}` } : {}
       });
       const data = await res.json();
-      setQrCodes(data.qrCodes || []);
+      const page = data.qrCodes || [];
+      setQrCodes(prev => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data.nextCursor || null);
     } catch (error) {
       console.error('Failed to fetch QR codes:', error);
     } finally {
@@ -72,8 +148,18 @@ export default function DashboardPage() {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    await fetchQrCodes(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleLogout = async () => {
-    await fetch('/api/auth/logout', { method: 'POST' });
+    const token = localStorage.getItem('novatok_token');
+    await fetch('/api/auth/logout', {
+      method: 'POST',
+      headers: token ? { Authorization: `Bearer ${token}` } : {}
+    });
     localStorage.removeItem('novatok_token');
     localStorage.removeItem('novatok_user');
     router.push('/');
@@ -96,7 +182,7 @@ export default function DashboardPage() {
         },
         body: JSON.stringify({ is_active: !qr.is_active })
       });
-      fetchQrCodes();
+      setQrCodes(prev => prev.map(q => (q.id === qr.id ? { ...q, is_active: !qr.is_active } : q)));
       toast.success(`QR code ${!qr.is_active ? 'activated' : 'paused'}`);
     } catch (error) {
       toast.error('Failed to update QR code');
@@ -111,7 +197,7 @@ export default function DashboardPage() {
         method: 'DELETE',
         headers: token ? { Authorization: `Bearer ${token}` } : {}
       });
-      fetchQrCodes();
+      setQrCodes(prev => prev.filter(q => q.id !== id));
       toast.success('QR code deleted');
     } catch (error) {
       toast.error('Failed to delete QR code');
@@ -142,6 +228,9 @@ export default function DashboardPage() {
             {user?.isDemo && (
               <Badge variant="outline" className="text-yellow-400 border-yellow-400/30">Demo</Badge>
             )}
+            {live && (
+              <Badge variant="outline" className="text-green-400 border-green-400/30">Live</Badge>
+            )}
             <Link href="/setup">
               <Button variant="ghost" size="icon">
                 <Settings className="w-4 h-4" />
@@ -198,7 +287,7 @@ export default function DashboardPage() {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm text-muted-foreground">Total QR Codes</p>
-                  <p className="text-3xl font-bold">{qrCodes.length}</p>
+                  <p className="text-3xl font-bold">{qrCodes.length}{nextCursor ? '+' : ''}</p>
                 </div>
                 <QrCode className="w-8 h-8 text-purple-400" />
               </div>
@@ -298,6 +387,14 @@ export default function DashboardPage() {
             })}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );
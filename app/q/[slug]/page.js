@@ -1,152 +1,101 @@
-'use client';
-
-import { useState, useEffect } from 'react';
-import { useParams, useRouter } from 'next/navigation';
+import Link from 'next/link';
+import { headers } from 'next/headers';
+import { redirect } from 'next/navigation';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
-import { Badge } from '@/components/ui/badge';
-import { QrCode, CreditCard, Coins, Image, Globe, Zap, Loader2, AlertCircle, ExternalLink } from 'lucide-react';
-
-export default function QRResolverPage() {
-  const params = useParams();
-  const router = useRouter();
-  const [qr, setQr] = useState(null);
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState(null);
-
-  useEffect(() => {
-    fetchQR();
-  }, [params.slug]);
-
-  const fetchQR = async () => {
-    try {
-      // Track scan event
-      await fetch(`/api/qr/${params.slug}/event`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          event_type: 'scan',
-          user_agent: navigator.userAgent
-        })
-      }).catch(() => {});
+import { CreditCard, Coins, Zap, AlertCircle, Clock } from 'lucide-react';
+import { resolveScan, findActiveQr, isCountableScan, scanEventFromHeaders, getScanDestination } from '@/lib/qr-resolver';
+import { getRequestEnrichment } from '@/lib/event-enrichment';
 
-      const res = await fetch(`/api/qr/${params.slug}`);
-      const data = await res.json();
-      
-      if (data.error) {
-        setError(data.error);
-      } else {
-        setQr(data.qr);
-        // Auto-redirect based on type
-        handleRedirect(data.qr);
-      }
-    } catch (err) {
-      setError('Failed to load QR code');
-    } finally {
-      setLoading(false);
-    }
-  };
+// Every request is a scan: resolve it here and redirect before any client JS loads
+export const dynamic = 'force-dynamic';
 
-  const handleRedirect = (qrData) => {
-    const config = qrData.destination_config;
-    
-    switch (qrData.type) {
-      case 'fiat':
-        router.push(`/pay/fiat?slug=${params.slug}`);
-        break;
-      case 'crypto':
-        router.push(`/pay/crypto?slug=${params.slug}`);
-        break;
-      case 'nova':
-        router.push(`/pay/nova?slug=${params.slug}`);
-        break;
-      case 'nft_mint':
-        router.push(`/mint/${params.slug}`);
-        break;
-      case 'nft_listing':
-        router.push(`/marketplace/${config.listingId || params.slug}?slug=${params.slug}`);
-        break;
-      case 'multi_option':
-        // Stay on this page to show options
-        break;
-    }
-  };
+export default async function QRResolverPage({ params }) {
+  const { slug } = params;
+  const requestHeaders = headers();
+  // Prefetches, crawlers and link previews get the same page without counting a scan
+  const result = isCountableScan(requestHeaders)
+    ? await resolveScan(slug, scanEventFromHeaders(requestHeaders), getRequestEnrichment(requestHeaders))
+    : await findActiveQr(slug);
 
-  if (loading) {
+  if (!result) {
     return (
-      <div className="min-h-screen flex items-center justify-center">
-        <div className="text-center">
-          <Loader2 className="w-12 h-12 animate-spin text-purple-500 mx-auto mb-4" />
-          <p className="text-muted-foreground">Loading...</p>
-        </div>
+      <div className="min-h-screen flex items-center justify-center p-4">
+        <Card className="nova-card max-w-md w-full">
+          <CardContent className="pt-6 text-center">
+            <AlertCircle className="w-16 h-16 text-red-400 mx-auto mb-4" />
+            <h2 className="text-xl font-bold mb-2">QR Code Not Found</h2>
+            <p className="text-muted-foreground">QR code not found</p>
+          </CardContent>
+        </Card>
       </div>
     );
   }
 
-  if (error) {
+  if (result.quotaExceeded) {
     return (
       <div className="min-h-screen flex items-center justify-center p-4">
         <Card className="nova-card max-w-md w-full">
           <CardContent className="pt-6 text-center">
-            <AlertCircle className="w-16 h-16 text-red-400 mx-auto mb-4" />
-            <h2 className="text-xl font-bold mb-2">QR Code Not Found</h2>
-            <p className="text-muted-foreground">{error}</p>
+            <Clock className="w-16 h-16 text-yellow-400 mx-auto mb-4" />
+            <h2 className="text-xl font-bold mb-2">Temporarily Unavailable</h2>
+            <p className="text-muted-foreground">This QR code can't take more scans right now. Please try again later.</p>
+            <p className="text-sm text-muted-foreground mt-4">{result.reason}</p>
           </CardContent>
         </Card>
       </div>
     );
   }
 
+  const { qr } = result;
+  const destination = getScanDestination(qr);
+  if (destination) {
+    redirect(destination);
+  }
+
   // Multi-option display
-  if (qr?.type === 'multi_option') {
-    const config = qr.destination_config;
-    return (
-      <div className="min-h-screen flex items-center justify-center p-4">
-        <div className="absolute inset-0 bg-gradient-to-br from-purple-900/20 via-transparent to-pink-900/20" />
-        
-        <Card className="nova-card max-w-md w-full relative z-10">
-          <CardHeader className="text-center">
-            <div className="w-16 h-16 rounded-2xl nova-gradient flex items-center justify-center mx-auto mb-4">
-              <Zap className="w-8 h-8 text-white" />
-            </div>
-            <CardTitle className="text-2xl">{config.title || qr.name}</CardTitle>
-            <CardDescription>{config.description || 'Choose your payment method'}</CardDescription>
-          </CardHeader>
-          <CardContent className="space-y-4">
-            {config.fiatAmount && (
-              <Button
-                variant="outline"
-                className="w-full h-auto py-4 justify-start"
-                onClick={() => router.push(`/pay/fiat?slug=${params.slug}`)}
-              >
+  const config = qr.destination_config || {};
+  const paySlug = encodeURIComponent(slug);
+  return (
+    <div className="min-h-screen flex items-center justify-center p-4">
+      <div className="absolute inset-0 bg-gradient-to-br from-purple-900/20 via-transparent to-pink-900/20" />
+
+      <Card className="nova-card max-w-md w-full relative z-10">
+        <CardHeader className="text-center">
+          <div className="w-16 h-16 rounded-2xl nova-gradient flex items-center justify-center mx-auto mb-4">
+            <Zap className="w-8 h-8 text-white" />
+          </div>
+          <CardTitle className="text-2xl">{config.title || qr.name}</CardTitle>
+          <CardDescription>{config.description || 'Choose your payment method'}</CardDescription>
+        </CardHeader>
+        <CardContent className="space-y-4">
+          {config.fiatAmount && (
+            <Button asChild variant="outline" className="w-full h-auto py-4 justify-start">
+              <Link href={`/pay/fiat?slug=${paySlug}`}>
                 <CreditCard className="w-6 h-6 mr-4 text-blue-400" />
                 <div className="text-left">
                   <p className="font-medium">Pay with Card</p>
                   <p className="text-sm text-muted-foreground">${config.fiatAmount} USD</p>
                 </div>
-              </Button>
-            )}
-            
-            {config.cryptoAmount && config.walletAddress && (
-              <Button
-                variant="outline"
-                className="w-full h-auto py-4 justify-start"
-                onClick={() => router.push(`/pay/crypto?slug=${params.slug}`)}
-              >
+              </Link>
+            </Button>
+          )}
+
+          {config.cryptoAmount && config.walletAddress && (
+            <Button asChild variant="outline" className="w-full h-auto py-4 justify-start">
+              <Link href={`/pay/crypto?slug=${paySlug}`}>
                 <Coins className="w-6 h-6 mr-4 text-orange-400" />
                 <div className="text-left">
                   <p className="font-medium">Pay with Crypto</p>
                   <p className="text-sm text-muted-foreground">{config.cryptoAmount} ETH</p>
                 </div>
-              </Button>
-            )}
-            
-            {config.walletAddress && (
-              <Button
-                variant="outline"
-                className="w-full h-auto py-4 justify-start"
-                onClick={() => router.push(`/pay/nova?slug=${params.slug}`)}
-              >
+              </Link>
+            </Button>
+          )}
+
+          {config.walletAddress && (
+            <Button asChild variant="outline" className="w-full h-auto py-4 justify-start">
+              <Link href={`/pay/nova?slug=${paySlug}`}>
                 <div className="w-6 h-6 mr-4 rounded nova-gradient flex items-center justify-center">
                   <span className="text-xs font-bold text-white">N</span>
                 </div>
@@ -154,25 +103,15 @@ export default function QRResolverPage() {
                   <p className="font-medium">Pay with NOVA</p>
                   <p className="text-sm text-muted-foreground">NOVA Token</p>
                 </div>
-              </Button>
-            )}
-            
-            <p className="text-xs text-center text-muted-foreground mt-6">
-              Powered by NovaTok • Non-custodial payments
-            </p>
-          </CardContent>
-        </Card>
-      </div>
-    );
-  }
+              </Link>
+            </Button>
+          )}
 
-  // Default: show loading while redirecting
-  return (
-    <div className="min-h-screen flex items-center justify-center">
-      <div className="text-center">
-        <Loader2 className="w-12 h-12 animate-spin text-purple-500 mx-auto mb-4" />
-        <p className="text-muted-foreground">Redirecting...</p>
-      </div>
+          <p className="text-xs text-center text-muted-foreground mt-6">
+            Powered by NovaTok • Non-custodial payments
+          </p>
+        </CardContent>
+      </Card>
     </div>
   );
 }
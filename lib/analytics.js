@@ -0,0 +1,164 @@
+// QR Analytics Library
+// Serves per-QR analytics from hourly/daily rollup tables that the database
+// maintains incrementally as qr_events rows are inserted (see the
+// rollup_qr_events trigger in supabase-migrations.sql).
+
+import { supabaseAdmin } from './supabase';
+import { UA_BROWSERS } from './user-agent';
+
+// Hourly buckets are only kept for the most recent days
+export const HOURLY_ROLLUP_DAYS = 7;
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+const HOUR_MS = 60 * 60 * 1000;
+
+/**
+ * Normalize a client-supplied country to an ISO-3166 alpha-2 code
+ * @returns {string|null}
+ */
+export function normalizeCountry(country) {
+  if (typeof country !== 'string') return null;
+  const code = country.trim().toUpperCase();
+  return /^[A-Z]{2}$/.test(code) ? code : null;
+}
+
+function truncate(date, granularity) {
+  const ms = new Date(date).getTime();
+  const size = granularity === 'hour' ? HOUR_MS : DAY_MS;
+  return new Date(ms - (ms % size)).toISOString();
+}
+
+/**
+ * Aggregate raw events into rollup rows (used where no database trigger exists)
+ * @param {Array<Object>} events - qr_events rows
+ * @param {string} granularity - 'hour' or 'day'
+ * @returns {Array<Object>} Rollup rows
+ */
+export function rollupEvents(events, granularity) {
+  const rows = new Map();
+  for (const event of events) {
+    const bucket = truncate(event.created_at, granularity);
+    const country = event.country || '';
+    const uaFamily = event.ua_family || UA_BROWSERS[event.ua_browser] || 'other';
+    const key = `${bucket}|${event.event_type}|${country}|${uaFamily}`;
+    const row = rows.get(key);
+    if (row) {
+      row.count++;
+    } else {
+      rows.set(key, { bucket, event_type: event.event_type, country, ua_family: uaFamily, count: 1 });
+    }
+  }
+  return [...rows.values()];
+}
+
+function addTo(map, key, count) {
+  map[key] = (map[key] || 0) + count;
+}
+
+/**
+ * Summarize daily and hourly rollup rows into the analytics response shape
+ * @param {Array<Object>} dailyRows - Daily rollup rows within the window
+ * @param {Array<Object>} hourlyRows - Hourly rollup rows within the hourly window
+ * @returns {Object} { totals, series }
+ */
+export function summarizeRollups(dailyRows, hourlyRows) {
+  const byEventType = {};
+  const byCountry = {};
+  const byUserAgent = {};
+  const daily = {};
+  const hourly = {};
+  let totalEvents = 0;
+
+  for (const row of dailyRows) {
+    const count = Number(row.count);
+    totalEvents += count;
+    addTo(byEventType, row.event_type, count);
+    addTo(byCountry, row.country || 'unknown', count);
+    addTo(byUserAgent, row.ua_family || 'other', count);
+    daily[row.bucket] = daily[row.bucket] || {};
+    addTo(daily[row.bucket], row.event_type, Number(row.count));
+  }
+
+  for (const row of hourlyRows) {
+    hourly[row.bucket] = hourly[row.bucket] || {};
+    addTo(hourly[row.bucket], row.event_type, Number(row.count));
+  }
+
+  const toSeries = (buckets) => Object.keys(buckets)
+    .sort()
+    .map(bucket => ({ bucket: new Date(bucket).toISOString(), ...buckets[bucket] }));
+
+  return {
+    totals: { totalEvents, byEventType, byCountry, byUserAgent },
+    series: { daily: toSeries(daily), hourly: toSeries(hourly) }
+  };
+}
+
+/**
+ * Resolve the analytics window for a plan
+ * @param {number} retentionDays - Plan's analyticsRetentionDays
+ * @param {number} requestedDays - Optional window requested by the client
+ * @returns {Object} { days, since, hourlySince }
+ */
+export function getAnalyticsWindow(retentionDays, requestedDays) {
+  const days = Math.min(
+    Number.isFinite(requestedDays) && requestedDays > 0 ? requestedDays : retentionDays,
+    retentionDays
+  );
+  const now = Date.now();
+  const since = new Date(now - (now % DAY_MS) - (days - 1) * DAY_MS);
+  const hourlySince = new Date(now - Math.min(days, HOURLY_ROLLUP_DAYS) * DAY_MS);
+  return { days, since, hourlySince };
+}
+
+/**
+ * Get analytics for a QR code from the rollup tables
+ * @param {Object} qr - QR row (ownership already verified)
+ * @param {number} retentionDays - Owner's plan analyticsRetentionDays
+ * @param {number} requestedDays - Optional window in days
+ * @returns {Promise<Object>} Analytics payload
+ */
+export async function getQrAnalytics(qr, retentionDays, requestedDays) {
+  const { days, since, hourlySince } = getAnalyticsWindow(retentionDays, requestedDays);
+  const columns = 'bucket, event_type, country, ua_family, count';
+
+  const [dailyResult, hourlyResult] = await Promise.all([
+    supabaseAdmin
+      .from('qr_event_rollups_daily')
+      .select(columns)
+      .eq('qr_code_id', qr.id)
+      .gte('bucket', since.toISOString()),
+    supabaseAdmin
+      .from('qr_event_rollups_hourly')
+      .select(columns)
+      .eq('qr_code_id', qr.id)
+      .gte('bucket', hourlySince.toISOString())
+  ]);
+
+  if (dailyResult.error) throw dailyResult.error;
+  if (hourlyResult.error) throw hourlyResult.error;
+
+  return buildAnalyticsResponse(qr, days, dailyResult.data || [], hourlyResult.data || []);
+}
+
+/**
+ * Shape rollup rows into the analytics response
+ */
+export function buildAnalyticsResponse(qr, days, dailyRows, hourlyRows) {
+  const { totals, series } = summarizeRollups(dailyRows, hourlyRows);
+  const dayAgo = Date.now() - DAY_MS;
+  const recentEvents = hourlyRows
+    .filter(row => new Date(row.bucket).getTime() >= dayAgo)
+    .reduce((sum, row) => sum + Number(row.count), 0);
+
+  return {
+    qr,
+    windowDays: days,
+    stats: {
+      totalScans: qr.scan_count || 0,
+      recentEvents,
+      ...totals
+    },
+    series
+  };
+}
@@ -0,0 +1,199 @@
+// API router
+// Route table for the catch-all API handler. Patterns are compiled into one
+// segment trie per method, so dispatch walks the path once (static segments
+// before :params) instead of testing every route in turn, and registration
+// order never decides which route wins. Each route gets its own latency
+// histogram (also exported on /api/metrics), and every response carries the
+// shared headers (CORS) and a Server-Timing breakdown.
+
+import { NextResponse } from 'next/server';
+import { counter, histogram } from './metrics';
+import { createTiming, runWithTiming, timed, formatServerTiming } from './request-timing';
+
+const requestDuration = histogram('http_request_duration_seconds', 'API request latency by route', ['method', 'route']);
+const requestsTotal = counter('http_requests_total', 'API requests by route and status code', ['method', 'route', 'status']);
+
+function createNode() {
+  return { children: new Map(), param: null, route: null };
+}
+
+function splitPath(path) {
+  return path.split('/').filter(Boolean);
+}
+
+export class ApiRouter {
+  /**
+   * @param {Object} options
+   * @param {string} options.prefix - Path prefix stripped before matching
+   * @param {Object} options.headers - Headers added to every response
+   */
+  constructor({ prefix = '/api', headers = {} } = {}) {
+    this.prefix = prefix;
+    this.headers = headers;
+    this.trees = new Map();
+    this.routes = [];
+  }
+
+  /**
+   * Register a route
+   * @param {string} method - HTTP method
+   * @param {string} pattern - Path such as '/qr/:slug/analytics'
+   * @param {...Function} handlers - Middleware then the handler, each called
+   *   with the request context; the first to return a response ends the chain
+   */
+  add(method, pattern, ...handlers) {
+    if (!this.trees.has(method)) {
+      this.trees.set(method, createNode());
+    }
+    let node = this.trees.get(method);
+    const paramNames = [];
+    for (const segment of splitPath(pattern)) {
+      if (segment.startsWith(':')) {
+        node.param = node.param || createNode();
+        node = node.param;
+        paramNames.push(segment.slice(1));
+      } else {
+        if (!node.children.has(segment)) {
+          node.children.set(segment, createNode());
+        }
+        node = node.children.get(segment);
+      }
+    }
+    if (node.route) {
+      throw new Error(`Duplicate route: ${method} ${pattern}`);
+    }
+    node.route = {
+      key: `${method} ${pattern}`,
+      method,
+      pattern,
+      paramNames,
+      handlers,
+      histogram: requestDuration.child({ method, route: pattern }),
+      errors: 0
+    };
+    this.routes.push(node.route);
+    return this;
+  }
+
+  get(pattern, ...handlers) {
+    return this.add('GET', pattern, ...handlers);
+  }
+
+  post(pattern, ...handlers) {
+    return this.add('POST', pattern, ...handlers);
+  }
+
+  put(pattern, ...handlers) {
+    return this.add('PUT', pattern, ...handlers);
+  }
+
+  delete(pattern, ...handlers) {
+    return this.add('DELETE', pattern, ...handlers);
+  }
+
+  /**
+   * Find the route for a path
+   * @returns {Object|null} { route, params }
+   */
+  match(method, segments) {
+    const root = this.trees.get(method);
+    if (!root) {
+      return null;
+    }
+    const values = [];
+    const walk = (node, i) => {
+      if (i === segments.length) {
+        return node.route;
+      }
+      const child = node.children.get(segments[i]);
+      const found = child && walk(child, i + 1);
+      if (found) {
+        return found;
+      }
+      if (node.param) {
+        values.push(segments[i]);
+        const viaParam = walk(node.param, i + 1);
+        if (viaParam) {
+          return viaParam;
+        }
+        values.pop();
+      }
+      return null;
+    };
+    const route = walk(root, 0);
+    if (!route) {
+      return null;
+    }
+    const params = {};
+    route.paramNames.forEach((name, i) => {
+      params[name] = values[i];
+    });
+    return { route, params };
+  }
+
+  /**
+   * Handle a request
+   * @param {Request} request - Incoming request
+   * @returns {Promise<Response>}
+   */
+  async dispatch(request) {
+    const timing = createTiming();
+    const url = new URL(request.url);
+    const path = url.pathname.startsWith(this.prefix) ? url.pathname.slice(this.prefix.length) : url.pathname;
+    const matched = this.match(request.method, splitPath(path));
+
+    const response = await runWithTiming(timing, async () => {
+      if (!matched) {
+        return NextResponse.json({ error: 'Not found' }, { status: 404 });
+      }
+      const ctx = {
+        request,
+        url,
+        params: matched.params,
+        searchParams: url.searchParams,
+        user: null,
+        json: (data, init) => timed('serialize', () => NextResponse.json(data, init)),
+        readJson: () => request.json().catch(() => ({})),
+        time: timed
+      };
+      try {
+        for (const handler of matched.route.handlers) {
+          const result = await handler(ctx);
+          if (result) {
+            return result;
+          }
+        }
+        throw new Error(`Route ${matched.route.key} returned no response`);
+      } catch (error) {
+        console.error(`${request.method} Error:`, error);
+        return NextResponse.json({ error: error.message }, { status: 500 });
+      }
+    });
+
+    for (const [name, value] of Object.entries(this.headers)) {
+      if (!response.headers.has(name)) {
+        response.headers.set(name, value);
+      }
+    }
+    response.headers.set('Server-Timing', formatServerTiming(timing));
+    requestsTotal.inc({ method: request.method, route: matched ? matched.route.pattern : 'unmatched', status: response.status });
+    if (matched) {
+      matched.route.histogram.observe(performance.now() - timing.started);
+      if (response.status >= 500) {
+        matched.route.errors++;
+      }
+    }
+    return response;
+  }
+
+  /**
+   * Latency histogram and error count per route
+   */
+  stats() {
+    const result = {};
+    for (const route of this.routes) {
+      result[route.key] = { ...route.histogram.stats(), errors: route.errors };
+    }
+    return result;
+  }
+}
@@ -0,0 +1,265 @@
+// Auth Helper Library
+// Resolves the bearer token on API requests to a Supabase user. Verified
+// tokens are cached by hash until they expire (bounded by AUTH_CACHE_TTL_MS),
+// and concurrent verifications of the same token share one auth round trip.
+// Without Supabase, accounts and sessions live in the fallback store
+// (MongoDB or the demo memory store) and tokens are opaque random strings,
+// stored only as their hash.
+
+import { createHash, randomBytes, scrypt, timingSafeEqual } from 'crypto';
+import { promisify } from 'util';
+import { v4 as uuidv4 } from 'uuid';
+import { supabase, supabaseAdmin } from './supabase';
+import { LruCache } from './lru-cache';
+
+const AUTH_CACHE_MAX_ENTRIES = parseInt(process.env.AUTH_CACHE_MAX_ENTRIES || '10000');
+const AUTH_CACHE_TTL_MS = parseInt(process.env.AUTH_CACHE_TTL_MS || '60000');
+const LOCAL_SESSION_TTL_MS = parseInt(process.env.LOCAL_SESSION_TTL_MS || '604800000');
+const MIN_PASSWORD_LENGTH = 6;
+
+const verifiedTokens = new LruCache({ maxEntries: AUTH_CACHE_MAX_ENTRIES, ttlMs: AUTH_CACHE_TTL_MS });
+const revokedTokens = new LruCache({ maxEntries: AUTH_CACHE_MAX_ENTRIES, ttlMs: AUTH_CACHE_TTL_MS });
+const pendingVerifications = new Map();
+const requestUsers = new WeakMap();
+const scryptAsync = promisify(scrypt);
+
+/**
+ * Extract the bearer token from a request
+ * @param {Request} request - Incoming request
+ * @returns {string|null} Token or null if absent
+ */
+export function getBearerToken(request) {
+  const authHeader = request.headers.get('authorization');
+  if (!authHeader) {
+    return null;
+  }
+  return authHeader.replace(/^Bearer\s+/i, '').trim() || null;
+}
+
+function hashToken(token) {
+  return createHash('sha256').update(token).digest('base64url');
+}
+
+/**
+ * Milliseconds until a JWT's exp claim, or null if it can't be read
+ */
+function getTokenTtl(token) {
+  try {
+    const payload = JSON.parse(Buffer.from(token.split('.')[1], 'base64url').toString('utf8'));
+    return typeof payload.exp === 'number' ? payload.exp * 1000 - Date.now() : null;
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Verify a token, serving repeat verifications from the cache
+ * @param {string} token - Access token
+ * @returns {Promise<Object|null>} Supabase user or null
+ */
+export async function verifyToken(token) {
+  if (!token || !supabase) {
+    return null;
+  }
+  const key = hashToken(token);
+  if (revokedTokens.get(key)) {
+    return null;
+  }
+
+  const cached = verifiedTokens.get(key);
+  if (cached) {
+    return cached;
+  }
+
+  let pending = pendingVerifications.get(key);
+  if (!pending) {
+    pending = (async () => {
+      const { data, error } = await supabase.auth.getUser(token);
+      const user = error ? null : data?.user || null;
+      if (user && !revokedTokens.get(key)) {
+        const tokenTtl = getTokenTtl(token);
+        verifiedTokens.set(key, user, Math.min(AUTH_CACHE_TTL_MS, tokenTtl ?? AUTH_CACHE_TTL_MS));
+      }
+      return user;
+    })().finally(() => {
+      pendingVerifications.delete(key);
+    });
+    pendingVerifications.set(key, pending);
+  }
+  return pending;
+}
+
+/**
+ * Resolve the authenticated user for a request (memoized per request)
+ * @param {Request} request - Incoming request
+ * @returns {Promise<Object|null>} Supabase user or null
+ */
+export function resolveUser(request) {
+  let user = requestUsers.get(request);
+  if (!user) {
+    user = verifyToken(getBearerToken(request));
+    requestUsers.set(request, user);
+  }
+  return user;
+}
+
+/**
+ * Revoke a token on logout: drop it from the cache and sign the session out
+ * @param {string} token - Access token
+ */
+export async function revokeToken(token) {
+  if (!token) {
+    return;
+  }
+  const key = hashToken(token);
+  verifiedTokens.delete(key);
+  const tokenTtl = getTokenTtl(token);
+  revokedTokens.set(key, true, tokenTtl ?? AUTH_CACHE_TTL_MS);
+
+  if (supabaseAdmin) {
+    const { error } = await supabaseAdmin.auth.admin.signOut(token);
+    if (error) {
+      console.error('Error revoking session:', error);
+    }
+  }
+}
+
+async function hashPassword(password) {
+  const salt = randomBytes(16);
+  const hash = await scryptAsync(password, salt, 64);
+  return `scrypt$${salt.toString('base64url')}$${hash.toString('base64url')}`;
+}
+
+async function checkPassword(password, stored) {
+  const [scheme, salt, expected] = (stored || '').split('$');
+  if (scheme !== 'scrypt' || !salt || !expected) {
+    return false;
+  }
+  const hash = await scryptAsync(password, Buffer.from(salt, 'base64url'), 64);
+  const expectedHash = Buffer.from(expected, 'base64url');
+  return expectedHash.length === hash.length && timingSafeEqual(hash, expectedHash);
+}
+
+async function createLocalSession(store, user) {
+  const token = randomBytes(32).toString('base64url');
+  await store.insertSession({
+    id: hashToken(token),
+    user_id: user.id,
+    email: user.email,
+    expires_at: new Date(Date.now() + LOCAL_SESSION_TTL_MS)
+  });
+  return { access_token: token, token_type: 'bearer', expires_in: Math.floor(LOCAL_SESSION_TTL_MS / 1000) };
+}
+
+function toLocalUser(row) {
+  return { id: row.id, email: row.email, isDemo: true };
+}
+
+/**
+ * Sign up or sign in against the fallback store. MongoDB accounts need a
+ * password; the demo memory store signs anyone in, one user per email.
+ * @param {Object} store - Fallback store (see getFallbackStore)
+ * @param {Object} credentials - { email, password }
+ * @param {Object} options - { signup: true to create the account }
+ * @returns {Promise<Object>} { user, session, created } or { error }
+ */
+export async function signInLocalUser(store, { email, password }, { signup = false } = {}) {
+  const normalizedEmail = typeof email === 'string' ? email.trim().toLowerCase() : '';
+  if (store.persistent) {
+    if (!normalizedEmail || typeof password !== 'string') {
+      return { error: 'Email and password are required' };
+    }
+    if (signup && password.length < MIN_PASSWORD_LENGTH) {
+      return { error: `Password should be at least ${MIN_PASSWORD_LENGTH} characters` };
+    }
+  }
+
+  let row = await store.getUserByEmail(normalizedEmail || 'demo@novatok.app');
+  let created = false;
+  if (store.persistent) {
+    if (signup) {
+      if (row) {
+        return { error: 'User already registered' };
+      }
+      row = {
+        id: uuidv4(),
+        email: normalizedEmail,
+        password_hash: await hashPassword(password),
+        created_at: new Date().toISOString()
+      };
+      if (!(await store.insertUser(row))) {
+        return { error: 'User already registered' };
+      }
+      created = true;
+    } else if (!row || !(await checkPassword(password, row.password_hash))) {
+      return { error: 'Invalid login credentials' };
+    }
+  } else if (!row) {
+    row = { id: uuidv4(), email: normalizedEmail || 'demo@novatok.app', created_at: new Date().toISOString() };
+    await store.insertUser(row);
+    created = true;
+  }
+
+  const user = toLocalUser(row);
+  return { user, session: await createLocalSession(store, user), created };
+}
+
+/**
+ * Resolve a fallback-store session token to its user (memoized per request)
+ * @param {Request} request - Incoming request
+ * @param {Object} store - Fallback store
+ * @returns {Promise<Object|null>} { id, email, isDemo } or null
+ */
+export function resolveLocalUser(request, store) {
+  let user = requestUsers.get(request);
+  if (!user) {
+    user = verifyLocalToken(getBearerToken(request), store);
+    requestUsers.set(request, user);
+  }
+  return user;
+}
+
+async function verifyLocalToken(token, store) {
+  if (!token) {
+    return null;
+  }
+  const key = hashToken(token);
+  if (revokedTokens.get(key)) {
+    return null;
+  }
+  const cached = verifiedTokens.get(key);
+  if (cached) {
+    return cached;
+  }
+  const session = await store.getSession(key);
+  const expiresAt = session ? new Date(session.expires_at).getTime() : 0;
+  if (expiresAt <= Date.now()) {
+    return null;
+  }
+  const user = toLocalUser({ id: session.user_id, email: session.email });
+  verifiedTokens.set(key, user, Math.min(AUTH_CACHE_TTL_MS, expiresAt - Date.now()));
+  return user;
+}
+
+/**
+ * End a fallback-store session on logout
+ * @param {string} token - Access token
+ * @param {Object} store - Fallback store
+ */
+export async function revokeLocalSession(token, store) {
+  if (!token) {
+    return;
+  }
+  const key = hashToken(token);
+  verifiedTokens.delete(key);
+  revokedTokens.set(key, true, AUTH_CACHE_TTL_MS);
+  await store.deleteSession(key);
+}
+
+export function getAuthCacheStats() {
+  return {
+    ...verifiedTokens.stats(),
+    revoked: revokedTokens.size,
+    pending: pendingVerifications.size
+  };
+}
@@ -0,0 +1,186 @@
+// Batched JSON-RPC client for contract reads
+// eth_calls made within a few milliseconds of each other (one page's reads,
+// or many concurrent page loads) go out as a single JSON-RPC batch request.
+// Any endpoint that speaks JSON-RPC 2.0 batches works: Infura/Alchemy, a
+// local node (anvil, hardhat) or scripts/rpc-standin.mjs in development.
+
+import { counter, histogram } from './metrics';
+
+export const RPC_URL = process.env.WEB3_RPC_URL || '';
+export const isRpcConfigured = !!RPC_URL;
+
+const RPC_BATCH_MAX = parseInt(process.env.RPC_BATCH_MAX || '50');
+const RPC_BATCH_WINDOW_MS = parseInt(process.env.RPC_BATCH_WINDOW_MS || '5');
+const RPC_TIMEOUT_MS = parseInt(process.env.RPC_TIMEOUT_MS || '5000');
+
+const batchDuration = histogram('chain_rpc_batch_duration_seconds', 'JSON-RPC batch round-trip latency');
+const callsTotal = counter('chain_rpc_calls_total', 'JSON-RPC calls by method and outcome', ['method', 'outcome']);
+
+// A JSON-RPC error for one call (reverts included); other calls in the batch are unaffected
+export class RpcError extends Error {
+  constructor(message, code) {
+    super(message);
+    this.code = code;
+  }
+}
+
+export class JsonRpcBatcher {
+  /**
+   * @param {Object} options
+   * @param {string} options.url - JSON-RPC endpoint
+   * @param {number} options.maxBatchSize - Calls per HTTP request
+   * @param {number} options.windowMs - How long to collect calls before sending
+   * @param {number} options.timeoutMs - HTTP timeout per batch
+   */
+  constructor({ url, maxBatchSize = RPC_BATCH_MAX, windowMs = RPC_BATCH_WINDOW_MS, timeoutMs = RPC_TIMEOUT_MS }) {
+    this.url = url;
+    this.maxBatchSize = maxBatchSize;
+    this.windowMs = windowMs;
+    this.timeoutMs = timeoutMs;
+    this.queue = [];
+    this.timer = null;
+    this.nextId = 1;
+    this.batches = 0;
+    this.calls = 0;
+  }
+
+  /**
+   * Queue one JSON-RPC call
+   * @param {string} method - e.g. 'eth_call'
+   * @param {Array} params - Call parameters
+   * @returns {Promise<*>} The call's result
+   */
+  call(method, params) {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ id: this.nextId++, method, params, resolve, reject });
+      if (this.queue.length >= this.maxBatchSize) {
+        this.flush();
+      } else if (!this.timer) {
+        this.timer = setTimeout(() => this.flush(), this.windowMs);
+      }
+    });
+  }
+
+  flush() {
+    clearTimeout(this.timer);
+    this.timer = null;
+    while (this.queue.length > 0) {
+      this.send(this.queue.splice(0, this.maxBatchSize));
+    }
+  }
+
+  async send(batch) {
+    this.batches++;
+    this.calls += batch.length;
+    const started = performance.now();
+    let responses;
+    try {
+      const res = await fetch(this.url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(batch.map(({ id, method, params }) => ({ jsonrpc: '2.0', id, method, params }))),
+        signal: AbortSignal.timeout(this.timeoutMs)
+      });
+      if (!res.ok) {
+        throw new Error(`JSON-RPC endpoint returned ${res.status}`);
+      }
+      responses = await res.json();
+      // Some nodes answer a one-call batch with a bare object
+      if (!Array.isArray(responses)) responses = [responses];
+    } catch (error) {
+      batch.forEach(call => {
+        callsTotal.inc({ method: call.method, outcome: 'failed' });
+        call.reject(error);
+      });
+      return;
+    } finally {
+      batchDuration.observe({}, performance.now() - started);
+    }
+
+    const byId = new Map(responses.map(response => [response.id, response]));
+    for (const call of batch) {
+      const response = byId.get(call.id);
+      if (!response) {
+        callsTotal.inc({ method: call.method, outcome: 'failed' });
+        call.reject(new Error(`No JSON-RPC response for ${call.method}`));
+      } else if (response.error) {
+        callsTotal.inc({ method: call.method, outcome: 'error' });
+        call.reject(new RpcError(response.error.message, response.error.code));
+      } else {
+        callsTotal.inc({ method: call.method, outcome: 'ok' });
+        call.resolve(response.result);
+      }
+    }
+  }
+
+  stats() {
+    return {
+      batches: this.batches,
+      calls: this.calls,
+      callsPerBatch: this.batches ? this.calls / this.batches : 0,
+      queued: this.queue.length
+    };
+  }
+}
+
+const batcher = isRpcConfigured ? new JsonRpcBatcher({ url: RPC_URL }) : null;
+
+/**
+ * Read from a contract (eth_call at the latest block)
+ * @param {string} to - Contract address
+ * @param {string} data - ABI-encoded call data
+ * @returns {Promise<string>} ABI-encoded return data
+ */
+export function ethCall(to, data) {
+  if (!batcher) {
+    return Promise.reject(new Error('WEB3_RPC_URL is not configured'));
+  }
+  return batcher.call('eth_call', [{ to, data }, 'latest']);
+}
+
+export function getRpcStats() {
+  return batcher ? batcher.stats() : null;
+}
+
+// =============================================
+// ABI encoding (just the static types the indexer reads)
+// =============================================
+
+/**
+ * Encode a call to a function taking one uint256
+ * @param {string} selector - 4-byte selector, e.g. '0xc87b56dd' for tokenURI(uint256)
+ * @param {bigint|string|number} value - Argument
+ */
+export function encodeUint256Call(selector, value) {
+  return selector + BigInt(value).toString(16).padStart(64, '0');
+}
+
+function word(hex, index) {
+  const start = 2 + index * 64;
+  if (hex.length < start + 64) {
+    throw new RpcError('Return data too short', -32000);
+  }
+  return hex.slice(start, start + 64);
+}
+
+export function decodeUint256(hex, index = 0) {
+  return BigInt('0x' + word(hex, index));
+}
+
+export function decodeAddress(hex, index = 0) {
+  return '0x' + word(hex, index).slice(24);
+}
+
+export function decodeBool(hex, index = 0) {
+  return decodeUint256(hex, index) !== 0n;
+}
+
+/**
+ * Decode a single dynamic string return value
+ */
+export function decodeString(hex) {
+  const offset = Number(decodeUint256(hex)) / 32;
+  const length = Number(decodeUint256(hex, offset));
+  const start = 2 + (offset + 1) * 64;
+  return Buffer.from(hex.slice(start, start + length * 2), 'hex').toString('utf8');
+}
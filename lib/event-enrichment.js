@@ -0,0 +1,54 @@
+// Server-side event enrichment
+// Country and user agent are derived from the request that reports an
+// event, never taken from its body: the country from the client address
+// (GeoIP database) or the edge's country header, and the User-Agent reduced
+// to device/OS/browser codes. It is computed once per request and shared by
+// every event in it.
+
+import { lookupCountry, getGeoIpStats } from './geoip';
+import { parseUserAgent, getUserAgentStats } from './user-agent';
+import { normalizeCountry } from './analytics';
+
+// A header that the platform in front of the app sets itself and clients
+// cannot pass through (e.g. cf-connecting-ip, or x-real-ip behind nginx)
+const CLIENT_IP_HEADER = (process.env.CLIENT_IP_HEADER || '').toLowerCase();
+// Proxies in front of the app that append to X-Forwarded-For
+const TRUSTED_PROXY_HOPS = parseInt(process.env.TRUSTED_PROXY_HOPS || '1');
+
+/**
+ * Client address as reported by the proxies in front of the app
+ * Entries at the start of X-Forwarded-For come from the client and can say
+ * anything; each trusted proxy appends the address it was connected from,
+ * so the client is the entry TRUSTED_PROXY_HOPS from the right.
+ * @param {Headers} headers - Request headers
+ * @returns {string|null}
+ */
+export function getClientIp(headers) {
+  if (CLIENT_IP_HEADER) {
+    return headers.get(CLIENT_IP_HEADER)?.trim() || null;
+  }
+  const forwarded = (headers.get('x-forwarded-for') || '').split(',').map(entry => entry.trim()).filter(Boolean);
+  if (TRUSTED_PROXY_HOPS < 1 || forwarded.length < TRUSTED_PROXY_HOPS) {
+    return null;
+  }
+  return forwarded[forwarded.length - TRUSTED_PROXY_HOPS];
+}
+
+/**
+ * Enrichment fields for the events reported by a request
+ * @param {Headers} headers - Request headers
+ * @returns {Object} { country, ua_device, ua_os, ua_browser }
+ */
+export function getRequestEnrichment(headers) {
+  const country = lookupCountry(getClientIp(headers)) ||
+    normalizeCountry(headers.get('x-vercel-ip-country') || headers.get('cf-ipcountry'));
+  const ua = parseUserAgent(headers.get('user-agent'));
+  return { country, ua_device: ua.device, ua_os: ua.os, ua_browser: ua.browser };
+}
+
+export function getEnrichmentStats() {
+  return {
+    geoip: getGeoIpStats(),
+    userAgents: getUserAgentStats()
+  };
+}
@@ -0,0 +1,249 @@
+// Live scan and event fan-out for dashboards
+// Counted scans and ingested events are published here by owner, and every
+// open GET /api/stream connection for that owner receives them as
+// Server-Sent Events. Each subscriber coalesces what it has not been sent
+// yet into per-code counters plus a short list of the latest events; one
+// shared timer writes that as a single message to every subscriber whose
+// stream has room. A slow client therefore gets fewer, bigger updates
+// instead of a growing backlog. The hub is per process, so each instance
+// streams the scans it served.
+
+import { onShutdown } from './shutdown';
+import { counter, gauge } from './metrics';
+
+const SSE_FLUSH_INTERVAL_MS = parseInt(process.env.SSE_FLUSH_INTERVAL_MS || '500');
+const SSE_HEARTBEAT_MS = parseInt(process.env.SSE_HEARTBEAT_MS || '15000');
+const SSE_MAX_SUBSCRIBERS = parseInt(process.env.SSE_MAX_SUBSCRIBERS || '2000');
+// Latest events kept per subscriber between writes; older ones are dropped (counters still include them)
+const SSE_RECENT_EVENTS = 20;
+// Client reconnect delay sent in the stream
+const SSE_RETRY_MS = 5000;
+
+// Topic for demo mode, where codes are not scoped to a user
+const ALL = '*';
+
+const encoder = new TextEncoder();
+
+const topics = new Map();
+let subscriberCount = 0;
+let timer = null;
+
+const stats = {
+  published: 0,
+  messages: 0,
+  deferred: 0,
+  droppedEvents: 0,
+  rejected: 0
+};
+
+const subscribersGauge = gauge('sse_subscribers', 'Open Server-Sent Event streams');
+const messagesTotal = counter('sse_messages_total', 'Server-Sent Event messages written by kind', ['kind']);
+
+class Subscriber {
+  constructor(topic) {
+    this.topic = topic;
+    this.controller = null;
+    this.counters = new Map();
+    this.recent = [];
+    this.dropped = 0;
+    this.lastWriteAt = Date.now();
+  }
+
+  counterFor(slug) {
+    let entry = this.counters.get(slug);
+    if (!entry) {
+      entry = { scans: 0, events: {} };
+      this.counters.set(slug, entry);
+    }
+    return entry;
+  }
+
+  addScan(slug) {
+    this.counterFor(slug).scans++;
+  }
+
+  addEvent(event) {
+    const entry = this.counterFor(event.slug);
+    entry.events[event.event_type] = (entry.events[event.event_type] || 0) + 1;
+    this.recent.push(event);
+    if (this.recent.length > SSE_RECENT_EVENTS) {
+      this.recent.shift();
+      this.dropped++;
+      stats.droppedEvents++;
+    }
+  }
+
+  write(text, kind) {
+    try {
+      this.controller.enqueue(encoder.encode(text));
+    } catch {
+      // Stream already closed; removed on cancel
+      return;
+    }
+    this.lastWriteAt = Date.now();
+    stats.messages++;
+    messagesTotal.inc({ kind });
+  }
+
+  // Send everything pending as one message if the client has room for it
+  flush(now) {
+    if (this.controller.desiredSize <= 0) {
+      if (this.counters.size > 0) stats.deferred++;
+      return;
+    }
+    if (this.counters.size > 0) {
+      const update = {
+        counters: Object.fromEntries(this.counters),
+        events: this.recent,
+        dropped: this.dropped
+      };
+      this.counters = new Map();
+      this.recent = [];
+      this.dropped = 0;
+      this.write(`event: update\ndata: ${JSON.stringify(update)}\n\n`, 'update');
+    } else if (now - this.lastWriteAt >= SSE_HEARTBEAT_MS) {
+      this.write(': ping\n\n', 'heartbeat');
+    }
+  }
+}
+
+function forEachSubscriber(userId, fn) {
+  for (const topic of [userId, ALL]) {
+    const subscribers = topic && topics.get(topic);
+    if (subscribers) {
+      subscribers.forEach(fn);
+    }
+  }
+}
+
+function flushAll() {
+  const now = Date.now();
+  for (const subscribers of topics.values()) {
+    for (const subscriber of subscribers) {
+      subscriber.flush(now);
+    }
+  }
+}
+
+function addSubscriber(subscriber) {
+  if (!topics.has(subscriber.topic)) {
+    topics.set(subscriber.topic, new Set());
+  }
+  topics.get(subscriber.topic).add(subscriber);
+  subscriberCount++;
+  subscribersGauge.set({}, subscriberCount);
+  if (!timer) {
+    timer = setInterval(flushAll, SSE_FLUSH_INTERVAL_MS);
+    timer.unref?.();
+  }
+}
+
+function removeSubscriber(subscriber) {
+  const subscribers = topics.get(subscriber.topic);
+  if (!subscribers?.delete(subscriber)) {
+    return;
+  }
+  if (subscribers.size === 0) {
+    topics.delete(subscriber.topic);
+  }
+  subscriberCount--;
+  subscribersGauge.set({}, subscriberCount);
+  if (subscriberCount === 0 && timer) {
+    clearInterval(timer);
+    timer = null;
+  }
+}
+
+/**
+ * Open a live stream of an owner's scans and events
+ * @param {string|null} userId - Owner (null in demo mode: all codes)
+ * @param {AbortSignal} signal - Request signal; the stream closes when it aborts
+ * @returns {ReadableStream<Uint8Array>|null} text/event-stream body, or null if at SSE_MAX_SUBSCRIBERS
+ */
+export function openEventStream(userId, signal) {
+  if (subscriberCount >= SSE_MAX_SUBSCRIBERS) {
+    stats.rejected++;
+    return null;
+  }
+  const subscriber = new Subscriber(userId || ALL);
+
+  return new ReadableStream({
+    start(controller) {
+      subscriber.controller = controller;
+      addSubscriber(subscriber);
+      subscriber.write(`retry: ${SSE_RETRY_MS}\nevent: ready\ndata: {}\n\n`, 'ready');
+      signal?.addEventListener('abort', () => {
+        removeSubscriber(subscriber);
+        try {
+          controller.close();
+        } catch {
+          // Already closed
+        }
+      }, { once: true });
+    },
+    cancel() {
+      removeSubscriber(subscriber);
+    }
+  });
+}
+
+/**
+ * Publish a counted scan
+ * @param {string} userId - Owner of the code
+ * @param {string} slug - QR slug
+ */
+export function publishScan(userId, slug) {
+  if (subscriberCount === 0) {
+    return;
+  }
+  stats.published++;
+  forEachSubscriber(userId, subscriber => subscriber.addScan(slug));
+}
+
+/**
+ * Publish ingested events
+ * @param {string} userId - Owner of the codes
+ * @param {Array<Object>} events - qr_events rows with slug
+ */
+export function publishEvents(userId, events) {
+  if (subscriberCount === 0 || events.length === 0) {
+    return;
+  }
+  stats.published += events.length;
+  const summaries = events.map(event => ({
+    slug: event.slug,
+    event_type: event.event_type,
+    country: event.country || null,
+    created_at: event.created_at
+  }));
+  forEachSubscriber(userId, subscriber => summaries.forEach(event => subscriber.addEvent(event)));
+}
+
+/**
+ * Send pending updates and close every stream (clients reconnect elsewhere)
+ */
+export function closeEventStreams() {
+  flushAll();
+  for (const subscribers of [...topics.values()]) {
+    for (const subscriber of [...subscribers]) {
+      removeSubscriber(subscriber);
+      try {
+        subscriber.controller.close();
+      } catch {
+        // Already closed
+      }
+    }
+  }
+}
+
+export function getEventHubStats() {
+  return {
+    ...stats,
+    subscribers: subscriberCount,
+    owners: topics.size,
+    flushIntervalMs: SSE_FLUSH_INTERVAL_MS,
+    maxSubscribers: SSE_MAX_SUBSCRIBERS
+  };
+}
+
+onShutdown('event-hub', closeEventStreams);
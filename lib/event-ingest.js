@@ -0,0 +1,248 @@
+// Buffered event ingestion
+// Tracking calls are queued in memory and written to qr_events as multi-row
+// inserts. Slugs are resolved to qr_code ids from a local map, with unknown
+// slugs looked up in bulk once per flush instead of once per event. Written
+// events are published to live dashboard streams (see event-hub.js).
+
+import { supabaseAdmin } from './supabase';
+import { LruCache } from './lru-cache';
+import { onShutdown } from './shutdown';
+import { publishEvents } from './event-hub';
+
+export const EVENT_TYPES = ['scan', 'clicked', 'paid', 'minted', 'redirect'];
+
+const EVENT_FLUSH_INTERVAL_MS = parseInt(process.env.EVENT_FLUSH_INTERVAL_MS || '1000');
+const EVENT_FLUSH_BATCH_SIZE = parseInt(process.env.EVENT_FLUSH_BATCH_SIZE || '500');
+const EVENT_BUFFER_MAX = parseInt(process.env.EVENT_BUFFER_MAX || '20000');
+export const MAX_EVENTS_PER_REQUEST = 100;
+
+const NO_ENRICHMENT = { country: null, ua_device: null, ua_os: null, ua_browser: null };
+
+// Slug -> { id, userId } of the qr_code. Neither changes for a slug, so entries live long.
+const qrIds = new LruCache({ maxEntries: 50000, ttlMs: 60 * 60 * 1000 });
+
+let buffer = [];
+let flushing = null;
+let timer = null;
+
+const stats = {
+  accepted: 0,
+  rejected: 0,
+  dropped: 0,
+  unresolved: 0,
+  flushed: 0,
+  flushes: 0,
+  failedFlushes: 0
+};
+
+/**
+ * Remember a slug's qr_code id and owner (e.g. after a scan resolved the row)
+ * @param {string} slug - QR slug
+ * @param {string} id - qr_codes.id
+ * @param {string} userId - qr_codes.user_id
+ */
+export function rememberQrId(slug, id, userId) {
+  if (slug && id) {
+    qrIds.set(slug, { id, userId });
+  }
+}
+
+/**
+ * Forget a slug's id after the QR code was deleted
+ * @param {string} slug - QR slug
+ */
+export function forgetQrId(slug) {
+  if (slug) {
+    qrIds.delete(slug);
+  }
+}
+
+/**
+ * Normalize a tracking payload into a qr_events row (minus qr_code_id).
+ * Country and user agent come from the request (see getRequestEnrichment),
+ * not from the payload.
+ * @param {string} slug - QR slug
+ * @param {Object} event - Tracking payload
+ * @param {Object} enrichment - { country, ua_device, ua_os, ua_browser } for the reporting request
+ * @returns {Object|null} Row, or null if the payload is not an object or the event type is not allowed
+ */
+export function normalizeEvent(slug, event, enrichment = NO_ENRICHMENT) {
+  if (!event || typeof event !== 'object' || Array.isArray(event)) {
+    return null;
+  }
+  const eventType = event.event_type || 'scan';
+  if (!EVENT_TYPES.includes(eventType)) {
+    return null;
+  }
+  return {
+    slug,
+    event_type: eventType,
+    country: enrichment.country,
+    ua_device: enrichment.ua_device,
+    ua_os: enrichment.ua_os,
+    ua_browser: enrichment.ua_browser,
+    metadata: event.metadata || {},
+    created_at: new Date().toISOString()
+  };
+}
+
+/**
+ * Queue events for a slug
+ * @param {string} slug - QR slug
+ * @param {Array<Object>} events - Tracking payloads
+ * @param {Object} enrichment - Request enrichment (see normalizeEvent)
+ * @returns {Object} { accepted, rejected, dropped }
+ */
+export function enqueueEvents(slug, events, enrichment) {
+  let accepted = 0;
+  let rejected = 0;
+  let dropped = 0;
+
+  for (const event of events) {
+    const row = normalizeEvent(slug, event, enrichment);
+    if (!row) {
+      rejected++;
+      continue;
+    }
+    if (buffer.length >= EVENT_BUFFER_MAX) {
+      dropped++;
+      continue;
+    }
+    buffer.push(row);
+    accepted++;
+  }
+
+  stats.accepted += accepted;
+  stats.rejected += rejected;
+  stats.dropped += dropped;
+
+  if (buffer.length >= EVENT_FLUSH_BATCH_SIZE) {
+    flushEvents();
+  } else if (buffer.length > 0) {
+    scheduleFlush();
+  }
+
+  return { accepted, rejected, dropped };
+}
+
+/**
+ * Look up ids for slugs missing from the local map with one query
+ */
+async function resolveQrIds(slugs) {
+  const missing = slugs.filter(slug => qrIds.get(slug) === undefined);
+  if (missing.length > 0) {
+    const { data, error } = await supabaseAdmin
+      .from('qr_codes')
+      .select('id, slug, user_id')
+      .in('slug', missing);
+    if (error) throw error;
+    for (const row of data || []) {
+      qrIds.set(row.slug, { id: row.id, userId: row.user_id });
+    }
+  }
+}
+
+async function insertBatch(batch) {
+  const slugs = [...new Set(batch.map(event => event.slug))];
+  await resolveQrIds(slugs);
+
+  const rows = [];
+  const byOwner = new Map();
+  for (const { slug, ...event } of batch) {
+    const qr = qrIds.get(slug);
+    if (!qr) {
+      stats.unresolved++;
+      continue;
+    }
+    rows.push({ qr_code_id: qr.id, ...event });
+    if (!byOwner.has(qr.userId)) {
+      byOwner.set(qr.userId, []);
+    }
+    byOwner.get(qr.userId).push({ slug, ...event });
+  }
+  if (rows.length === 0) {
+    return 0;
+  }
+
+  const { error } = await supabaseAdmin.from('qr_events').insert(rows);
+  if (error) {
+    error.slugs = slugs;
+    throw error;
+  }
+  byOwner.forEach((events, userId) => publishEvents(userId, events));
+  return rows.length;
+}
+
+/**
+ * Write buffered events in chunks of EVENT_FLUSH_BATCH_SIZE rows
+ * @returns {Promise<void>} Resolves when the buffer has been drained or a write failed
+ */
+export function flushEvents() {
+  if (flushing) {
+    return flushing;
+  }
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (buffer.length === 0 || !supabaseAdmin) {
+    return Promise.resolve();
+  }
+
+  flushing = (async () => {
+    while (buffer.length > 0) {
+      const batch = buffer.splice(0, EVENT_FLUSH_BATCH_SIZE);
+      try {
+        let written;
+        try {
+          written = await insertBatch(batch);
+        } catch (error) {
+          // A code deleted on another instance leaves a stale id behind; re-resolve once
+          if (error.code !== '23503') throw error;
+          (error.slugs || []).forEach(forgetQrId);
+          written = await insertBatch(batch);
+        }
+        stats.flushes++;
+        stats.flushed += written;
+      } catch (error) {
+        console.error('Error flushing events:', error);
+        stats.failedFlushes++;
+        // Requeue what still fits and retry on the next interval
+        const room = Math.max(EVENT_BUFFER_MAX - buffer.length, 0);
+        stats.dropped += Math.max(batch.length - room, 0);
+        buffer = batch.slice(0, room).concat(buffer);
+        break;
+      }
+    }
+  })().finally(() => {
+    flushing = null;
+    if (buffer.length > 0) {
+      scheduleFlush();
+    }
+  });
+
+  return flushing;
+}
+
+function scheduleFlush() {
+  if (timer || flushing) {
+    return;
+  }
+  timer = setTimeout(() => {
+    timer = null;
+    flushEvents();
+  }, EVENT_FLUSH_INTERVAL_MS);
+  timer.unref?.();
+}
+
+export function getEventIngestStats() {
+  return {
+    ...stats,
+    buffered: buffer.length,
+    bufferMax: EVENT_BUFFER_MAX,
+    batchSize: EVENT_FLUSH_BATCH_SIZE,
+    flushIntervalMs: EVENT_FLUSH_INTERVAL_MS
+  };
+}
+
+onShutdown('event-ingest', flushEvents);
@@ -0,0 +1,313 @@
+// IP -> country lookup from a local MaxMind DB (.mmdb) file
+// Works with GeoLite2-Country/City or DB-IP Lite Country databases. The file
+// is read once into a single Buffer and lookups walk its search tree in
+// place; the only decoding is of the record a lookup lands on, and decoded
+// records are cached by their offset, so a lookup is a few dozen buffer
+// reads. Set GEOIP_DB_PATH to enable it.
+
+import { readFileSync } from 'fs';
+import { isIP } from 'net';
+import { LruCache } from './lru-cache';
+
+const GEOIP_DB_PATH = process.env.GEOIP_DB_PATH || '';
+
+const METADATA_MARKER = Buffer.from('abcdef4d61784d696e642e636f6d', 'hex'); // \xAB\xCD\xEFMaxMind.com
+const METADATA_MAX_SIZE = 128 * 1024;
+const DATA_SECTION_SEPARATOR = 16;
+
+const stats = {
+  lookups: 0,
+  found: 0,
+  invalid: 0
+};
+
+export class MmdbReader {
+  /**
+   * @param {Buffer} buffer - Contents of a .mmdb file
+   */
+  constructor(buffer) {
+    const markerStart = buffer.lastIndexOf(METADATA_MARKER, buffer.length - 1);
+    if (markerStart < 0 || markerStart < buffer.length - METADATA_MAX_SIZE - METADATA_MARKER.length) {
+      throw new Error('Not a MaxMind DB file (metadata marker not found)');
+    }
+    const metadataStart = markerStart + METADATA_MARKER.length;
+    this.buffer = buffer;
+    this.metadata = new MmdbDecoder(buffer, metadataStart).decode(metadataStart)[0];
+
+    const { node_count: nodeCount, record_size: recordSize, ip_version: ipVersion } = this.metadata;
+    if (![24, 28, 32].includes(recordSize)) {
+      throw new Error(`Unsupported MaxMind DB record size: ${recordSize}`);
+    }
+    this.nodeCount = nodeCount;
+    this.recordSize = recordSize;
+    this.nodeBytes = recordSize / 4;
+    this.ipVersion = ipVersion;
+    this.treeSize = this.nodeBytes * nodeCount;
+    this.decoder = new MmdbDecoder(buffer, this.treeSize + DATA_SECTION_SEPARATOR);
+    this.records = new LruCache({ maxEntries: 10000, ttlMs: Number.MAX_SAFE_INTEGER });
+
+    // IPv4 addresses live under ::/96 in an IPv6 tree; find that node once
+    this.ipv4Start = 0;
+    if (ipVersion === 6) {
+      let node = 0;
+      for (let i = 0; i < 96 && node < nodeCount; i++) {
+        node = this.readRecord(node, 0);
+      }
+      this.ipv4Start = node;
+    }
+  }
+
+  readRecord(node, bit) {
+    const buf = this.buffer;
+    const offset = node * this.nodeBytes;
+    switch (this.recordSize) {
+      case 24: {
+        const at = offset + bit * 3;
+        return (buf[at] << 16) | (buf[at + 1] << 8) | buf[at + 2];
+      }
+      case 28: {
+        const middle = buf[offset + 3];
+        return bit === 0
+          ? ((middle & 0xf0) << 20) | (buf[offset] << 16) | (buf[offset + 1] << 8) | buf[offset + 2]
+          : ((middle & 0x0f) << 24) | (buf[offset + 4] << 16) | (buf[offset + 5] << 8) | buf[offset + 6];
+      }
+      default:
+        return buf.readUInt32BE(offset + bit * 4);
+    }
+  }
+
+  /**
+   * Find the record for an address
+   * @param {string} ip - IPv4 or IPv6 address
+   * @returns {Object|null} Decoded record, or null if the address is not in the database
+   */
+  get(ip) {
+    const bytes = parseIp(ip);
+    if (!bytes) {
+      return null;
+    }
+    if (bytes.length === 16 && this.ipVersion === 4) {
+      return null;
+    }
+
+    let node = bytes.length === 4 ? this.ipv4Start : 0;
+    const bitCount = bytes.length * 8;
+    for (let i = 0; i < bitCount && node < this.nodeCount; i++) {
+      const bit = (bytes[i >> 3] >> (7 - (i & 7))) & 1;
+      node = this.readRecord(node, bit);
+    }
+    if (node <= this.nodeCount) {
+      return null;
+    }
+
+    const offset = node - this.nodeCount - DATA_SECTION_SEPARATOR;
+    let record = this.records.get(offset);
+    if (record === undefined) {
+      record = this.decoder.decode(this.decoder.base + offset)[0];
+      this.records.set(offset, record);
+    }
+    return record;
+  }
+}
+
+// Decoder for the MaxMind DB data section format
+class MmdbDecoder {
+  /**
+   * @param {Buffer} buffer - Whole database file
+   * @param {number} base - Absolute offset that pointers are relative to
+   */
+  constructor(buffer, base) {
+    this.buffer = buffer;
+    this.base = base;
+  }
+
+  /**
+   * Decode the value at an absolute offset
+   * @returns {Array} [value, offset just past it]
+   */
+  decode(offset) {
+    const buf = this.buffer;
+    const ctrl = buf[offset++];
+    let type = ctrl >> 5;
+
+    if (type === 1) {
+      const pointerSize = (ctrl >> 3) & 0x3;
+      const high = ctrl & 0x7;
+      let pointer;
+      if (pointerSize === 0) {
+        pointer = (high << 8) | buf[offset];
+      } else if (pointerSize === 1) {
+        pointer = ((high << 16) | buf.readUInt16BE(offset)) + 2048;
+      } else if (pointerSize === 2) {
+        pointer = ((high << 24) | buf.readUIntBE(offset, 3)) + 526336;
+      } else {
+        pointer = buf.readUInt32BE(offset);
+      }
+      return [this.decode(this.base + pointer)[0], offset + pointerSize + 1];
+    }
+
+    if (type === 0) {
+      type = 7 + buf[offset++];
+    }
+
+    let size = ctrl & 0x1f;
+    if (size === 29) {
+      size = 29 + buf[offset++];
+    } else if (size === 30) {
+      size = 285 + buf.readUInt16BE(offset);
+      offset += 2;
+    } else if (size === 31) {
+      size = 65821 + buf.readUIntBE(offset, 3);
+      offset += 3;
+    }
+
+    switch (type) {
+      case 2: // utf8 string
+        return [buf.toString('utf8', offset, offset + size), offset + size];
+      case 3: // double
+        return [buf.readDoubleBE(offset), offset + 8];
+      case 4: // bytes
+        return [buf.subarray(offset, offset + size), offset + size];
+      case 5: // uint16
+      case 6: // uint32
+        return [size === 0 ? 0 : buf.readUIntBE(offset, size), offset + size];
+      case 8: // int32
+        return [size === 0 ? 0 : size === 4 ? buf.readInt32BE(offset) : buf.readUIntBE(offset, size), offset + size];
+      case 9: // uint64
+      case 10: { // uint128
+        let value = 0n;
+        for (let i = 0; i < size; i++) {
+          value = (value << 8n) | BigInt(buf[offset + i]);
+        }
+        return [value <= BigInt(Number.MAX_SAFE_INTEGER) ? Number(value) : value, offset + size];
+      }
+      case 7: { // map
+        const map = {};
+        for (let i = 0; i < size; i++) {
+          const [key, afterKey] = this.decode(offset);
+          const [value, afterValue] = this.decode(afterKey);
+          map[key] = value;
+          offset = afterValue;
+        }
+        return [map, offset];
+      }
+      case 11: { // array
+        const array = [];
+        for (let i = 0; i < size; i++) {
+          const [value, next] = this.decode(offset);
+          array.push(value);
+          offset = next;
+        }
+        return [array, offset];
+      }
+      case 14: // boolean
+        return [size !== 0, offset];
+      case 15: // float
+        return [buf.readFloatBE(offset), offset + 4];
+      default:
+        throw new Error(`Unsupported MaxMind DB data type: ${type}`);
+    }
+  }
+}
+
+/**
+ * Parse an address into its bytes; IPv4-mapped IPv6 addresses become IPv4
+ * @param {string} ip - Address
+ * @returns {Array<number>|null} 4 or 16 bytes, or null if invalid
+ */
+function parseIp(ip) {
+  const version = isIP(ip);
+  if (version === 4) {
+    return ip.split('.').map(Number);
+  }
+  if (version !== 6) {
+    return null;
+  }
+
+  let address = ip.split('%')[0].toLowerCase();
+  let tail = [];
+  const dotted = address.match(/:(\d+\.\d+\.\d+\.\d+)$/);
+  if (dotted) {
+    const v4 = dotted[1].split('.').map(Number);
+    tail = [(v4[0] << 8) | v4[1], (v4[2] << 8) | v4[3]];
+    // The dotted quad stands for two groups
+    address = address.slice(0, -dotted[1].length) + '0:0';
+  }
+
+  const [head, rest] = address.split('::');
+  const toGroups = (part) => (part ? part.split(':').map(group => parseInt(group, 16)) : []);
+  let groups = toGroups(head);
+  if (rest !== undefined) {
+    const restGroups = toGroups(rest);
+    groups = groups.concat(new Array(8 - groups.length - restGroups.length).fill(0), restGroups);
+  }
+  if (tail.length > 0) {
+    groups = groups.slice(0, 6).concat(tail);
+  }
+
+  // ::ffff:a.b.c.d
+  if (groups.slice(0, 5).every(group => group === 0) && groups[5] === 0xffff) {
+    return [groups[6] >> 8, groups[6] & 0xff, groups[7] >> 8, groups[7] & 0xff];
+  }
+  const bytes = [];
+  for (const group of groups) {
+    bytes.push(group >> 8, group & 0xff);
+  }
+  return bytes;
+}
+
+let reader;
+
+function getReader() {
+  if (reader === undefined) {
+    reader = null;
+    if (GEOIP_DB_PATH) {
+      try {
+        reader = new MmdbReader(readFileSync(GEOIP_DB_PATH));
+      } catch (error) {
+        console.error(`GeoIP database ${GEOIP_DB_PATH} could not be loaded:`, error.message);
+      }
+    }
+  }
+  return reader;
+}
+
+export function isGeoIpConfigured() {
+  return !!getReader();
+}
+
+/**
+ * Look up the ISO-3166 alpha-2 country of an address
+ * @param {string} ip - IPv4 or IPv6 address
+ * @returns {string|null} Country code, or null if unknown or no database is configured
+ */
+export function lookupCountry(ip) {
+  const db = getReader();
+  if (!db || !ip) {
+    return null;
+  }
+  stats.lookups++;
+  let record;
+  try {
+    record = db.get(ip);
+  } catch (error) {
+    stats.invalid++;
+    return null;
+  }
+  const code = record?.country?.iso_code || record?.registered_country?.iso_code || null;
+  if (code) {
+    stats.found++;
+  }
+  return code;
+}
+
+export function getGeoIpStats() {
+  const db = getReader();
+  return {
+    configured: !!db,
+    databaseType: db?.metadata.database_type || null,
+    buildEpoch: db?.metadata.build_epoch || null,
+    ...stats,
+    records: db ? db.records.stats() : null
+  };
+}
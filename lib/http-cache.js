@@ -0,0 +1,104 @@
+// HTTP caching for static-ish JSON responses
+// Plan data, configuration flags and the placeholder NFT/marketplace
+// payloads only change on deploy, so each is serialized once, given a strong
+// ETag, and served with CDN-friendly Cache-Control. Conditional GETs
+// (If-None-Match / If-Modified-Since) are answered with 304 and no body.
+
+import { createHash } from 'crypto';
+import { NextResponse } from 'next/server';
+import { LruCache } from './lru-cache';
+
+const HTTP_CACHE_MAX_ENTRIES = parseInt(process.env.HTTP_CACHE_MAX_ENTRIES || '5000');
+
+// Browsers revalidate after max-age; CDNs keep s-maxage and may serve stale
+// copies while they refetch in the background
+export const CACHE_POLICIES = {
+  config: 'public, max-age=60, s-maxage=300, stale-while-revalidate=3600',
+  catalog: 'public, max-age=300, s-maxage=3600, stale-while-revalidate=86400',
+  immutable: 'public, max-age=3600, s-maxage=86400, stale-while-revalidate=604800',
+  // Indexed chain data (listing state, owners) that the indexer refreshes
+  chain: 'public, max-age=30, s-maxage=60, stale-while-revalidate=600'
+};
+
+// These payloads can only change when the process restarts (a deploy or a
+// config change), so that is their modification time
+const SERVED_SINCE = new Date(Math.floor(Date.now() / 1000) * 1000);
+
+const responseCache = new LruCache({ maxEntries: HTTP_CACHE_MAX_ENTRIES, ttlMs: Infinity });
+
+/**
+ * Whether an If-None-Match header matches an ETag
+ */
+export function matchesEtag(ifNoneMatch, etag) {
+  if (!ifNoneMatch) return false;
+  return ifNoneMatch.split(',').some(tag => {
+    const value = tag.trim();
+    return value === '*' || value === etag || value === `W/${etag}`;
+  });
+}
+
+/**
+ * Serialize a payload once, with its ETag
+ * @param {*} data - JSON-serializable payload
+ * @param {number} modifiedAt - When the data last changed (ms; defaults to process start)
+ * @returns {Object} { body, etag, lastModified }
+ */
+export function serializeJson(data, modifiedAt) {
+  const body = JSON.stringify(data);
+  const etag = `"${createHash('sha256').update(body).digest('base64url').slice(0, 32)}"`;
+  const lastModified = modifiedAt ? new Date(Math.floor(modifiedAt / 1000) * 1000) : SERVED_SINCE;
+  return { body, etag, lastModified };
+}
+
+/**
+ * Get a serialized payload, building it on first use
+ * @param {string} key - Cache key (e.g. the request path)
+ * @param {Function} build - Returns the payload
+ * @returns {Object} { body, etag, lastModified }
+ */
+export function getCachedJson(key, build) {
+  let entry = responseCache.get(key);
+  if (!entry) {
+    entry = serializeJson(build());
+    responseCache.set(key, entry);
+  }
+  return entry;
+}
+
+/**
+ * Whether a request's validators show the client already has the entry
+ * (If-None-Match wins over If-Modified-Since, as in RFC 9110)
+ */
+export function isNotModified(request, entry) {
+  const ifNoneMatch = request.headers.get('if-none-match');
+  if (ifNoneMatch) {
+    return matchesEtag(ifNoneMatch, entry.etag);
+  }
+  const ifModifiedSince = Date.parse(request.headers.get('if-modified-since') || '');
+  return !Number.isNaN(ifModifiedSince) && entry.lastModified.getTime() <= ifModifiedSince;
+}
+
+/**
+ * Respond with a cached JSON entry, or 304 when the client's copy is current
+ * @param {Request} request - Incoming request
+ * @param {Object} entry - From getCachedJson / serializeJson
+ * @param {string} cacheControl - One of CACHE_POLICIES
+ * @returns {NextResponse}
+ */
+export function cachedJsonResponse(request, entry, cacheControl) {
+  const headers = {
+    'ETag': entry.etag,
+    'Last-Modified': entry.lastModified.toUTCString(),
+    'Cache-Control': cacheControl
+  };
+  if (isNotModified(request, entry)) {
+    return new NextResponse(null, { status: 304, headers });
+  }
+  return new NextResponse(entry.body, {
+    headers: { ...headers, 'Content-Type': 'application/json' }
+  });
+}
+
+export function getHttpCacheStats() {
+  return responseCache.stats();
+}
@@ -0,0 +1,81 @@
+// Fixed-bucket latency histogram
+// Constant memory per route however many requests it serves; quantiles are
+// estimated by interpolating within the bucket that holds them.
+
+export const LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000];
+
+export class LatencyHistogram {
+  /**
+   * @param {Array<number>} buckets - Ascending bucket upper bounds in milliseconds
+   */
+  constructor(buckets = LATENCY_BUCKETS_MS) {
+    this.buckets = buckets;
+    // One extra slot for observations above the last bound
+    this.counts = new Array(buckets.length + 1).fill(0);
+    this.count = 0;
+    this.sum = 0;
+    this.max = 0;
+  }
+
+  /**
+   * Record one observation
+   * @param {number} ms - Duration in milliseconds
+   */
+  observe(ms) {
+    let i = 0;
+    while (i < this.buckets.length && ms > this.buckets[i]) i++;
+    this.counts[i]++;
+    this.count++;
+    this.sum += ms;
+    if (ms > this.max) this.max = ms;
+  }
+
+  /**
+   * Estimate a quantile
+   * @param {number} q - Quantile in [0, 1]
+   * @returns {number} Milliseconds (0 when empty)
+   */
+  quantile(q) {
+    if (this.count === 0) {
+      return 0;
+    }
+    const rank = q * this.count;
+    let seen = 0;
+    for (let i = 0; i < this.counts.length; i++) {
+      if (this.counts[i] === 0 || seen + this.counts[i] < rank) {
+        seen += this.counts[i];
+        continue;
+      }
+      const lower = i === 0 ? 0 : this.buckets[i - 1];
+      const upper = i < this.buckets.length ? Math.min(this.buckets[i], this.max) : this.max;
+      return lower + (upper - lower) * ((rank - seen) / this.counts[i]);
+    }
+    return this.max;
+  }
+
+  /**
+   * Cumulative bucket counts as [upper bound, count] pairs, ascending by
+   * bound, ending with ['+Inf', count] for the overflow
+   * @returns {Array<[number|string, number]>}
+   */
+  cumulativeCounts() {
+    let running = 0;
+    return this.counts.map((count, i) => {
+      running += count;
+      return [i < this.buckets.length ? this.buckets[i] : '+Inf', running];
+    });
+  }
+
+  stats() {
+    const round = (ms) => Math.round(ms * 10) / 10;
+    return {
+      count: this.count,
+      meanMs: this.count ? round(this.sum / this.count) : 0,
+      p50Ms: round(this.quantile(0.5)),
+      p95Ms: round(this.quantile(0.95)),
+      p99Ms: round(this.quantile(0.99)),
+      maxMs: round(this.max),
+      buckets: this.cumulativeCounts()
+    };
+  }
+}
@@ -0,0 +1,98 @@
+// Bounded LRU cache with per-entry TTL
+// Backed by a Map, whose insertion order doubles as the recency list
+
+export class LruCache {
+  /**
+   * @param {Object} options
+   * @param {number} options.maxEntries - Maximum number of entries before evicting the least recently used
+   * @param {number} options.ttlMs - Default time-to-live for entries in milliseconds
+   */
+  constructor({ maxEntries = 1000, ttlMs = 60000 } = {}) {
+    this.maxEntries = maxEntries;
+    this.ttlMs = ttlMs;
+    this.entries = new Map();
+    this.hits = 0;
+    this.misses = 0;
+    this.evictions = 0;
+    this.expirations = 0;
+    this.invalidations = 0;
+  }
+
+  /**
+   * Get a live entry, refreshing its recency
+   * @param {string} key - Cache key
+   * @returns {*} Cached value, or undefined on miss
+   */
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+    if (entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      this.expirations++;
+      this.misses++;
+      return undefined;
+    }
+    // Move to the most recently used end
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  /**
+   * Store an entry, evicting the least recently used ones when full
+   * @param {string} key - Cache key
+   * @param {*} value - Value to cache
+   * @param {number} ttlMs - Optional TTL override for this entry
+   */
+  set(key, value, ttlMs = this.ttlMs) {
+    if (ttlMs <= 0) {
+      return;
+    }
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value);
+      this.evictions++;
+    }
+  }
+
+  /**
+   * Remove an entry explicitly
+   * @param {string} key - Cache key
+   * @returns {boolean} Whether an entry was removed
+   */
+  delete(key) {
+    const removed = this.entries.delete(key);
+    if (removed) {
+      this.invalidations++;
+    }
+    return removed;
+  }
+
+  clear() {
+    this.entries.clear();
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  stats() {
+    const lookups = this.hits + this.misses;
+    return {
+      size: this.entries.size,
+      maxEntries: this.maxEntries,
+      ttlMs: this.ttlMs,
+      hits: this.hits,
+      misses: this.misses,
+      hitRate: lookups ? this.hits / lookups : 0,
+      evictions: this.evictions,
+      expirations: this.expirations,
+      invalidations: this.invalidations
+    };
+  }
+}
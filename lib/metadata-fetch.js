@@ -0,0 +1,147 @@
+// Off-chain metadata fetching
+// Token URIs come from contracts anyone can deploy (a marketplace listing can
+// point at any NFT contract), so they are untrusted input. Fetches go out
+// over https only, to hosts that resolve to public addresses: the address is
+// checked when the socket connects, so a DNS answer cannot swap in an
+// internal address after validation. Redirects are followed a few hops, each
+// one checked the same way, and bodies are capped in size.
+//
+// METADATA_ALLOWED_HOSTS lists host:port pairs exempt from these checks
+// (plain http allowed), e.g. 127.0.0.1:8545 for scripts/rpc-standin.mjs.
+
+import http from 'http';
+import https from 'https';
+import { lookup } from 'dns';
+import { isIP } from 'net';
+
+export const METADATA_MAX_BYTES = parseInt(process.env.METADATA_MAX_BYTES || '262144');
+const MAX_REDIRECTS = 3;
+const ALLOWED_HOSTS = new Set(
+  (process.env.METADATA_ALLOWED_HOSTS || '').split(',').map(host => host.trim().toLowerCase()).filter(Boolean)
+);
+
+function ipv4ToNumber(address) {
+  return address.split('.').reduce((n, part) => n * 256 + Number(part), 0);
+}
+
+// [network, prefix length]
+const BLOCKED_IPV4 = [
+  ['0.0.0.0', 8],
+  ['10.0.0.0', 8],
+  ['100.64.0.0', 10],
+  ['127.0.0.0', 8],
+  ['169.254.0.0', 16],
+  ['172.16.0.0', 12],
+  ['192.0.0.0', 24],
+  ['192.168.0.0', 16],
+  ['198.18.0.0', 15],
+  ['224.0.0.0', 3]
+].map(([network, bits]) => [ipv4ToNumber(network), 2 ** (32 - bits)]);
+
+/**
+ * Whether an address is loopback, private, link-local or otherwise not a
+ * public unicast address
+ * @param {string} address - IPv4 or IPv6 address
+ */
+export function isPrivateAddress(address) {
+  if (isIP(address) === 4) {
+    const n = ipv4ToNumber(address);
+    return BLOCKED_IPV4.some(([network, size]) => n >= network && n < network + size);
+  }
+  const lower = address.toLowerCase().replace(/^\[|\]$/g, '');
+  // IPv4-mapped (::ffff:a.b.c.d) and NAT64 (64:ff9b::a.b.c.d) addresses
+  const mapped = lower.match(/^(?:::ffff:|64:ff9b::)(\d+\.\d+\.\d+\.\d+)$/);
+  if (mapped) {
+    return isPrivateAddress(mapped[1]);
+  }
+  if (lower === '::' || lower === '::1' || lower.startsWith('::ffff:')) {
+    return true;
+  }
+  // fc00::/7 unique local, fe80::/10 link-local, ff00::/8 multicast
+  return /^(f[cd]|fe[89ab]|ff)/.test(lower);
+}
+
+// dns.lookup that refuses private answers; runs when the socket connects
+function publicLookup(hostname, options, callback) {
+  lookup(hostname, options, (error, result, family) => {
+    if (error) return callback(error);
+    const addresses = Array.isArray(result) ? result.map(entry => entry.address) : [result];
+    const blocked = addresses.find(isPrivateAddress);
+    if (blocked) {
+      return callback(new Error(`Metadata host ${hostname} resolves to a private address (${blocked})`));
+    }
+    callback(null, result, family);
+  });
+}
+
+function request(url, signal) {
+  const trusted = ALLOWED_HOSTS.has(url.host.toLowerCase());
+  if (url.protocol !== 'https:' && !(trusted && url.protocol === 'http:')) {
+    return Promise.reject(new Error(`Metadata URL scheme not allowed: ${url.protocol}`));
+  }
+  const hostname = url.hostname.replace(/^\[|\]$/g, '');
+  if (!trusted && isIP(hostname) && isPrivateAddress(hostname)) {
+    return Promise.reject(new Error(`Metadata host is a private address: ${hostname}`));
+  }
+
+  const client = url.protocol === 'https:' ? https : http;
+  return new Promise((resolve, reject) => {
+    const req = client.get(url, {
+      headers: { Accept: 'application/json' },
+      signal,
+      ...(!trusted && { lookup: publicLookup })
+    }, resolve);
+    req.on('error', reject);
+  });
+}
+
+function readBody(res, maxBytes) {
+  return new Promise((resolve, reject) => {
+    if (Number(res.headers['content-length']) > maxBytes) {
+      res.destroy();
+      return reject(new Error(`Metadata larger than ${maxBytes} bytes`));
+    }
+    const chunks = [];
+    let size = 0;
+    res.on('data', (chunk) => {
+      size += chunk.length;
+      if (size > maxBytes) {
+        res.destroy();
+        reject(new Error(`Metadata larger than ${maxBytes} bytes`));
+        return;
+      }
+      chunks.push(chunk);
+    });
+    res.on('end', () => resolve(Buffer.concat(chunks).toString('utf8')));
+    res.on('error', reject);
+  });
+}
+
+/**
+ * Fetch and parse a JSON document from an untrusted URL
+ * @param {string} target - http(s) URL
+ * @param {Object} [options]
+ * @param {number} [options.timeoutMs] - Overall deadline, redirects included
+ * @param {number} [options.maxBytes] - Largest body accepted
+ * @returns {Promise<Object>}
+ */
+export async function fetchUntrustedJson(target, { timeoutMs = 5000, maxBytes = METADATA_MAX_BYTES } = {}) {
+  const signal = AbortSignal.timeout(timeoutMs);
+  let url = new URL(target);
+  for (let hops = 0; ; hops++) {
+    const res = await request(url, signal);
+    if (res.statusCode >= 300 && res.statusCode < 400 && res.headers.location) {
+      res.resume();
+      if (hops >= MAX_REDIRECTS) {
+        throw new Error(`Too many redirects: ${target}`);
+      }
+      url = new URL(res.headers.location, url);
+      continue;
+    }
+    if (res.statusCode < 200 || res.statusCode >= 300) {
+      res.resume();
+      throw new Error(`Metadata fetch failed with ${res.statusCode}: ${target}`);
+    }
+    return JSON.parse(await readBody(res, maxBytes));
+  }
+}
@@ -0,0 +1,196 @@
+// In-process metrics
+// Counters, gauges and latency histograms rendered in the Prometheus text
+// exposition format by GET /api/metrics. Recording is a Map lookup and an
+// increment, so it is cheap enough for every request, query and scan.
+// Metrics are per process; Prometheus aggregates across instances.
+
+import { monitorEventLoopDelay } from 'perf_hooks';
+import { LatencyHistogram } from './latency-histogram';
+
+const PREFIX = 'novatok_';
+
+const families = new Map();
+const collectors = new Map();
+
+function labelKey(labelNames, labels) {
+  return labelNames.map(name => String(labels[name] ?? '')).join('\u0000');
+}
+
+function escapeLabel(value) {
+  return String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+}
+
+function formatLabels(labelNames, labels, extra = '') {
+  const parts = labelNames.map(name => `${name}="${escapeLabel(labels[name] ?? '')}"`);
+  if (extra) parts.push(extra);
+  return parts.length ? `{${parts.join(',')}}` : '';
+}
+
+class MetricFamily {
+  constructor(name, help, type, labelNames) {
+    this.name = PREFIX + name;
+    this.help = help;
+    this.type = type;
+    this.labelNames = labelNames;
+    this.children = new Map();
+  }
+
+  child(labels = {}) {
+    const key = labelKey(this.labelNames, labels);
+    let child = this.children.get(key);
+    if (!child) {
+      child = { labels: { ...labels }, value: this.createValue() };
+      this.children.set(key, child);
+    }
+    return child.value;
+  }
+}
+
+class CounterFamily extends MetricFamily {
+  createValue() {
+    return { count: 0 };
+  }
+
+  inc(labels = {}, amount = 1) {
+    this.child(labels).count += amount;
+  }
+
+  // Mirror a cumulative count kept elsewhere (e.g. cache hit totals)
+  set(labels, value) {
+    this.child(labels).count = value;
+  }
+
+  render() {
+    return [...this.children.values()].map(({ labels, value }) => `${this.name}${formatLabels(this.labelNames, labels)} ${value.count}`);
+  }
+}
+
+class GaugeFamily extends CounterFamily {}
+
+class HistogramFamily extends MetricFamily {
+  createValue() {
+    return new LatencyHistogram();
+  }
+
+  /**
+   * Record a duration
+   * @param {Object} labels - Label values
+   * @param {number} ms - Duration in milliseconds (exposed in seconds)
+   */
+  observe(labels, ms) {
+    this.child(labels).observe(ms);
+  }
+
+  /**
+   * Time fn (sync or async), recording the duration even if it throws
+   */
+  time(labels, fn) {
+    const started = performance.now();
+    const done = () => this.observe(labels, performance.now() - started);
+    let result;
+    try {
+      result = fn();
+    } catch (error) {
+      done();
+      throw error;
+    }
+    if (result && typeof result.then === 'function') {
+      return Promise.resolve(result).finally(done);
+    }
+    done();
+    return result;
+  }
+
+  render() {
+    const lines = [];
+    for (const { labels, value } of this.children.values()) {
+      for (const [bound, count] of value.cumulativeCounts()) {
+        const le = bound === '+Inf' ? '+Inf' : String(bound / 1000);
+        lines.push(`${this.name}_bucket${formatLabels(this.labelNames, labels, `le="${le}"`)} ${count}`);
+      }
+      lines.push(`${this.name}_sum${formatLabels(this.labelNames, labels)} ${value.sum / 1000}`);
+      lines.push(`${this.name}_count${formatLabels(this.labelNames, labels)} ${value.count}`);
+    }
+    return lines;
+  }
+}
+
+function register(Family, name, help, type, labelNames) {
+  // Modules can be evaluated more than once in development; reuse the family
+  if (!families.has(name)) {
+    families.set(name, new Family(name, help, type, labelNames));
+  }
+  return families.get(name);
+}
+
+/**
+ * Get or create a counter
+ * @param {string} name - Metric name without the novatok_ prefix
+ * @param {string} help - Description
+ * @param {Array<string>} labelNames - Label names
+ */
+export function counter(name, help, labelNames = []) {
+  return register(CounterFamily, name, help, 'counter', labelNames);
+}
+
+/**
+ * Get or create a gauge
+ */
+export function gauge(name, help, labelNames = []) {
+  return register(GaugeFamily, name, help, 'gauge', labelNames);
+}
+
+/**
+ * Get or create a latency histogram (observed in ms, exposed in seconds)
+ */
+export function histogram(name, help, labelNames = []) {
+  return register(HistogramFamily, name, help, 'histogram', labelNames);
+}
+
+/**
+ * Run fn before each render, to copy stats kept elsewhere into gauges
+ * @param {string} name - Collector name (re-registering replaces it)
+ * @param {Function} fn - Synchronous collector
+ */
+export function onCollect(name, fn) {
+  collectors.set(name, fn);
+}
+
+// Event-loop lag: how late timers fire, i.e. how long requests queue behind
+// synchronous work. Reset on each scrape, so values cover the last interval.
+const eventLoopDelay = monitorEventLoopDelay({ resolution: 20 });
+eventLoopDelay.enable();
+const eventLoopLag = gauge('event_loop_lag_seconds', 'Event loop delay since the previous scrape', ['stat']);
+
+onCollect('eventLoop', () => {
+  const seconds = (ns) => (Number.isFinite(ns) ? ns / 1e9 : 0);
+  eventLoopLag.set({ stat: 'mean' }, seconds(eventLoopDelay.mean));
+  eventLoopLag.set({ stat: 'p50' }, seconds(eventLoopDelay.percentile(50)));
+  eventLoopLag.set({ stat: 'p99' }, seconds(eventLoopDelay.percentile(99)));
+  eventLoopLag.set({ stat: 'max' }, seconds(eventLoopDelay.max));
+  eventLoopDelay.reset();
+});
+
+/**
+ * Render all metrics in the Prometheus text format (version 0.0.4)
+ * @returns {string}
+ */
+export function renderMetrics() {
+  for (const collect of collectors.values()) {
+    try {
+      collect();
+    } catch (error) {
+      console.error('Metrics collector failed:', error);
+    }
+  }
+  const lines = [];
+  for (const family of families.values()) {
+    if (family.children.size === 0) continue;
+    lines.push(`# HELP ${family.name} ${family.help}`);
+    lines.push(`# TYPE ${family.name} ${family.type}`);
+    lines.push(...family.render());
+  }
+  return lines.join('\n') + '\n';
+}
+
+export const METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8';
@@ -1,33 +1,661 @@
 // MongoDB fallback when Supabase is not configured
 import { MongoClient } from 'mongodb';
 import { v4 as uuidv4 } from 'uuid';
+import { compareQrKeys, isAfterCursor, projectQr } from './qr-list';
+import { timed } from './request-timing';
+import { histogram } from './metrics';
 
 const mongoUrl = process.env.MONGO_URL;
 const dbName = process.env.DB_NAME || 'novatok_qr_hub';
 
+export const isMongoConfigured = !!mongoUrl;
+
+// Sized for many short queries per request across a handful of server workers
+const MONGO_CLIENT_OPTIONS = {
+  maxPoolSize: parseInt(process.env.MONGO_MAX_POOL_SIZE || '50'),
+  minPoolSize: parseInt(process.env.MONGO_MIN_POOL_SIZE || '5'),
+  maxIdleTimeMS: 60000,
+  waitQueueTimeoutMS: 5000,
+  serverSelectionTimeoutMS: 5000,
+  retryWrites: true
+};
+
 let client = null;
 let db = null;
+let connecting = null;
+let mongoStore = null;
 
-export async function getMongoDb() {
+export function getMongoDb() {
   if (!mongoUrl) {
-    return null;
+    return Promise.resolve(null);
   }
   
-  if (!client) {
-    client = new MongoClient(mongoUrl);
-    await client.connect();
-    db = client.db(dbName);
+  if (!connecting) {
+    // Share one in-flight connect so concurrent first requests don't open several pools
+    connecting = (async () => {
+      client = new MongoClient(mongoUrl, MONGO_CLIENT_OPTIONS);
+      await client.connect();
+      db = client.db(dbName);
+      await ensureIndexes(db);
+      return db;
+    })().catch(error => {
+      connecting = null;
+      client = null;
+      db = null;
+      throw error;
+    });
   }
   
-  return db;
+  return connecting;
 }
 
-// Simple in-memory store for demo mode (when no DB is configured)
-let memoryStore = {
-  users: [],
-  qr_codes: [],
-  qr_events: []
-};
+async function ensureIndexes(database) {
+  await Promise.all([
+    database.collection('qr_codes').createIndexes([
+      { key: { slug: 1 }, name: 'slug_unique', unique: true },
+      // id breaks ties between codes created in the same millisecond (bulk creates)
+      { key: { user_id: 1, created_at: -1, _id: -1 }, name: 'user_created' },
+      { key: { created_at: -1, _id: -1 }, name: 'created' }
+    ]),
+    database.collection('qr_events').createIndexes([
+      { key: { qr_code_id: 1, created_at: -1 }, name: 'qr_created' },
+      { key: { created_at: 1 }, name: 'created_at' }
+    ]),
+    database.collection('user_plans').createIndexes([
+      { key: { stripe_customer_id: 1 }, name: 'stripe_customer', sparse: true }
+    ]),
+    database.collection('users').createIndexes([
+      { key: { email: 1 }, name: 'email_unique', unique: true }
+    ]),
+    database.collection('sessions').createIndexes([
+      { key: { expires_at: 1 }, name: 'expires_ttl', expireAfterSeconds: 0 }
+    ]),
+    // Expired entries are kept a day so they can still be served if a refresh fails
+    database.collection('chain_metadata_cache').createIndexes([
+      { key: { expires_at: 1 }, name: 'expires_ttl', expireAfterSeconds: 86400 }
+    ]),
+    // Unprocessed webhook events, soonest due first, for the retry sweep
+    database.collection('stripe_webhook_events').createIndexes([
+      { key: { next_attempt_at: 1 }, name: 'pending_next_attempt', partialFilterExpression: { processed_at: null } }
+    ])
+  ]);
+}
+
+// user_scan_usage month key (UTC), e.g. '2026-10-01'
+function scanUsageMonth(date) {
+  return `${date.toISOString().slice(0, 7)}-01`;
+}
+
+// Documents use the row id as _id; the API keeps exposing it as `id`
+function fromDoc(doc, idField = 'id') {
+  if (!doc) {
+    return null;
+  }
+  const { _id, ...rest } = doc;
+  return { [idField]: _id, ...rest };
+}
+
+function toDoc(row, idField = 'id') {
+  const { [idField]: id, ...rest } = row;
+  return { _id: id, ...rest };
+}
+
+// Rows within [since, until) that sort after `after` by (created_at, id);
+// created_at is stored as an ISO string
+function exportFilter({ since, until, after }) {
+  const filter = { created_at: { $gte: since.toISOString(), $lt: until.toISOString() } };
+  if (after) {
+    filter.$or = [
+      { created_at: { $gt: after.created_at } },
+      { created_at: after.created_at, _id: { $gt: after.id } }
+    ];
+  }
+  return filter;
+}
+
+function isExportMatch(row, { since, until, after }) {
+  const createdAt = new Date(row.created_at);
+  if (createdAt < since || createdAt >= until) {
+    return false;
+  }
+  return !after || row.created_at > after.created_at || (row.created_at === after.created_at && row.id > after.id);
+}
+
+// Oldest first, ties broken by id
+function compareExportKeys(a, b) {
+  if (a.created_at !== b.created_at) {
+    return a.created_at < b.created_at ? -1 : 1;
+  }
+  if (a.id === b.id) return 0;
+  return a.id < b.id ? -1 : 1;
+}
+
+// MongoDB-backed store with the same interface as the in-memory store
+class MongoStore {
+  constructor(database) {
+    this.persistent = true;
+    this.qrCodes = database.collection('qr_codes');
+    this.qrEvents = database.collection('qr_events');
+    this.userPlans = database.collection('user_plans');
+    this.counters = database.collection('counters');
+    this.chainMetadata = database.collection('chain_metadata_cache');
+    this.scanUsage = database.collection('user_scan_usage');
+    this.webhookEvents = database.collection('stripe_webhook_events');
+    this.users = database.collection('users');
+    this.sessions = database.collection('sessions');
+  }
+
+  async insertQr(qr) {
+    await this.qrCodes.insertOne(toDoc(qr));
+    return qr;
+  }
+
+  async insertQrs(qrs) {
+    if (qrs.length > 0) {
+      await this.qrCodes.insertMany(qrs.map(qr => toDoc(qr)));
+    }
+    return qrs;
+  }
+
+  async getQrById(id) {
+    return fromDoc(await this.qrCodes.findOne({ _id: id }));
+  }
+
+  async getQrBySlug(slug) {
+    return fromDoc(await this.qrCodes.findOne({ slug }));
+  }
+
+  // userId, when given, limits updates and deletes to the owner's codes
+  async updateQr(id, updates, userId) {
+    const { id: _id, slug: _slug, user_id: _userId, ...changes } = updates;
+    return fromDoc(await this.qrCodes.findOneAndUpdate(
+      userId ? { _id: id, user_id: userId } : { _id: id },
+      { $set: changes },
+      { returnDocument: 'after' }
+    ));
+  }
+
+  async deleteQr(id, userId) {
+    const qr = fromDoc(await this.qrCodes.findOneAndDelete(userId ? { _id: id, user_id: userId } : { _id: id }));
+    if (qr) {
+      // Mirror ON DELETE CASCADE from the Postgres schema
+      await this.qrEvents.deleteMany({ qr_code_id: id });
+    }
+    return qr;
+  }
+
+  async listQrsByUser(userId) {
+    const docs = await this.qrCodes.find({ user_id: userId }).sort({ created_at: -1, _id: -1 }).toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+
+  /**
+   * One keyset page of codes, newest first
+   * @param {Object} options - { userId?, cursor?, limit, fields? }
+   * @returns {Promise<Array<Object>>} Up to limit + 1 rows
+   */
+  async listQrsPage({ userId, cursor, limit, fields }) {
+    const filter = userId ? { user_id: userId } : {};
+    if (cursor) {
+      filter.$or = [
+        { created_at: { $lt: cursor.createdAt } },
+        { created_at: cursor.createdAt, _id: { $lt: cursor.id } }
+      ];
+    }
+    const options = { sort: { created_at: -1, _id: -1 }, limit: limit + 1 };
+    if (fields) {
+      options.projection = Object.fromEntries(fields.map(field => [field === 'id' ? '_id' : field, 1]));
+    }
+    const docs = await this.qrCodes.find(filter, options).toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+
+  countQrsByUser(userId) {
+    return this.qrCodes.countDocuments({ user_id: userId });
+  }
+
+  /**
+   * One keyset page of codes created within [since, until), oldest first
+   * @param {Object} options - { userId?, since, until, after?, limit }
+   * @returns {Promise<Array<Object>>} Up to limit rows after `after`
+   */
+  async listQrsForExport({ userId, since, until, after, limit }) {
+    const filter = exportFilter({ since, until, after });
+    if (userId) filter.user_id = userId;
+    const docs = await this.qrCodes
+      .find(filter, { sort: { created_at: 1, _id: 1 }, limit })
+      .toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+
+  async appendEvent(event) {
+    await this.appendEvents([event]);
+    return event;
+  }
+
+  async appendEvents(events) {
+    if (events.length > 0) {
+      await this.qrEvents.insertMany(events.map(event => toDoc(event)), { ordered: false });
+    }
+    return events;
+  }
+
+  async getEventsForQr(qrId) {
+    const docs = await this.qrEvents.find({ qr_code_id: qrId }).sort({ created_at: 1 }).toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+
+  /**
+   * One keyset page of events within [since, until), oldest first, for one
+   * code or all of an owner's codes
+   * @param {Object} options - { qrId?, userId?, since, until, eventType?, after?, limit }
+   * @returns {Promise<Array<Object>>} Up to limit rows after `after`
+   */
+  async listEventsForExport({ qrId, userId, since, until, eventType, after, limit }) {
+    const filter = exportFilter({ since, until, after });
+    if (qrId) {
+      filter.qr_code_id = qrId;
+    } else if (userId) {
+      filter.qr_code_id = { $in: await this.qrCodes.distinct('_id', { user_id: userId }) };
+    }
+    if (eventType) filter.event_type = eventType;
+    const docs = await this.qrEvents.find(filter, { sort: { created_at: 1, _id: 1 }, limit }).toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+
+  /**
+   * Reserve a block of slug counter values with one atomic $inc
+   * @param {number} size - Values to reserve
+   * @returns {Promise<number>} First reserved value
+   */
+  async leaseSlugBlock(size) {
+    const counter = await this.counters.findOneAndUpdate(
+      { _id: 'qr_slug' },
+      { $inc: { value: size } },
+      { upsert: true, returnDocument: 'after' }
+    );
+    return counter.value - size;
+  }
+
+  /**
+   * Apply aggregated scan increments with one bulkWrite and add them to the
+   * owners' monthly usage (user_scan_usage, one document per owner and month)
+   * @param {Array<string>} slugs - QR slugs
+   * @param {Array<number>} increments - Increment per slug
+   */
+  async incrementScanCounts(slugs, increments) {
+    const now = new Date();
+    const month = scanUsageMonth(now);
+    const bySlug = new Map(slugs.map((slug, i) => [slug, increments[i]]));
+    const owners = await this.qrCodes
+      .find({ slug: { $in: slugs } }, { projection: { slug: 1, user_id: 1 } })
+      .toArray();
+    const byOwner = new Map();
+    for (const { slug, user_id: userId } of owners) {
+      if (userId) byOwner.set(userId, (byOwner.get(userId) || 0) + bySlug.get(slug));
+    }
+
+    await this.qrCodes.bulkWrite(slugs.map((slug, i) => ({
+      updateOne: {
+        filter: { slug },
+        update: { $inc: { scan_count: increments[i] }, $set: { updated_at: now.toISOString() } }
+      }
+    })), { ordered: false });
+    if (byOwner.size > 0) {
+      await this.scanUsage.bulkWrite([...byOwner].map(([userId, scans]) => ({
+        updateOne: {
+          filter: { _id: `${userId}:${month}` },
+          update: { $inc: { scans }, $setOnInsert: { user_id: userId, month } },
+          upsert: true
+        }
+      })), { ordered: false });
+    }
+  }
+
+  /**
+   * Monthly scan totals for some owners
+   * @param {string} month - First day of the month, e.g. '2026-10-01'
+   * @param {Array<string>} userIds - Owner IDs
+   * @returns {Promise<Array<Object>>} { user_id, scans } for owners with scans
+   */
+  async getScanUsage(month, userIds) {
+    const docs = await this.scanUsage
+      .find({ _id: { $in: userIds.map(userId => `${userId}:${month}`) } })
+      .toArray();
+    return docs.map(doc => ({ user_id: doc.user_id, scans: doc.scans }));
+  }
+
+  async getChainCacheEntry(key) {
+    const doc = await this.chainMetadata.findOne({ _id: key });
+    return doc && {
+      value: doc.value,
+      fetchedAt: doc.fetched_at.getTime(),
+      refreshAt: doc.refresh_at.getTime(),
+      expiresAt: doc.expires_at.getTime()
+    };
+  }
+
+  async setChainCacheEntry(key, entry) {
+    await this.chainMetadata.replaceOne({ _id: key }, {
+      value: entry.value,
+      fetched_at: new Date(entry.fetchedAt),
+      refresh_at: new Date(entry.refreshAt),
+      expires_at: new Date(entry.expiresAt)
+    }, { upsert: true });
+  }
+
+  async getUserPlanRow(userId) {
+    return fromDoc(await this.userPlans.findOne({ _id: userId }), 'user_id');
+  }
+
+  async getUserPlanRows(userIds) {
+    const docs = await this.userPlans.find({ _id: { $in: userIds } }).toArray();
+    return docs.map(doc => fromDoc(doc, 'user_id'));
+  }
+
+  async getUserPlanRowsByCustomer(customerIds) {
+    const docs = await this.userPlans.find({ stripe_customer_id: { $in: customerIds } }).toArray();
+    return docs.map(doc => fromDoc(doc, 'user_id'));
+  }
+
+  async createUserPlanRow(userId, plan) {
+    const now = new Date().toISOString();
+    return fromDoc(await this.userPlans.findOneAndUpdate(
+      { _id: userId },
+      { $setOnInsert: { plan, created_at: now, updated_at: now } },
+      { upsert: true, returnDocument: 'after' }
+    ), 'user_id');
+  }
+
+  /**
+   * With olderThan (ISO), only updates a row whose stripe_event_at is unset
+   * or older; returns null when it is not
+   */
+  async updateUserPlanRow(userId, updates, { olderThan = null } = {}) {
+    const now = new Date().toISOString();
+    const { updated_at: updatedAt, ...changes } = updates;
+    const filter = olderThan
+      ? { _id: userId, $or: [{ stripe_event_at: null }, { stripe_event_at: { $lt: olderThan } }] }
+      : { _id: userId };
+    try {
+      return fromDoc(await this.userPlans.findOneAndUpdate(
+        filter,
+        { $set: { ...changes, updated_at: updatedAt || now }, $setOnInsert: { created_at: now } },
+        { upsert: true, returnDocument: 'after' }
+      ), 'user_id');
+    } catch (error) {
+      // The upsert hit the existing row the filter left out: a newer event is applied
+      if (olderThan && error.code === 11000) {
+        return null;
+      }
+      throw error;
+    }
+  }
+
+  async getUserByEmail(email) {
+    return fromDoc(await this.users.findOne({ email }));
+  }
+
+  /**
+   * Create an account unless the email is taken
+   * @returns {Promise<boolean>} Whether it was created
+   */
+  async insertUser(user) {
+    try {
+      await this.users.insertOne(toDoc(user));
+      return true;
+    } catch (error) {
+      if (error.code === 11000) {
+        return false;
+      }
+      throw error;
+    }
+  }
+
+  // Sessions are keyed by token hash; the TTL index removes expired ones
+  async insertSession(session) {
+    await this.sessions.insertOne(toDoc(session));
+  }
+
+  async getSession(id) {
+    return fromDoc(await this.sessions.findOne({ _id: id }));
+  }
+
+  async deleteSession(id) {
+    await this.sessions.deleteOne({ _id: id });
+  }
+
+  /**
+   * Journal a webhook event unless its id was seen before
+   * @returns {Promise<boolean>} Whether it was new
+   */
+  async insertWebhookEvent(row) {
+    try {
+      await this.webhookEvents.insertOne({ ...toDoc(row), processed_at: null });
+      return true;
+    } catch (error) {
+      if (error.code === 11000) {
+        return false;
+      }
+      throw error;
+    }
+  }
+
+  async updateWebhookEvents(ids, changes) {
+    await this.webhookEvents.updateMany({ _id: { $in: ids } }, { $set: changes });
+  }
+
+  async listPendingWebhookEvents(receivedAfter, dueBy, limit) {
+    const docs = await this.webhookEvents
+      .find({
+        processed_at: null,
+        received_at: { $gt: receivedAfter },
+        // Rows journaled before next_attempt_at existed are due right away
+        $or: [{ next_attempt_at: { $lte: dueBy } }, { next_attempt_at: { $exists: false } }]
+      })
+      .sort({ next_attempt_at: 1 })
+      .limit(limit)
+      .toArray();
+    return docs.map(doc => fromDoc(doc));
+  }
+}
+
+const operationDuration = histogram('mongo_operation_duration_seconds', 'MongoDB store operation latency', ['operation']);
+
+// Record every store call in /api/metrics and charge it to the calling API
+// request's Server-Timing db stage
+function withDbTiming(store) {
+  return new Proxy(store, {
+    get(target, prop) {
+      const value = target[prop];
+      if (typeof value !== 'function') {
+        return value;
+      }
+      return (...args) => timed('db', () => operationDuration.time({ operation: prop }, () => value.apply(target, args)));
+    }
+  });
+}
+
+/**
+ * Get the MongoDB store, or null when MONGO_URL is not set
+ * @returns {Promise<MongoStore|null>}
+ */
+export async function getMongoStore() {
+  const database = await getMongoDb();
+  if (!database) {
+    return null;
+  }
+  if (!mongoStore) {
+    mongoStore = withDbTiming(new MongoStore(database));
+  }
+  return mongoStore;
+}
+
+/**
+ * Get the store used when Supabase is not configured: MongoDB if
+ * MONGO_URL is set, otherwise the process-local memory store
+ */
+export async function getFallbackStore() {
+  return (await getMongoStore()) || memoryStore;
+}
+
+// In-memory store for demo mode (when no DB is configured)
+// QR codes are indexed by id, slug and owner so every lookup, update, delete
+// and per-user count is O(1). Events go to an append-only log with per-QR
+// offsets, so reading one code's events never scans the others.
+class MemoryStore {
+  constructor() {
+    this.persistent = false;
+    this.qrById = new Map();
+    this.qrBySlug = new Map();
+    this.qrsByUser = new Map();
+    this.events = [];
+    this.eventOffsets = new Map();
+    this.usersByEmail = new Map();
+    this.sessions = new Map();
+  }
+
+  insertQr(qr) {
+    this.qrById.set(qr.id, qr);
+    this.qrBySlug.set(qr.slug, qr);
+    if (!this.qrsByUser.has(qr.user_id)) {
+      this.qrsByUser.set(qr.user_id, new Map());
+    }
+    this.qrsByUser.get(qr.user_id).set(qr.id, qr);
+    return qr;
+  }
+
+  insertQrs(qrs) {
+    qrs.forEach(qr => this.insertQr(qr));
+    return qrs;
+  }
+
+  getQrById(id) {
+    return this.qrById.get(id) || null;
+  }
+
+  getQrBySlug(slug) {
+    return this.qrBySlug.get(slug) || null;
+  }
+
+  updateQr(id, updates, userId) {
+    const qr = this.qrById.get(id);
+    if (!qr || (userId && qr.user_id !== userId)) {
+      return null;
+    }
+    // Slug and owner are immutable, so the indexes stay valid
+    const { id: _id, slug: _slug, user_id: _userId, ...changes } = updates;
+    Object.assign(qr, changes);
+    return qr;
+  }
+
+  deleteQr(id, userId) {
+    const qr = this.qrById.get(id);
+    if (!qr || (userId && qr.user_id !== userId)) {
+      return null;
+    }
+    this.qrById.delete(id);
+    this.qrBySlug.delete(qr.slug);
+    this.qrsByUser.get(qr.user_id)?.delete(id);
+    // Logged events stay in place; only the per-QR offsets are dropped
+    this.eventOffsets.delete(id);
+    return qr;
+  }
+
+  listQrsByUser(userId) {
+    const qrs = this.qrsByUser.get(userId);
+    return qrs ? [...qrs.values()].reverse() : [];
+  }
+
+  // Newest first, matching the database ordering
+  listQrsPage({ userId, cursor, limit, fields }) {
+    const qrs = userId ? (this.qrsByUser.get(userId)?.values() || []) : this.qrById.values();
+    const rows = [...qrs]
+      .filter(qr => !cursor || isAfterCursor(qr, cursor))
+      .sort(compareQrKeys)
+      .slice(0, limit + 1);
+    return rows.map(qr => projectQr(qr, fields));
+  }
+
+  countQrsByUser(userId) {
+    return this.qrsByUser.get(userId)?.size || 0;
+  }
+
+  listQrsForExport({ userId, since, until, after, limit }) {
+    const qrs = userId ? (this.qrsByUser.get(userId)?.values() || []) : this.qrById.values();
+    return [...qrs]
+      .filter(qr => isExportMatch(qr, { since, until, after }))
+      .sort(compareExportKeys)
+      .slice(0, limit);
+  }
+
+  appendEvent(event) {
+    const offset = this.events.push(event) - 1;
+    if (!this.eventOffsets.has(event.qr_code_id)) {
+      this.eventOffsets.set(event.qr_code_id, []);
+    }
+    this.eventOffsets.get(event.qr_code_id).push(offset);
+    return event;
+  }
+
+  appendEvents(events) {
+    events.forEach(event => this.appendEvent(event));
+    return events;
+  }
+
+  getEventsForQr(qrId) {
+    return (this.eventOffsets.get(qrId) || []).map(offset => this.events[offset]);
+  }
+
+  // Events of deleted codes stay in the log but are not exported
+  listEventsForExport({ qrId, userId, since, until, eventType, after, limit }) {
+    let events;
+    if (qrId) {
+      events = this.getEventsForQr(qrId);
+    } else if (userId) {
+      events = [...(this.qrsByUser.get(userId)?.keys() || [])].flatMap(id => this.getEventsForQr(id));
+    } else {
+      events = this.events.filter(event => this.eventOffsets.has(event.qr_code_id));
+    }
+    return events
+      .filter(event => (!eventType || event.event_type === eventType) && isExportMatch(event, { since, until, after }))
+      .sort(compareExportKeys)
+      .slice(0, limit);
+  }
+
+  incrementScanCounts(slugs, increments) {
+    slugs.forEach((slug, i) => {
+      const qr = this.qrBySlug.get(slug);
+      if (qr) qr.scan_count = (qr.scan_count || 0) + increments[i];
+    });
+  }
+
+  getUserByEmail(email) {
+    return this.usersByEmail.get(email) || null;
+  }
+
+  insertUser(user) {
+    if (this.usersByEmail.has(user.email)) {
+      return false;
+    }
+    this.usersByEmail.set(user.email, user);
+    return true;
+  }
+
+  insertSession(session) {
+    this.sessions.set(session.id, session);
+  }
+
+  getSession(id) {
+    return this.sessions.get(id) || null;
+  }
+
+  deleteSession(id) {
+    this.sessions.delete(id);
+  }
+}
+
+let memoryStore = new MemoryStore();
 
 export function getMemoryStore() {
   return memoryStore;
@@ -0,0 +1,367 @@
+// NFT and marketplace metadata indexer
+// Reads tokenURI / getListing through the batched JSON-RPC client, fetches
+// the off-chain metadata JSON, and keeps the result in two cache tiers: an
+// in-process LRU in front of a persistent table (Supabase) or collection
+// (MongoDB) shared by every instance. Entries are refreshed in the background
+// once they pass refreshAt, so hot tokens never wait on the chain; an entry
+// that fails to refresh is served stale rather than failing the page.
+//
+// Without WEB3_RPC_URL and a contract address the API keeps serving the
+// placeholder objects, so demo mode is unchanged.
+
+import { supabaseAdmin, isSupabaseConfigured } from './supabase';
+import { getMongoStore } from './mongo-fallback';
+import { LruCache } from './lru-cache';
+import { fetchUntrustedJson, METADATA_MAX_BYTES } from './metadata-fetch';
+import { ethCall, isRpcConfigured, encodeUint256Call, decodeString, decodeUint256, decodeAddress, decodeBool } from './chain-rpc';
+import { NFT_CONTRACT_ADDRESS, MARKETPLACE_ADDRESS, CHAIN_ID, isNFTContractConfigured, isMarketplaceConfigured } from './web3-config';
+
+const NFT_METADATA_TTL_MS = parseInt(process.env.NFT_METADATA_TTL_MS || '3600000');
+const LISTING_TTL_MS = parseInt(process.env.LISTING_TTL_MS || '60000');
+// Refresh in the background once this fraction of the TTL has passed
+const REFRESH_AHEAD_RATIO = 0.75;
+// How long past expiry an entry may still be served if refreshing fails
+const STALE_IF_ERROR_MS = parseInt(process.env.CHAIN_CACHE_STALE_IF_ERROR_MS || '86400000');
+const METADATA_FETCH_TIMEOUT_MS = parseInt(process.env.METADATA_FETCH_TIMEOUT_MS || '5000');
+const METADATA_FETCH_CONCURRENCY = parseInt(process.env.METADATA_FETCH_CONCURRENCY || '8');
+const IPFS_GATEWAY = process.env.IPFS_GATEWAY || 'https://ipfs.io/ipfs/';
+
+export const MAX_TOKENS_PER_REQUEST = 50;
+
+const SELECTORS = {
+  tokenURI: '0xc87b56dd',
+  ownerOf: '0x6352211e',
+  getListing: '0x107a274a'
+};
+
+const memoryCache = new LruCache({ maxEntries: parseInt(process.env.CHAIN_CACHE_MAX_ENTRIES || '10000'), ttlMs: STALE_IF_ERROR_MS });
+const refreshing = new Map();
+const stats = {
+  chainReads: 0,
+  backgroundRefreshes: 0,
+  staleServed: 0,
+  failedRefreshes: 0
+};
+
+/**
+ * Whether tokens and listings are read from the chain (otherwise placeholders)
+ */
+export const isIndexerConfigured = isRpcConfigured && isNFTContractConfigured;
+
+/**
+ * Token and listing ids are uint256 values
+ */
+export function isValidTokenId(id) {
+  return /^\d{1,78}$/.test(String(id)) && BigInt(id) < 2n ** 256n;
+}
+
+// =============================================
+// Persistent tier
+// =============================================
+
+async function readPersistent(key) {
+  try {
+    if (isSupabaseConfigured) {
+      if (!supabaseAdmin) return null;
+      const { data, error } = await supabaseAdmin
+        .from('chain_metadata_cache')
+        .select('value, fetched_at, refresh_at, expires_at')
+        .eq('key', key)
+        .maybeSingle();
+      if (error) throw error;
+      return data && {
+        value: data.value,
+        fetchedAt: Date.parse(data.fetched_at),
+        refreshAt: Date.parse(data.refresh_at),
+        expiresAt: Date.parse(data.expires_at)
+      };
+    }
+    const mongoStore = await getMongoStore();
+    return mongoStore ? mongoStore.getChainCacheEntry(key) : null;
+  } catch (error) {
+    console.error('Error reading chain metadata cache:', error);
+    return null;
+  }
+}
+
+async function writePersistent(key, entry) {
+  try {
+    if (isSupabaseConfigured) {
+      if (!supabaseAdmin) return;
+      const { error } = await supabaseAdmin.from('chain_metadata_cache').upsert({
+        key,
+        value: entry.value,
+        fetched_at: new Date(entry.fetchedAt).toISOString(),
+        refresh_at: new Date(entry.refreshAt).toISOString(),
+        expires_at: new Date(entry.expiresAt).toISOString()
+      });
+      if (error) throw error;
+      return;
+    }
+    const mongoStore = await getMongoStore();
+    if (mongoStore) {
+      await mongoStore.setChainCacheEntry(key, entry);
+    }
+  } catch (error) {
+    console.error('Error writing chain metadata cache:', error);
+  }
+}
+
+function remember(key, entry) {
+  memoryCache.set(key, entry, entry.expiresAt + STALE_IF_ERROR_MS - Date.now());
+}
+
+// Load once per key at a time; concurrent callers share the result
+function refresh(key, load, ttlMs) {
+  let pending = refreshing.get(key);
+  if (!pending) {
+    pending = (async () => {
+      const value = await load();
+      const fetchedAt = Date.now();
+      const entry = {
+        value,
+        fetchedAt,
+        refreshAt: fetchedAt + Math.round(ttlMs * REFRESH_AHEAD_RATIO),
+        expiresAt: fetchedAt + ttlMs
+      };
+      remember(key, entry);
+      await writePersistent(key, entry);
+      return entry;
+    })().finally(() => {
+      refreshing.delete(key);
+    });
+    refreshing.set(key, pending);
+  }
+  return pending;
+}
+
+/**
+ * Get a cached value, loading or refreshing it as needed
+ * @returns {Promise<Object>} { value, fetchedAt, stale }
+ */
+async function resolve(key, load, ttlMs) {
+  let entry = memoryCache.get(key);
+  if (!entry) {
+    entry = await readPersistent(key);
+    if (entry) remember(key, entry);
+  }
+
+  const now = Date.now();
+  if (entry && now < entry.expiresAt) {
+    if (now >= entry.refreshAt && !refreshing.has(key)) {
+      stats.backgroundRefreshes++;
+      refresh(key, load, ttlMs).catch(error => {
+        stats.failedRefreshes++;
+        console.error(`Error refreshing ${key}:`, error);
+      });
+    }
+    return { ...entry, stale: false };
+  }
+
+  try {
+    return { ...(await refresh(key, load, ttlMs)), stale: false };
+  } catch (error) {
+    if (entry && now < entry.expiresAt + STALE_IF_ERROR_MS) {
+      stats.failedRefreshes++;
+      stats.staleServed++;
+      console.error(`Error refreshing ${key}, serving stale copy:`, error);
+      return { ...entry, stale: true };
+    }
+    throw error;
+  }
+}
+
+// =============================================
+// Chain and metadata reads
+// =============================================
+
+function resolveUri(uri) {
+  if (uri.startsWith('ipfs://')) {
+    return IPFS_GATEWAY + uri.slice('ipfs://'.length).replace(/^ipfs\//, '');
+  }
+  if (uri.startsWith('ar://')) {
+    return 'https://arweave.net/' + uri.slice('ar://'.length);
+  }
+  return uri;
+}
+
+/**
+ * Fetch and parse token metadata JSON (https, ipfs://, ar:// or data: URIs)
+ */
+async function fetchMetadata(tokenUri) {
+  if (!tokenUri) {
+    return {};
+  }
+  if (tokenUri.startsWith('data:')) {
+    const [header, payload] = tokenUri.slice(5).split(/,(.*)/s);
+    const text = header.endsWith(';base64') ? Buffer.from(payload, 'base64').toString('utf8') : decodeURIComponent(payload);
+    if (Buffer.byteLength(text) > METADATA_MAX_BYTES) {
+      throw new Error(`Metadata larger than ${METADATA_MAX_BYTES} bytes`);
+    }
+    return JSON.parse(text);
+  }
+  // Contracts are untrusted: only public https hosts (see metadata-fetch.js)
+  return fetchUntrustedJson(resolveUri(tokenUri), { timeoutMs: METADATA_FETCH_TIMEOUT_MS });
+}
+
+// Run fn over items with at most `limit` in flight
+async function mapConcurrent(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+  const workers = Array.from({ length: Math.min(limit, items.length) }, async () => {
+    while (next < items.length) {
+      const i = next++;
+      results[i] = await fn(items[i], i);
+    }
+  });
+  await Promise.all(workers);
+  return results;
+}
+
+async function loadNft(contract, tokenId) {
+  stats.chainReads++;
+  // Both reads join the same JSON-RPC batch
+  const [uriData, ownerData] = await Promise.all([
+    ethCall(contract, encodeUint256Call(SELECTORS.tokenURI, tokenId)),
+    ethCall(contract, encodeUint256Call(SELECTORS.ownerOf, tokenId)).catch(() => null)
+  ]);
+  const tokenUri = decodeString(uriData);
+  const metadata = await fetchMetadata(tokenUri);
+  return {
+    id: String(tokenId),
+    name: metadata.name || `NovaTok NFT #${tokenId}`,
+    description: metadata.description || '',
+    image: metadata.image ? resolveUri(metadata.image) : null,
+    attributes: Array.isArray(metadata.attributes) ? metadata.attributes : [],
+    tokenUri,
+    owner: ownerData ? decodeAddress(ownerData) : null,
+    contract,
+    chainId: CHAIN_ID
+  };
+}
+
+function nftKey(contract, tokenId) {
+  return `nft:${CHAIN_ID}:${contract.toLowerCase()}:${tokenId}`;
+}
+
+function getChainNft(contract, tokenId) {
+  return resolve(nftKey(contract, tokenId), () => loadNft(contract, tokenId), NFT_METADATA_TTL_MS);
+}
+
+function formatEther(wei) {
+  const whole = wei / 10n ** 18n;
+  const fraction = (wei % 10n ** 18n).toString().padStart(18, '0').replace(/0+$/, '');
+  return fraction ? `${whole}.${fraction}` : String(whole);
+}
+
+async function loadListing(listingId) {
+  stats.chainReads++;
+  const data = await ethCall(MARKETPLACE_ADDRESS, encodeUint256Call(SELECTORS.getListing, listingId));
+  const listing = {
+    seller: decodeAddress(data, 0),
+    contract: decodeAddress(data, 1),
+    tokenId: decodeUint256(data, 2).toString(),
+    price: decodeUint256(data, 3),
+    active: decodeBool(data, 4)
+  };
+  const { value: nft } = await getChainNft(listing.contract, listing.tokenId);
+  return {
+    id: String(listingId),
+    nftId: listing.tokenId,
+    name: nft.name,
+    description: nft.description,
+    image: nft.image,
+    price: formatEther(listing.price),
+    currency: 'ETH',
+    seller: listing.seller,
+    active: listing.active,
+    contract: listing.contract,
+    chainId: CHAIN_ID
+  };
+}
+
+// =============================================
+// Placeholders (no RPC endpoint or contract configured)
+// =============================================
+
+function placeholderNft(nftId) {
+  return {
+    id: nftId,
+    name: `NovaTok NFT #${nftId}`,
+    description: 'A unique NovaTok collectible',
+    image: `https://picsum.photos/seed/${nftId}/400/400`,
+    contract: NFT_CONTRACT_ADDRESS,
+    chainId: CHAIN_ID
+  };
+}
+
+function placeholderListing(listingId) {
+  return {
+    id: listingId,
+    nftId: listingId,
+    name: `NovaTok NFT #${listingId}`,
+    description: 'Available on NovaTok Marketplace',
+    image: `https://picsum.photos/seed/listing${listingId}/400/400`,
+    price: '0.01',
+    currency: 'ETH',
+    seller: '0x0000...0000',
+    contract: NFT_CONTRACT_ADDRESS,
+    chainId: CHAIN_ID
+  };
+}
+
+// =============================================
+// Public API
+// =============================================
+
+/**
+ * Get NFT details
+ * @param {string} tokenId - Token id
+ * @returns {Promise<Object>} { nft, fetchedAt, stale, placeholder }
+ */
+export async function getNft(tokenId) {
+  if (!isIndexerConfigured) {
+    return { nft: placeholderNft(tokenId), placeholder: true };
+  }
+  const { value, fetchedAt, stale } = await getChainNft(NFT_CONTRACT_ADDRESS, tokenId);
+  return { nft: value, fetchedAt, stale, placeholder: false };
+}
+
+/**
+ * Get details for several NFTs; chain reads share JSON-RPC batches and
+ * metadata is fetched concurrently
+ * @param {Array<string>} tokenIds - Token ids (at most MAX_TOKENS_PER_REQUEST)
+ * @returns {Promise<Array<Object>>} { nft } or { id, error } per token, in order
+ */
+export async function getNfts(tokenIds) {
+  return mapConcurrent(tokenIds, METADATA_FETCH_CONCURRENCY, async (tokenId) => {
+    try {
+      return await getNft(tokenId);
+    } catch (error) {
+      return { id: tokenId, error: error.message };
+    }
+  });
+}
+
+/**
+ * Get a marketplace listing with its NFT's metadata
+ * @param {string} listingId - Listing id
+ * @returns {Promise<Object>} { listing, fetchedAt, stale, placeholder }
+ */
+export async function getListing(listingId) {
+  if (!isRpcConfigured || !isMarketplaceConfigured) {
+    return { listing: placeholderListing(listingId), placeholder: true };
+  }
+  const key = `listing:${CHAIN_ID}:${MARKETPLACE_ADDRESS.toLowerCase()}:${listingId}`;
+  const { value, fetchedAt, stale } = await resolve(key, () => loadListing(listingId), LISTING_TTL_MS);
+  return { listing: value, fetchedAt, stale, placeholder: false };
+}
+
+export function getNftIndexerStats() {
+  return {
+    configured: isIndexerConfigured,
+    ...stats,
+    cache: memoryCache.stats(),
+    refreshing: refreshing.size
+  };
+}
@@ -0,0 +1,68 @@
+// Hot-slug resolution cache
+// Keeps recently resolved active QR rows in process so repeated scans of the
+// same printed code skip the qr_codes lookup. Entries are invalidated
+// explicitly on update/delete and otherwise age out after the TTL, which
+// bounds staleness across server instances.
+
+import { LruCache } from './lru-cache';
+
+const QR_CACHE_MAX_ENTRIES = parseInt(process.env.QR_CACHE_MAX_ENTRIES || '10000');
+const QR_CACHE_TTL_MS = parseInt(process.env.QR_CACHE_TTL_MS || '30000');
+
+const slugCache = new LruCache({ maxEntries: QR_CACHE_MAX_ENTRIES, ttlMs: QR_CACHE_TTL_MS });
+
+// PUT/DELETE address codes by id, so remember which slug each id resolved to
+const slugsById = new Map();
+
+/**
+ * Get a cached QR row by slug
+ * @param {string} slug - QR slug
+ * @returns {Object|undefined} QR row or undefined on miss
+ */
+export function getCachedQr(slug) {
+  return slugCache.get(slug);
+}
+
+/**
+ * Cache a resolved QR row
+ * @param {Object} qr - QR row (must include id and slug)
+ */
+export function cacheQr(qr) {
+  if (!qr?.slug) {
+    return;
+  }
+  slugCache.set(qr.slug, qr);
+  if (qr.id) {
+    slugsById.set(qr.id, qr.slug);
+  }
+  // Keep the id index bounded alongside the slug cache
+  if (slugsById.size > slugCache.maxEntries * 2) {
+    for (const [id, slug] of slugsById) {
+      if (slugsById.size <= slugCache.size) break;
+      if (!slugCache.entries.has(slug)) slugsById.delete(id);
+    }
+  }
+}
+
+/**
+ * Drop a QR from the cache after it was changed or deleted
+ * @param {Object} ref - { id?, slug? } of the affected QR code
+ */
+export function invalidateQr({ id, slug } = {}) {
+  if (id && slugsById.has(id)) {
+    slugCache.delete(slugsById.get(id));
+    slugsById.delete(id);
+  }
+  if (slug) {
+    slugCache.delete(slug);
+  }
+}
+
+export function getQrCacheStats() {
+  return slugCache.stats();
+}
+
+export function clearQrCache() {
+  slugCache.clear();
+  slugsById.clear();
+}
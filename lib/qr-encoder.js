@@ -0,0 +1,577 @@
+// QR Code encoder
+// Server-side port of Project Nayuki's QR Code generator (MIT), the same
+// algorithm qrcode.react embeds, so API-rendered images match the codes the
+// dashboard draws. Produces the module matrix plus SVG and PNG renderings.
+
+import { deflateSync } from 'zlib';
+
+export const ECC_LEVELS = {
+  L: { ordinal: 0, formatBits: 1 },
+  M: { ordinal: 1, formatBits: 0 },
+  Q: { ordinal: 2, formatBits: 3 },
+  H: { ordinal: 3, formatBits: 2 }
+};
+
+// Indexed by [ecc ordinal][version]; index 0 is unused
+const ECC_CODEWORDS_PER_BLOCK = [
+  [-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+  [-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28],
+  [-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+  [-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30]
+];
+
+const NUM_ERROR_CORRECTION_BLOCKS = [
+  [-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25],
+  [-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49],
+  [-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68],
+  [-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81]
+];
+
+// Penalty weights used when choosing a mask
+const PENALTY_N1 = 3;
+const PENALTY_N2 = 3;
+const PENALTY_N3 = 40;
+const PENALTY_N4 = 10;
+
+const ALPHANUMERIC_CHARSET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:';
+
+// Segment modes: mode indicator bits and character count bits per version range
+const MODES = {
+  numeric: { bits: 0x1, charCountBits: [10, 12, 14] },
+  alphanumeric: { bits: 0x2, charCountBits: [9, 11, 13] },
+  byte: { bits: 0x4, charCountBits: [8, 16, 16] }
+};
+
+function charCountBits(mode, version) {
+  return mode.charCountBits[Math.floor((version + 7) / 17)];
+}
+
+function appendBits(bits, value, length) {
+  for (let i = length - 1; i >= 0; i--) {
+    bits.push((value >>> i) & 1);
+  }
+}
+
+function getBit(value, i) {
+  return ((value >>> i) & 1) !== 0;
+}
+
+/**
+ * Encode text as a single segment in the most compact mode that fits it
+ */
+function makeSegment(text) {
+  const bits = [];
+  if (/^[0-9]*$/.test(text)) {
+    for (let i = 0; i < text.length; i += 3) {
+      const chunk = text.substring(i, i + 3);
+      appendBits(bits, parseInt(chunk, 10), chunk.length * 3 + 1);
+    }
+    return { mode: MODES.numeric, numChars: text.length, bits };
+  }
+  if ([...text].every(ch => ALPHANUMERIC_CHARSET.includes(ch))) {
+    let i;
+    for (i = 0; i + 2 <= text.length; i += 2) {
+      appendBits(bits, ALPHANUMERIC_CHARSET.indexOf(text[i]) * 45 + ALPHANUMERIC_CHARSET.indexOf(text[i + 1]), 11);
+    }
+    if (i < text.length) {
+      appendBits(bits, ALPHANUMERIC_CHARSET.indexOf(text[i]), 6);
+    }
+    return { mode: MODES.alphanumeric, numChars: text.length, bits };
+  }
+  const bytes = Buffer.from(text, 'utf8');
+  for (const b of bytes) {
+    appendBits(bits, b, 8);
+  }
+  return { mode: MODES.byte, numChars: bytes.length, bits };
+}
+
+function getNumRawDataModules(version) {
+  let result = (16 * version + 128) * version + 64;
+  if (version >= 2) {
+    const numAlign = Math.floor(version / 7) + 2;
+    result -= (25 * numAlign - 10) * numAlign - 55;
+    if (version >= 7) result -= 36;
+  }
+  return result;
+}
+
+function getNumDataCodewords(version, ecc) {
+  return Math.floor(getNumRawDataModules(version) / 8) -
+    ECC_CODEWORDS_PER_BLOCK[ecc.ordinal][version] * NUM_ERROR_CORRECTION_BLOCKS[ecc.ordinal][version];
+}
+
+// Reed-Solomon over GF(2^8) with the 0x11D polynomial
+function reedSolomonMultiply(x, y) {
+  let z = 0;
+  for (let i = 7; i >= 0; i--) {
+    z = (z << 1) ^ ((z >>> 7) * 0x11d);
+    z ^= ((y >>> i) & 1) * x;
+  }
+  return z;
+}
+
+function reedSolomonComputeDivisor(degree) {
+  const result = new Array(degree - 1).fill(0);
+  result.push(1);
+  let root = 1;
+  for (let i = 0; i < degree; i++) {
+    for (let j = 0; j < result.length; j++) {
+      result[j] = reedSolomonMultiply(result[j], root);
+      if (j + 1 < result.length) result[j] ^= result[j + 1];
+    }
+    root = reedSolomonMultiply(root, 0x02);
+  }
+  return result;
+}
+
+function reedSolomonComputeRemainder(data, divisor) {
+  const result = divisor.map(() => 0);
+  for (const b of data) {
+    const factor = b ^ result.shift();
+    result.push(0);
+    divisor.forEach((coef, i) => {
+      result[i] ^= reedSolomonMultiply(coef, factor);
+    });
+  }
+  return result;
+}
+
+class QrMatrix {
+  constructor(version, ecc, dataCodewords) {
+    this.version = version;
+    this.ecc = ecc;
+    this.size = version * 4 + 17;
+    this.modules = Array.from({ length: this.size }, () => new Array(this.size).fill(false));
+    this.isFunction = Array.from({ length: this.size }, () => new Array(this.size).fill(false));
+
+    this.drawFunctionPatterns();
+    this.drawCodewords(this.addEccAndInterleave(dataCodewords));
+
+    // Pick the mask with the lowest penalty score
+    let bestMask = 0;
+    let minPenalty = Infinity;
+    for (let mask = 0; mask < 8; mask++) {
+      this.applyMask(mask);
+      this.drawFormatBits(mask);
+      const penalty = this.getPenaltyScore();
+      if (penalty < minPenalty) {
+        bestMask = mask;
+        minPenalty = penalty;
+      }
+      this.applyMask(mask); // XOR again to undo
+    }
+    this.mask = bestMask;
+    this.applyMask(bestMask);
+    this.drawFormatBits(bestMask);
+    this.isFunction = null;
+  }
+
+  setFunctionModule(x, y, isDark) {
+    this.modules[y][x] = isDark;
+    this.isFunction[y][x] = true;
+  }
+
+  drawFunctionPatterns() {
+    for (let i = 0; i < this.size; i++) {
+      this.setFunctionModule(6, i, i % 2 === 0);
+      this.setFunctionModule(i, 6, i % 2 === 0);
+    }
+
+    this.drawFinderPattern(3, 3);
+    this.drawFinderPattern(this.size - 4, 3);
+    this.drawFinderPattern(3, this.size - 4);
+
+    const positions = this.getAlignmentPatternPositions();
+    const numAlign = positions.length;
+    for (let i = 0; i < numAlign; i++) {
+      for (let j = 0; j < numAlign; j++) {
+        // Skip the three corners occupied by finder patterns
+        if (!((i === 0 && j === 0) || (i === 0 && j === numAlign - 1) || (i === numAlign - 1 && j === 0))) {
+          this.drawAlignmentPattern(positions[i], positions[j]);
+        }
+      }
+    }
+
+    // Reserve the format areas; real bits are drawn once the mask is known
+    this.drawFormatBits(0);
+    this.drawVersion();
+  }
+
+  drawFormatBits(mask) {
+    const data = (this.ecc.formatBits << 3) | mask;
+    let rem = data;
+    for (let i = 0; i < 10; i++) {
+      rem = (rem << 1) ^ ((rem >>> 9) * 0x537);
+    }
+    const bits = ((data << 10) | rem) ^ 0x5412;
+
+    for (let i = 0; i <= 5; i++) this.setFunctionModule(8, i, getBit(bits, i));
+    this.setFunctionModule(8, 7, getBit(bits, 6));
+    this.setFunctionModule(8, 8, getBit(bits, 7));
+    this.setFunctionModule(7, 8, getBit(bits, 8));
+    for (let i = 9; i < 15; i++) this.setFunctionModule(14 - i, 8, getBit(bits, i));
+
+    for (let i = 0; i < 8; i++) this.setFunctionModule(this.size - 1 - i, 8, getBit(bits, i));
+    for (let i = 8; i < 15; i++) this.setFunctionModule(8, this.size - 15 + i, getBit(bits, i));
+    this.setFunctionModule(8, this.size - 8, true); // Always dark
+  }
+
+  drawVersion() {
+    if (this.version < 7) {
+      return;
+    }
+    let rem = this.version;
+    for (let i = 0; i < 12; i++) {
+      rem = (rem << 1) ^ ((rem >>> 11) * 0x1f25);
+    }
+    const bits = (this.version << 12) | rem;
+
+    for (let i = 0; i < 18; i++) {
+      const color = getBit(bits, i);
+      const a = this.size - 11 + (i % 3);
+      const b = Math.floor(i / 3);
+      this.setFunctionModule(a, b, color);
+      this.setFunctionModule(b, a, color);
+    }
+  }
+
+  drawFinderPattern(x, y) {
+    for (let dy = -4; dy <= 4; dy++) {
+      for (let dx = -4; dx <= 4; dx++) {
+        const dist = Math.max(Math.abs(dx), Math.abs(dy));
+        const xx = x + dx;
+        const yy = y + dy;
+        if (xx >= 0 && xx < this.size && yy >= 0 && yy < this.size) {
+          this.setFunctionModule(xx, yy, dist !== 2 && dist !== 4);
+        }
+      }
+    }
+  }
+
+  drawAlignmentPattern(x, y) {
+    for (let dy = -2; dy <= 2; dy++) {
+      for (let dx = -2; dx <= 2; dx++) {
+        this.setFunctionModule(x + dx, y + dy, Math.max(Math.abs(dx), Math.abs(dy)) !== 1);
+      }
+    }
+  }
+
+  getAlignmentPatternPositions() {
+    if (this.version === 1) {
+      return [];
+    }
+    const numAlign = Math.floor(this.version / 7) + 2;
+    const step = Math.floor((this.version * 8 + numAlign * 3 + 5) / (numAlign * 4 - 4)) * 2;
+    const result = [6];
+    for (let pos = this.size - 7; result.length < numAlign; pos -= step) {
+      result.splice(1, 0, pos);
+    }
+    return result;
+  }
+
+  addEccAndInterleave(data) {
+    const numBlocks = NUM_ERROR_CORRECTION_BLOCKS[this.ecc.ordinal][this.version];
+    const blockEccLen = ECC_CODEWORDS_PER_BLOCK[this.ecc.ordinal][this.version];
+    const rawCodewords = Math.floor(getNumRawDataModules(this.version) / 8);
+    const numShortBlocks = numBlocks - (rawCodewords % numBlocks);
+    const shortBlockLen = Math.floor(rawCodewords / numBlocks);
+
+    const blocks = [];
+    const divisor = reedSolomonComputeDivisor(blockEccLen);
+    for (let i = 0, k = 0; i < numBlocks; i++) {
+      const block = data.slice(k, k + shortBlockLen - blockEccLen + (i < numShortBlocks ? 0 : 1));
+      k += block.length;
+      const ecc = reedSolomonComputeRemainder(block, divisor);
+      if (i < numShortBlocks) block.push(0);
+      blocks.push(block.concat(ecc));
+    }
+
+    const result = [];
+    for (let i = 0; i < blocks[0].length; i++) {
+      blocks.forEach((block, j) => {
+        // Skip the padding byte in short blocks
+        if (i !== shortBlockLen - blockEccLen || j >= numShortBlocks) {
+          result.push(block[i]);
+        }
+      });
+    }
+    return result;
+  }
+
+  drawCodewords(data) {
+    let i = 0;
+    for (let right = this.size - 1; right >= 1; right -= 2) {
+      if (right === 6) right = 5;
+      for (let vert = 0; vert < this.size; vert++) {
+        for (let j = 0; j < 2; j++) {
+          const x = right - j;
+          const upward = ((right + 1) & 2) === 0;
+          const y = upward ? this.size - 1 - vert : vert;
+          if (!this.isFunction[y][x] && i < data.length * 8) {
+            this.modules[y][x] = getBit(data[i >>> 3], 7 - (i & 7));
+            i++;
+          }
+        }
+      }
+    }
+  }
+
+  applyMask(mask) {
+    for (let y = 0; y < this.size; y++) {
+      for (let x = 0; x < this.size; x++) {
+        let invert;
+        switch (mask) {
+          case 0: invert = (x + y) % 2 === 0; break;
+          case 1: invert = y % 2 === 0; break;
+          case 2: invert = x % 3 === 0; break;
+          case 3: invert = (x + y) % 3 === 0; break;
+          case 4: invert = (Math.floor(x / 3) + Math.floor(y / 2)) % 2 === 0; break;
+          case 5: invert = ((x * y) % 2) + ((x * y) % 3) === 0; break;
+          case 6: invert = (((x * y) % 2) + ((x * y) % 3)) % 2 === 0; break;
+          default: invert = (((x + y) % 2) + ((x * y) % 3)) % 2 === 0; break;
+        }
+        if (!this.isFunction[y][x] && invert) {
+          this.modules[y][x] = !this.modules[y][x];
+        }
+      }
+    }
+  }
+
+  getPenaltyScore() {
+    let result = 0;
+    const size = this.size;
+    const modules = this.modules;
+
+    // Runs and finder-like patterns in rows, then columns
+    for (let pass = 0; pass < 2; pass++) {
+      for (let a = 0; a < size; a++) {
+        let runColor = false;
+        let runLength = 0;
+        const runHistory = [0, 0, 0, 0, 0, 0, 0];
+        for (let b = 0; b < size; b++) {
+          const color = pass === 0 ? modules[a][b] : modules[b][a];
+          if (color === runColor) {
+            runLength++;
+            if (runLength === 5) result += PENALTY_N1;
+            else if (runLength > 5) result++;
+          } else {
+            this.finderPenaltyAddHistory(runLength, runHistory);
+            if (!runColor) result += this.finderPenaltyCountPatterns(runHistory) * PENALTY_N3;
+            runColor = color;
+            runLength = 1;
+          }
+        }
+        result += this.finderPenaltyTerminateAndCount(runColor, runLength, runHistory) * PENALTY_N3;
+      }
+    }
+
+    // 2x2 blocks of one color
+    for (let y = 0; y < size - 1; y++) {
+      for (let x = 0; x < size - 1; x++) {
+        const color = modules[y][x];
+        if (color === modules[y][x + 1] && color === modules[y + 1][x] && color === modules[y + 1][x + 1]) {
+          result += PENALTY_N2;
+        }
+      }
+    }
+
+    // Dark/light balance
+    let dark = 0;
+    for (const row of modules) {
+      for (const module of row) {
+        if (module) dark++;
+      }
+    }
+    const total = size * size;
+    const k = Math.ceil(Math.abs(dark * 20 - total * 10) / total) - 1;
+    result += k * PENALTY_N4;
+    return result;
+  }
+
+  finderPenaltyCountPatterns(runHistory) {
+    const n = runHistory[1];
+    const core = n > 0 && runHistory[2] === n && runHistory[3] === n * 3 && runHistory[4] === n && runHistory[5] === n;
+    return (core && runHistory[0] >= n * 4 && runHistory[6] >= n ? 1 : 0) +
+      (core && runHistory[6] >= n * 4 && runHistory[0] >= n ? 1 : 0);
+  }
+
+  finderPenaltyTerminateAndCount(currentRunColor, currentRunLength, runHistory) {
+    if (currentRunColor) {
+      this.finderPenaltyAddHistory(currentRunLength, runHistory);
+      currentRunLength = 0;
+    }
+    currentRunLength += this.size; // Light border after the last run
+    this.finderPenaltyAddHistory(currentRunLength, runHistory);
+    return this.finderPenaltyCountPatterns(runHistory);
+  }
+
+  finderPenaltyAddHistory(currentRunLength, runHistory) {
+    if (runHistory[0] === 0) {
+      currentRunLength += this.size; // Light border before the first run
+    }
+    runHistory.pop();
+    runHistory.unshift(currentRunLength);
+  }
+}
+
+/**
+ * Encode text into a QR module matrix
+ * @param {string} text - Text to encode
+ * @param {string} eccLevel - 'L', 'M', 'Q' or 'H' (raised when it fits for free)
+ * @returns {Object} { version, ecc, mask, size, modules } where modules[y][x] is true for dark
+ */
+export function encodeQr(text, eccLevel = 'M') {
+  let ecc = ECC_LEVELS[eccLevel];
+  if (!ecc) {
+    throw new Error(`Unknown error correction level: ${eccLevel}`);
+  }
+  const segment = makeSegment(text);
+
+  let version;
+  let usedBits;
+  for (version = 1; ; version++) {
+    usedBits = 4 + charCountBits(segment.mode, version) + segment.bits.length;
+    const fits = segment.numChars < (1 << charCountBits(segment.mode, version));
+    if (fits && usedBits <= getNumDataCodewords(version, ecc) * 8) {
+      break;
+    }
+    if (version >= 40) {
+      throw new Error('Data too long for a QR code');
+    }
+  }
+
+  // Use a stronger error correction level if it fits in the same version
+  for (const level of ['M', 'Q', 'H']) {
+    if (ECC_LEVELS[level].ordinal > ecc.ordinal && usedBits <= getNumDataCodewords(version, ECC_LEVELS[level]) * 8) {
+      ecc = ECC_LEVELS[level];
+    }
+  }
+
+  const bits = [];
+  appendBits(bits, segment.mode.bits, 4);
+  appendBits(bits, segment.numChars, charCountBits(segment.mode, version));
+  bits.push(...segment.bits);
+
+  const capacityBits = getNumDataCodewords(version, ecc) * 8;
+  appendBits(bits, 0, Math.min(4, capacityBits - bits.length));
+  appendBits(bits, 0, (8 - (bits.length % 8)) % 8);
+  for (let pad = 0xec; bits.length < capacityBits; pad ^= 0xec ^ 0x11) {
+    appendBits(bits, pad, 8);
+  }
+
+  const codewords = new Array(bits.length / 8).fill(0);
+  bits.forEach((bit, i) => {
+    codewords[i >>> 3] |= bit << (7 - (i & 7));
+  });
+
+  const matrix = new QrMatrix(version, ecc, codewords);
+  const eccName = Object.keys(ECC_LEVELS).find(key => ECC_LEVELS[key] === ecc);
+  return { version, ecc: eccName, mask: matrix.mask, size: matrix.size, modules: matrix.modules };
+}
+
+/**
+ * Render a QR matrix as SVG, one path with a run per horizontal stretch of dark modules
+ * @param {Object} qr - Result of encodeQr
+ * @param {Object} options - { size: pixel width/height, margin: quiet zone in modules }
+ * @returns {string} SVG document
+ */
+export function renderSvg(qr, { size, margin }) {
+  const dimension = qr.size + margin * 2;
+  let path = '';
+  qr.modules.forEach((row, y) => {
+    let start = -1;
+    for (let x = 0; x <= row.length; x++) {
+      if (x < row.length && row[x]) {
+        if (start < 0) start = x;
+      } else if (start >= 0) {
+        path += `M${start + margin} ${y + margin}h${x - start}v1h-${x - start}z`;
+        start = -1;
+      }
+    }
+  });
+  return `<?xml version="1.0" encoding="UTF-8"?>\n` +
+    `<svg xmlns="http://www.w3.org/2000/svg" width="${size}" height="${size}" viewBox="0 0 ${dimension} ${dimension}" shape-rendering="crispEdges">` +
+    `<rect width="100%" height="100%" fill="#FFFFFF"/>` +
+    `<path fill="#000000" d="${path}"/>` +
+    `</svg>\n`;
+}
+
+const CRC_TABLE = (() => {
+  const table = new Int32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c;
+  }
+  return table;
+})();
+
+function crc32(buffer) {
+  let crc = -1;
+  for (let i = 0; i < buffer.length; i++) {
+    crc = CRC_TABLE[(crc ^ buffer[i]) & 0xff] ^ (crc >>> 8);
+  }
+  return (crc ^ -1) >>> 0;
+}
+
+function pngChunk(type, data) {
+  const length = Buffer.alloc(4);
+  length.writeUInt32BE(data.length);
+  const body = Buffer.concat([Buffer.from(type, 'ascii'), data]);
+  const crc = Buffer.alloc(4);
+  crc.writeUInt32BE(crc32(body));
+  return Buffer.concat([length, body, crc]);
+}
+
+/**
+ * Render a QR matrix as a 1-bit grayscale PNG
+ * Modules are scaled by a whole number of pixels so edges stay sharp, so the
+ * image is the largest multiple of the module count that fits in `size`.
+ * @param {Object} qr - Result of encodeQr
+ * @param {Object} options - { size: maximum pixel width/height, margin: quiet zone in modules }
+ * @returns {Buffer} PNG file
+ */
+export function renderPng(qr, { size, margin }) {
+  const dimension = qr.size + margin * 2;
+  const scale = Math.max(1, Math.floor(size / dimension));
+  const width = dimension * scale;
+  const rowBytes = Math.ceil(width / 8);
+
+  // Each scanline is a filter byte (0 = none) followed by packed pixels; 1 = white.
+  // A module row is packed once and copied for the remaining `scale - 1` scanlines.
+  const stride = rowBytes + 1;
+  const raw = Buffer.alloc(stride * width);
+  for (let my = 0; my < dimension; my++) {
+    const offset = my * scale * stride;
+    const y = my - margin;
+    const row = y >= 0 && y < qr.size ? qr.modules[y] : null;
+    for (let px = 0; px < width; px++) {
+      const x = Math.floor(px / scale) - margin;
+      const dark = row !== null && x >= 0 && x < qr.size && row[x];
+      if (!dark) {
+        raw[offset + 1 + (px >>> 3)] |= 0x80 >>> (px & 7);
+      }
+    }
+    for (let i = 1; i < scale; i++) {
+      raw.copy(raw, offset + i * stride, offset, offset + stride);
+    }
+  }
+
+  const header = Buffer.alloc(13);
+  header.writeUInt32BE(width, 0);
+  header.writeUInt32BE(width, 4);
+  header[8] = 1; // Bit depth
+  header[9] = 0; // Grayscale
+  header[10] = 0; // Deflate
+  header[11] = 0; // Adaptive filtering
+  header[12] = 0; // No interlace
+
+  return Buffer.concat([
+    Buffer.from([0x89, 0x50, 0x4e, 0x47, 0x0d, 0x0a, 0x1a, 0x0a]),
+    pngChunk('IHDR', header),
+    pngChunk('IDAT', deflateSync(raw, { level: 9 })),
+    pngChunk('IEND', Buffer.alloc(0))
+  ]);
+}
@@ -0,0 +1,305 @@
+// Streaming CSV/NDJSON exports
+// QR codes and events are exported for an owner (or one code) over a date
+// range. Rows are read in pages ordered by the (created_at, id) keyset, and
+// each page is encoded into the response stream only when the client has
+// taken the previous one, so memory stays flat however many rows the export
+// covers. Responses are gzipped when the client accepts it.
+
+import { supabaseAdmin, isSupabaseConfigured } from './supabase';
+import { getFallbackStore } from './mongo-fallback';
+import { EVENT_TYPES } from './event-ingest';
+import { describeUserAgent } from './user-agent';
+import { counter } from './metrics';
+
+// PostgREST caps responses at max-rows (1000 on Supabase by default)
+export const EXPORT_PAGE_SIZE = parseInt(process.env.EXPORT_PAGE_SIZE || '1000');
+
+export const EXPORT_FORMATS = {
+  csv: 'text/csv; charset=utf-8',
+  ndjson: 'application/x-ndjson'
+};
+
+export const QR_EXPORT_COLUMNS = [
+  'id',
+  'name',
+  'slug',
+  'type',
+  'destination_config',
+  'is_active',
+  'scan_count',
+  'created_at',
+  'updated_at'
+];
+
+export const EVENT_EXPORT_COLUMNS = [
+  'id',
+  'slug',
+  'event_type',
+  'country',
+  'device',
+  'os',
+  'browser',
+  'metadata',
+  'created_at'
+];
+
+const EVENT_SELECT = 'id, qr_code_id, event_type, country, ua_device, ua_os, ua_browser, ua_family, metadata, created_at';
+
+const exportRows = counter('export_rows_total', 'Rows written by streaming exports', ['kind', 'format']);
+
+/**
+ * Parse export query parameters
+ * @param {URLSearchParams} searchParams - Request query (format, from, to, slug, event_type)
+ * @returns {Object} { format, since, until, slug, eventType } or { error }
+ */
+export function parseExportQuery(searchParams) {
+  const format = (searchParams.get('format') || 'csv').toLowerCase();
+  if (!EXPORT_FORMATS[format]) {
+    return { error: `format must be one of: ${Object.keys(EXPORT_FORMATS).join(', ')}` };
+  }
+
+  const parseDate = (name) => {
+    const value = searchParams.get(name);
+    if (!value) return null;
+    const date = new Date(value);
+    return Number.isNaN(date.getTime()) ? undefined : date;
+  };
+  const since = parseDate('from');
+  const until = parseDate('to');
+  if (since === undefined || until === undefined) {
+    return { error: 'from and to must be ISO dates' };
+  }
+  if (since && until && since >= until) {
+    return { error: 'from must be before to' };
+  }
+
+  const eventType = searchParams.get('event_type');
+  if (eventType && !EVENT_TYPES.includes(eventType)) {
+    return { error: `event_type must be one of: ${EVENT_TYPES.join(', ')}` };
+  }
+
+  return {
+    format,
+    since: since || new Date(0),
+    until: until || new Date(),
+    slug: searchParams.get('slug') || null,
+    eventType: eventType || null
+  };
+}
+
+function csvCell(value) {
+  if (value === null || value === undefined) {
+    return '';
+  }
+  let text = typeof value === 'object' ? JSON.stringify(value) : String(value);
+  // Keep spreadsheets from evaluating cells as formulas
+  if (typeof value === 'string' && /^[=+\-@\t\r]/.test(text)) {
+    text = `'${text}`;
+  }
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+}
+
+/**
+ * Encode rows as CSV lines or NDJSON
+ * @param {Array<Object>} rows - Export rows
+ * @param {Array<string>} columns - Columns, in order
+ * @param {string} format - 'csv' or 'ndjson'
+ * @returns {string}
+ */
+export function encodeRows(rows, columns, format) {
+  let text = '';
+  for (const row of rows) {
+    if (format === 'csv') {
+      text += columns.map(column => csvCell(row[column])).join(',') + '\r\n';
+    } else {
+      const record = {};
+      for (const column of columns) {
+        record[column] = row[column] ?? null;
+      }
+      text += JSON.stringify(record) + '\n';
+    }
+  }
+  return text;
+}
+
+/**
+ * Stream pages of rows as an export body
+ * @param {AsyncIterable<Array<Object>>} pages - Pages of rows, read one at a time as the client consumes them
+ * @param {Object} options
+ * @param {string} options.kind - 'qr' or 'events' (for metrics)
+ * @param {Array<string>} options.columns - Columns, in order
+ * @param {string} options.format - 'csv' or 'ndjson'
+ * @param {boolean} options.gzip - Compress the stream
+ * @returns {ReadableStream<Uint8Array>}
+ */
+export function createExportStream(pages, { kind, columns, format, gzip }) {
+  const encoder = new TextEncoder();
+  const iterator = pages[Symbol.asyncIterator]();
+  let pending = format === 'csv' ? columns.join(',') + '\r\n' : '';
+
+  const stream = new ReadableStream({
+    async pull(controller) {
+      try {
+        const { value: rows, done } = await iterator.next();
+        if (done) {
+          if (pending) controller.enqueue(encoder.encode(pending));
+          controller.close();
+          return;
+        }
+        controller.enqueue(encoder.encode(pending + encodeRows(rows, columns, format)));
+        pending = '';
+        exportRows.inc({ kind, format }, rows.length);
+      } catch (error) {
+        console.error(`Export of ${kind} failed:`, error);
+        controller.error(error);
+      }
+    },
+    async cancel() {
+      await iterator.return?.();
+    }
+  });
+
+  return gzip ? stream.pipeThrough(new CompressionStream('gzip')) : stream;
+}
+
+// Rows strictly after `after` in ascending (created_at, id) order
+function keysetFilter(after) {
+  return `created_at.gt."${after.created_at}",and(created_at.eq."${after.created_at}",id.gt.${after.id})`;
+}
+
+async function* keysetPages(fetchPage) {
+  let after = null;
+  while (true) {
+    const rows = await fetchPage(after);
+    if (rows.length > 0) {
+      yield rows;
+    }
+    if (rows.length < EXPORT_PAGE_SIZE) {
+      return;
+    }
+    after = rows[rows.length - 1];
+  }
+}
+
+/**
+ * Pages of an owner's QR codes created within [since, until), oldest first
+ * @param {Object} options - { userId, since, until }
+ * @returns {AsyncGenerator<Array<Object>>}
+ */
+export async function* exportQrPages({ userId, since, until }) {
+  if (isSupabaseConfigured && supabaseAdmin) {
+    yield* keysetPages(async (after) => {
+      let query = supabaseAdmin
+        .from('qr_codes')
+        .select(QR_EXPORT_COLUMNS.join(','))
+        .eq('user_id', userId)
+        .gte('created_at', since.toISOString())
+        .lt('created_at', until.toISOString());
+      if (after) {
+        query = query.or(keysetFilter(after));
+      }
+      const { data, error } = await query
+        .order('created_at', { ascending: true })
+        .order('id', { ascending: true })
+        .limit(EXPORT_PAGE_SIZE);
+      if (error) throw error;
+      return data || [];
+    });
+    return;
+  }
+
+  const store = await getFallbackStore();
+  yield* keysetPages(after => store.listQrsForExport({ userId, since, until, after, limit: EXPORT_PAGE_SIZE }));
+}
+
+function toEventRow(event, slug) {
+  const { device, os, browser } = describeUserAgent(event);
+  return {
+    id: event.id,
+    slug,
+    event_type: event.event_type,
+    country: event.country,
+    device,
+    os,
+    browser,
+    metadata: event.metadata,
+    created_at: event.created_at
+  };
+}
+
+/**
+ * Pages of events within [since, until), oldest first, for one code or all
+ * of an owner's codes
+ * @param {Object} options - { userId, qr?, since, until, eventType? }
+ * @returns {AsyncGenerator<Array<Object>>} Rows shaped by EVENT_EXPORT_COLUMNS
+ */
+export async function* exportEventPages({ userId, qr, since, until, eventType }) {
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const pages = keysetPages(async (after) => {
+      let query = supabaseAdmin
+        .from('qr_events')
+        .select(qr ? EVENT_SELECT : `${EVENT_SELECT}, qr_codes!inner(slug)`)
+        .gte('created_at', since.toISOString())
+        .lt('created_at', until.toISOString());
+      query = qr ? query.eq('qr_code_id', qr.id) : query.eq('qr_codes.user_id', userId);
+      if (eventType) {
+        query = query.eq('event_type', eventType);
+      }
+      if (after) {
+        query = query.or(keysetFilter(after));
+      }
+      const { data, error } = await query
+        .order('created_at', { ascending: true })
+        .order('id', { ascending: true })
+        .limit(EXPORT_PAGE_SIZE);
+      if (error) throw error;
+      return data || [];
+    });
+    for await (const rows of pages) {
+      yield rows.map(event => toEventRow(event, qr ? qr.slug : event.qr_codes?.slug));
+    }
+    return;
+  }
+
+  const store = await getFallbackStore();
+  const slugs = new Map(qr ? [[qr.id, qr.slug]] : []);
+  const pages = keysetPages(after => store.listEventsForExport({
+    qrId: qr?.id,
+    userId,
+    since,
+    until,
+    eventType,
+    after,
+    limit: EXPORT_PAGE_SIZE
+  }));
+  for await (const rows of pages) {
+    for (const id of new Set(rows.map(event => event.qr_code_id))) {
+      if (!slugs.has(id)) {
+        slugs.set(id, (await store.getQrById(id))?.slug || null);
+      }
+    }
+    yield rows.map(event => toEventRow(event, slugs.get(event.qr_code_id)));
+  }
+}
+
+/**
+ * Build the streaming response for an export
+ * @param {Request} request - Incoming request (for Accept-Encoding)
+ * @param {AsyncIterable<Array<Object>>} pages - Row pages
+ * @param {Object} options - { kind, columns, format }
+ * @returns {Response}
+ */
+export function exportResponse(request, pages, { kind, columns, format }) {
+  const gzip = /\bgzip\b/.test(request.headers.get('accept-encoding') || '');
+  const date = new Date().toISOString().slice(0, 10);
+  const headers = {
+    'Content-Type': EXPORT_FORMATS[format],
+    'Content-Disposition': `attachment; filename="novatok-${kind}-${date}.${format}"`,
+    'Cache-Control': 'no-store',
+    Vary: 'Accept-Encoding'
+  };
+  if (gzip) {
+    headers['Content-Encoding'] = 'gzip';
+  }
+  return new Response(createExportStream(pages, { kind, columns, format, gzip }), { headers });
+}
@@ -0,0 +1,95 @@
+// QR image rendering
+// Renders print-ready SVG/PNG images of a code's public URL. Output is keyed
+// by a hash of the encoded URL and render parameters, which doubles as a
+// strong ETag: the same inputs always produce the same bytes, so a matching
+// If-None-Match can be answered without rendering or touching the cache.
+
+import { createHash } from 'crypto';
+import { LruCache } from './lru-cache';
+import { encodeQr, renderSvg, renderPng, ECC_LEVELS } from './qr-encoder';
+
+const QR_IMAGE_CACHE_MAX_ENTRIES = parseInt(process.env.QR_IMAGE_CACHE_MAX_ENTRIES || '5000');
+const QR_IMAGE_CACHE_TTL_MS = parseInt(process.env.QR_IMAGE_CACHE_TTL_MS || '86400000');
+
+// Bump when rendering output changes so previously issued ETags stop matching
+const RENDERER_VERSION = 1;
+
+export const IMAGE_FORMATS = {
+  svg: 'image/svg+xml',
+  png: 'image/png'
+};
+
+const DEFAULT_SIZE = 512;
+const MIN_SIZE = 64;
+const MAX_SIZE = 4096;
+const DEFAULT_MARGIN = 4;
+const MAX_MARGIN = 32;
+
+const imageCache = new LruCache({ maxEntries: QR_IMAGE_CACHE_MAX_ENTRIES, ttlMs: QR_IMAGE_CACHE_TTL_MS });
+
+function parseIntParam(value, fallback) {
+  if (value === null || value === '') return fallback;
+  return /^\d+$/.test(value) ? parseInt(value, 10) : NaN;
+}
+
+/**
+ * Parse image query parameters
+ * @param {URLSearchParams} searchParams - Request query (format, size, margin, ecc)
+ * @returns {Object} { format, size, margin, ecc } or { error }
+ */
+export function parseImageOptions(searchParams) {
+  const format = (searchParams.get('format') || 'svg').toLowerCase();
+  if (!IMAGE_FORMATS[format]) {
+    return { error: `format must be one of: ${Object.keys(IMAGE_FORMATS).join(', ')}` };
+  }
+  const size = parseIntParam(searchParams.get('size'), DEFAULT_SIZE);
+  if (!(size >= MIN_SIZE && size <= MAX_SIZE)) {
+    return { error: `size must be between ${MIN_SIZE} and ${MAX_SIZE}` };
+  }
+  const margin = parseIntParam(searchParams.get('margin'), DEFAULT_MARGIN);
+  if (!(margin >= 0 && margin <= MAX_MARGIN)) {
+    return { error: `margin must be between 0 and ${MAX_MARGIN}` };
+  }
+  const ecc = (searchParams.get('ecc') || 'M').toUpperCase();
+  if (!ECC_LEVELS[ecc]) {
+    return { error: `ecc must be one of: ${Object.keys(ECC_LEVELS).join(', ')}` };
+  }
+  return { format, size, margin, ecc };
+}
+
+/**
+ * Content hash of everything that determines the rendered bytes
+ * @param {string} url - Encoded URL
+ * @param {Object} options - Parsed image options
+ * @returns {string} Strong ETag value (quoted)
+ */
+export function getImageEtag(url, { format, size, margin, ecc }) {
+  const hash = createHash('sha256')
+    .update(JSON.stringify([RENDERER_VERSION, url, format, size, margin, ecc]))
+    .digest('base64url');
+  return `"${hash.slice(0, 32)}"`;
+}
+
+/**
+ * Render (or fetch from cache) a QR image for a URL
+ * @param {string} url - URL to encode
+ * @param {Object} options - Parsed image options
+ * @returns {Object} { body, contentType, etag }
+ */
+export function renderQrImage(url, options) {
+  const etag = getImageEtag(url, options);
+  const cached = imageCache.get(etag);
+  if (cached) {
+    return cached;
+  }
+
+  const qr = encodeQr(url, options.ecc);
+  const body = options.format === 'png' ? renderPng(qr, options) : renderSvg(qr, options);
+  const image = { body, contentType: IMAGE_FORMATS[options.format], etag };
+  imageCache.set(etag, image);
+  return image;
+}
+
+export function getQrImageCacheStats() {
+  return imageCache.stats();
+}
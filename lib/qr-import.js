@@ -0,0 +1,221 @@
+// Bulk QR import
+// Parses a streamed CSV or NDJSON request body into QR rows, validating each
+// with the same per-type rules as single creation. Rows are read one at a
+// time from the body stream; only the parsed rows are kept in memory.
+
+import { QR_TYPES, validateDestinationConfig } from './qr-utils';
+
+export const QR_BULK_MAX_ROWS = parseInt(process.env.QR_BULK_MAX_ROWS || '5000');
+export const QR_BULK_INSERT_CHUNK = parseInt(process.env.QR_BULK_INSERT_CHUNK || '500');
+
+// Malformed body (as opposed to an invalid row); fails the whole import
+export class ImportError extends Error {}
+
+// A single record (CSV row or NDJSON line) may not exceed this many characters
+const MAX_RECORD_LENGTH = 64 * 1024;
+
+export const IMPORT_FORMATS = {
+  csv: ['text/csv', 'application/csv'],
+  ndjson: ['application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines']
+};
+
+/**
+ * Pick the import format from a Content-Type header
+ * @returns {string|null} 'csv', 'ndjson' or null if unsupported
+ */
+export function getImportFormat(contentType) {
+  const mediaType = (contentType || '').split(';')[0].trim().toLowerCase();
+  return Object.keys(IMPORT_FORMATS).find(format => IMPORT_FORMATS[format].includes(mediaType)) || null;
+}
+
+async function* decodeText(stream) {
+  const decoder = new TextDecoder();
+  for await (const chunk of stream) {
+    yield decoder.decode(chunk, { stream: true });
+  }
+  const tail = decoder.decode();
+  if (tail) yield tail;
+}
+
+/**
+ * Split a text stream into lines
+ */
+export async function* readLines(stream) {
+  let pending = '';
+  for await (const text of decodeText(stream)) {
+    pending += text;
+    let newline;
+    while ((newline = pending.indexOf('\n')) !== -1) {
+      yield pending.slice(0, newline).replace(/\r$/, '');
+      pending = pending.slice(newline + 1);
+    }
+    if (pending.length > MAX_RECORD_LENGTH) {
+      throw new ImportError(`Line exceeds ${MAX_RECORD_LENGTH} characters`);
+    }
+  }
+  if (pending) yield pending.replace(/\r$/, '');
+}
+
+/**
+ * Parse an RFC 4180 CSV stream into records (quoted fields may span lines)
+ */
+export async function* readCsvRecords(stream) {
+  let record = [];
+  let field = '';
+  let recordLength = 0;
+  let inQuotes = false;
+  let afterQuote = false;
+
+  for await (const text of decodeText(stream)) {
+    for (const ch of text) {
+      if (++recordLength > MAX_RECORD_LENGTH) {
+        throw new ImportError(`Row exceeds ${MAX_RECORD_LENGTH} characters`);
+      }
+      if (inQuotes) {
+        if (afterQuote) {
+          afterQuote = false;
+          if (ch === '"') {
+            field += '"';
+            continue;
+          }
+          inQuotes = false; // Closing quote; handle ch as unquoted below
+        } else {
+          if (ch === '"') afterQuote = true;
+          else field += ch;
+          continue;
+        }
+      }
+      if (ch === '"' && field === '') {
+        inQuotes = true;
+      } else if (ch === ',') {
+        record.push(field);
+        field = '';
+      } else if (ch === '\n') {
+        record.push(field);
+        yield record;
+        record = [];
+        field = '';
+        recordLength = 0;
+      } else if (ch !== '\r') {
+        field += ch;
+      }
+    }
+  }
+
+  if (inQuotes && !afterQuote) {
+    throw new ImportError('Unterminated quoted field');
+  }
+  if (field !== '' || record.length > 0) {
+    record.push(field);
+    yield record;
+  }
+}
+
+/**
+ * Validate one import row
+ * @param {Object} input - { name, type, destination_config }
+ * @returns {Object} { qr } or { error }
+ */
+export function validateImportRow(input) {
+  if (!input || typeof input !== 'object' || Array.isArray(input)) {
+    return { error: 'Row must be an object' };
+  }
+  const { name, type } = input;
+  const config = input.destination_config || {};
+  if (!name || !type) {
+    return { error: 'Name and type are required' };
+  }
+  if (!Object.values(QR_TYPES).includes(type)) {
+    return { error: `Unknown type: ${type}` };
+  }
+  if (typeof config !== 'object' || Array.isArray(config)) {
+    return { error: 'destination_config must be an object' };
+  }
+  const validation = validateDestinationConfig(type, config);
+  if (!validation.valid) {
+    return { error: validation.error };
+  }
+  return { qr: { name: String(name), type, destination_config: config } };
+}
+
+/**
+ * Map a CSV record to an import row. Besides name and type, a
+ * destination_config column may hold JSON; any other non-empty column
+ * becomes a destination_config key (e.g. amount, currency, productName).
+ */
+function csvRecordToInput(header, record) {
+  const input = { destination_config: {} };
+  for (let i = 0; i < header.length; i++) {
+    const column = header[i];
+    const value = (record[i] ?? '').trim();
+    if (column === 'name' || column === 'type') {
+      input[column] = value;
+    } else if (column === 'destination_config') {
+      if (value) Object.assign(input.destination_config, JSON.parse(value));
+    } else if (column && value !== '') {
+      input.destination_config[column] = value;
+    }
+  }
+  return input;
+}
+
+/**
+ * Read and validate every row of an import body
+ * @param {ReadableStream} stream - Request body
+ * @param {string} format - 'csv' or 'ndjson'
+ * @returns {Promise<Object>} { rows: [{ row, qr }], errors: [{ row, error }], tooMany }
+ */
+export async function parseImport(stream, format) {
+  const rows = [];
+  const errors = [];
+  let rowNumber = 0;
+
+  const accept = (input) => {
+    const result = validateImportRow(input);
+    if (result.error) {
+      errors.push({ row: rowNumber, error: result.error });
+    } else {
+      rows.push({ row: rowNumber, qr: result.qr });
+    }
+  };
+
+  if (format === 'csv') {
+    let header = null;
+    for await (const record of readCsvRecords(stream)) {
+      if (record.length === 1 && record[0].trim() === '') continue;
+      if (!header) {
+        header = record.map(column => column.trim());
+        if (!header.includes('name') || !header.includes('type')) {
+          throw new ImportError('CSV header must include name and type columns');
+        }
+        continue;
+      }
+      if (++rowNumber > QR_BULK_MAX_ROWS) {
+        return { rows, errors, tooMany: true };
+      }
+      try {
+        accept(csvRecordToInput(header, record));
+      } catch {
+        errors.push({ row: rowNumber, error: 'destination_config is not valid JSON' });
+      }
+    }
+  } else {
+    for await (const line of readLines(stream)) {
+      if (line.trim() === '') continue;
+      if (++rowNumber > QR_BULK_MAX_ROWS) {
+        return { rows, errors, tooMany: true };
+      }
+      let input;
+      try {
+        input = JSON.parse(line);
+      } catch {
+        errors.push({ row: rowNumber, error: 'Invalid JSON' });
+        continue;
+      }
+      accept(input);
+    }
+  }
+
+  return { rows, errors, tooMany: false };
+}
+
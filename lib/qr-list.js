@@ -0,0 +1,143 @@
+// QR list pagination helpers
+// GET /api/qr pages through a user's codes newest first using a keyset on
+// (created_at, id), so each page costs one index range scan regardless of
+// how many codes the account holds. Callers can narrow the columns with
+// `fields=` or ask for the lightweight `view=summary` projection.
+
+export const DEFAULT_PAGE_SIZE = 50;
+export const MAX_PAGE_SIZE = 200;
+
+// Columns a client may request; destination_config is the heavy one
+export const QR_LIST_FIELDS = [
+  'id',
+  'user_id',
+  'name',
+  'slug',
+  'type',
+  'destination_config',
+  'is_active',
+  'scan_count',
+  'created_at',
+  'updated_at'
+];
+
+// Enough to render the dashboard list and stat cards
+export const QR_SUMMARY_FIELDS = ['id', 'name', 'slug', 'type', 'is_active', 'scan_count', 'created_at'];
+
+/**
+ * Encode the last row of a page as an opaque cursor
+ * @param {Object} qr - Row with created_at and id
+ * @returns {string}
+ */
+export function encodeCursor(qr) {
+  return Buffer.from(JSON.stringify([qr.created_at, qr.id])).toString('base64url');
+}
+
+/**
+ * Decode a cursor produced by encodeCursor
+ * @param {string} cursor - Opaque cursor
+ * @returns {Object|null} { createdAt, id }, or null if malformed
+ */
+export function decodeCursor(cursor) {
+  try {
+    const [createdAt, id] = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    // Values end up inside a PostgREST filter string, so keep them to safe characters
+    if (typeof createdAt !== 'string' || !/^[\d:.+TZ -]+$/.test(createdAt) || Number.isNaN(Date.parse(createdAt))) {
+      return null;
+    }
+    if (typeof id !== 'string' || !/^[\w-]+$/.test(id)) {
+      return null;
+    }
+    return { createdAt, id };
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Parse list query parameters
+ * @param {URLSearchParams} searchParams - Request query
+ * @returns {Object} { limit, cursor, fields } or { error }
+ */
+export function parseListQuery(searchParams) {
+  const limitParam = searchParams.get('limit');
+  let limit = DEFAULT_PAGE_SIZE;
+  if (limitParam !== null) {
+    limit = parseInt(limitParam, 10);
+    if (!Number.isFinite(limit) || limit < 1) {
+      return { error: 'limit must be a positive integer' };
+    }
+    limit = Math.min(limit, MAX_PAGE_SIZE);
+  }
+
+  let cursor = null;
+  const cursorParam = searchParams.get('cursor');
+  if (cursorParam) {
+    cursor = decodeCursor(cursorParam);
+    if (!cursor) {
+      return { error: 'Invalid cursor' };
+    }
+  }
+
+  let fields = null;
+  if (searchParams.get('view') === 'summary') {
+    fields = QR_SUMMARY_FIELDS;
+  }
+  const fieldsParam = searchParams.get('fields');
+  if (fieldsParam) {
+    const requested = fieldsParam.split(',').map(field => field.trim()).filter(Boolean);
+    const unknown = requested.filter(field => !QR_LIST_FIELDS.includes(field));
+    if (unknown.length > 0) {
+      return { error: `Unknown fields: ${unknown.join(', ')}` };
+    }
+    fields = requested;
+  }
+  if (fields) {
+    // The cursor is built from these, so they are always returned
+    fields = [...new Set(['id', 'created_at', ...fields])];
+  }
+
+  return { limit, cursor, fields };
+}
+
+/**
+ * Order rows newest first, ties broken by id (the keyset order)
+ */
+export function compareQrKeys(a, b) {
+  if (a.created_at !== b.created_at) {
+    return a.created_at < b.created_at ? 1 : -1;
+  }
+  if (a.id === b.id) return 0;
+  return a.id < b.id ? 1 : -1;
+}
+
+/**
+ * Whether a row sorts after the cursor position
+ */
+export function isAfterCursor(qr, cursor) {
+  return compareQrKeys(qr, { created_at: cursor.createdAt, id: cursor.id }) > 0;
+}
+
+/**
+ * Keep only the requested columns of a row
+ */
+export function projectQr(qr, fields) {
+  if (!fields) return qr;
+  const projected = {};
+  for (const field of fields) {
+    if (qr[field] !== undefined) projected[field] = qr[field];
+  }
+  return projected;
+}
+
+/**
+ * Turn limit + 1 fetched rows into a page
+ * @param {Array<Object>} rows - Rows in keyset order, at most limit + 1
+ * @param {number} limit - Page size
+ * @returns {Object} { qrCodes, nextCursor }
+ */
+export function buildPage(rows, limit) {
+  const qrCodes = rows.slice(0, limit);
+  const nextCursor = rows.length > limit ? encodeCursor(qrCodes[qrCodes.length - 1]) : null;
+  return { qrCodes, nextCursor };
+}
@@ -0,0 +1,170 @@
+// Server-side QR resolution
+// A scan of /q/[slug] is resolved while the page renders: the slug is looked
+// up (cache first), the owner's quota checked, the scan counted and its event
+// queued, and the visitor redirected straight to the payment or mint page.
+// GET /api/qr/[slug] shares the same path, and the destination pages read the
+// QR here instead of fetching it (and counting it again) from the browser.
+
+import { v4 as uuidv4 } from 'uuid';
+import { isSupabaseConfigured, supabaseAdmin } from './supabase';
+import { getFallbackStore } from './mongo-fallback';
+import { getCachedQr, cacheQr } from './qr-cache';
+import { recordScan } from './scan-counter';
+import { checkScanQuota, recordQuotaScan } from './scan-quota';
+import { enqueueEvents, normalizeEvent, rememberQrId } from './event-ingest';
+import { publishScan, publishEvents } from './event-hub';
+import { QR_TYPES } from './qr-utils';
+import { classifyUserAgentFamily } from './user-agent';
+
+// Purpose/Sec-Purpose values of speculative loads (link prefetch, prerender)
+const SPECULATIVE_PURPOSE = /prefetch|prerender|preview/i;
+
+/**
+ * Look up an active QR code without counting a scan
+ * @param {string} slug - QR slug
+ * @returns {Promise<Object|null>} { qr, isDemo, persistent } or null if missing/inactive
+ */
+export async function findActiveQr(slug) {
+  if (isSupabaseConfigured && supabaseAdmin) {
+    let qr = getCachedQr(slug);
+    if (!qr) {
+      const { data, error } = await supabaseAdmin
+        .from('qr_codes')
+        .select('*')
+        .eq('slug', slug)
+        .eq('is_active', true)
+        .single();
+
+      if (error || !data) {
+        return null;
+      }
+      cacheQr(data);
+      rememberQrId(data.slug, data.id, data.user_id);
+      qr = data;
+    }
+    return { qr, isDemo: false, persistent: true };
+  }
+
+  const store = await getFallbackStore();
+  const qr = await store.getQrBySlug(slug);
+  if (!qr || !qr.is_active) {
+    return null;
+  }
+  return { qr, isDemo: true, persistent: store.persistent };
+}
+
+async function recordScanEvent(slug, qr, event, enrichment, isDemo) {
+  if (!isDemo) {
+    enqueueEvents(slug, [event], enrichment);
+    return;
+  }
+  const row = normalizeEvent(slug, event, enrichment);
+  if (row) {
+    const { slug: _slug, ...fields } = row;
+    const store = await getFallbackStore();
+    await store.appendEvents([{ id: uuidv4(), qr_code_id: qr.id, ...fields }]);
+    publishEvents(qr.user_id, [row]);
+  }
+}
+
+/**
+ * Resolve a scan: look up the QR, enforce the owner's monthly quota and
+ * count it
+ * @param {string} slug - QR slug
+ * @param {Object} event - Optional scan event to record (see scanEventFromHeaders)
+ * @param {Object} enrichment - Country and user agent codes for the event (see getRequestEnrichment)
+ * @returns {Promise<Object|null>} { qr, isDemo, quotaExceeded, reason, softLimitReached }, or null if not found
+ */
+export async function resolveScan(slug, event, enrichment) {
+  const found = await findActiveQr(slug);
+  if (!found) {
+    return null;
+  }
+  const { qr, isDemo, persistent } = found;
+
+  // Enforce the owner's monthly scan quota from in-memory counters
+  const quota = await checkScanQuota(qr.user_id);
+  if (!quota.allowed) {
+    return { qr, isDemo, quotaExceeded: true, reason: quota.reason };
+  }
+
+  // Scan counts are written behind; reflect the scan locally right away.
+  // In-memory demo rows are live objects, so incrementing them persists it.
+  recordQuotaScan(qr.user_id);
+  if (persistent) {
+    recordScan(slug);
+  }
+  qr.scan_count = (qr.scan_count || 0) + 1;
+  publishScan(qr.user_id, slug);
+
+  if (event) {
+    await recordScanEvent(slug, qr, event, enrichment, isDemo);
+  }
+  return { qr, isDemo, quotaExceeded: false, softLimitReached: !!quota.softLimitReached };
+}
+
+/**
+ * Whether a request for /q/[slug] is a person scanning the code rather than
+ * a browser prefetch or a crawler / link-preview bot; only those are
+ * counted against the owner's quota
+ * @param {Headers} headers - Request headers
+ * @returns {boolean}
+ */
+export function isCountableScan(headers) {
+  const purpose = headers.get('sec-purpose') || headers.get('purpose') || headers.get('x-purpose');
+  if ((purpose && SPECULATIVE_PURPOSE.test(purpose)) || headers.get('next-router-prefetch')) {
+    return false;
+  }
+  return classifyUserAgentFamily(headers.get('user-agent')) !== 'bot';
+}
+
+/**
+ * Build the scan event for a request from its headers
+ * @param {Headers} headers - Request headers
+ * @returns {Object} Tracking payload for normalizeEvent
+ */
+export function scanEventFromHeaders(headers) {
+  const referrer = headers.get('referer');
+  return {
+    event_type: 'scan',
+    metadata: referrer ? { referrer } : {}
+  };
+}
+
+/**
+ * Where a scanned QR code sends the visitor
+ * @param {Object} qr - QR code row
+ * @returns {string|null} Path, or null when the scan page itself is the destination (multi-option)
+ */
+export function getScanDestination(qr) {
+  const slug = encodeURIComponent(qr.slug);
+  switch (qr.type) {
+    case QR_TYPES.FIAT:
+      return `/pay/fiat?slug=${slug}`;
+    case QR_TYPES.CRYPTO:
+      return `/pay/crypto?slug=${slug}`;
+    case QR_TYPES.NOVA:
+      return `/pay/nova?slug=${slug}`;
+    case QR_TYPES.NFT_MINT:
+      return `/mint/${slug}`;
+    case QR_TYPES.NFT_LISTING:
+      return `/marketplace/${encodeURIComponent(qr.destination_config?.listingId || qr.slug)}?slug=${slug}`;
+    default:
+      return null;
+  }
+}
+
+/**
+ * The fields a public page needs, for passing to client components
+ * @param {Object} qr - QR code row
+ */
+export function toPublicQr(qr) {
+  if (!qr) return null;
+  return {
+    id: qr.id,
+    slug: qr.slug,
+    name: qr.name,
+    type: qr.type,
+    destination_config: qr.destination_config || {}
+  };
+}
@@ -1,12 +1,3 @@
-import { v4 as uuidv4 } from 'uuid';
-
-// Generate a unique slug for QR codes
-export function generateSlug() {
-  // Generate a short, URL-friendly slug
-  const uuid = uuidv4().replace(/-/g, '');
-  return uuid.substring(0, 8);
-}
-
 // QR Code Types
 export const QR_TYPES = {
   FIAT: 'fiat',
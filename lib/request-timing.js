@@ -0,0 +1,77 @@
+// Per-request timing
+// Breaks each API request down into stages (auth, db, serialize, ...) for the
+// Server-Timing header. The breakdown lives in AsyncLocalStorage, so library
+// code such as the Supabase fetch wrapper can charge time to the current
+// request without it being threaded through every call.
+
+import { AsyncLocalStorage } from 'async_hooks';
+
+const storage = new AsyncLocalStorage();
+
+/**
+ * Start timing a request
+ * @returns {Object} Timing record for runWithTiming / formatServerTiming
+ */
+export function createTiming() {
+  return { started: performance.now(), stages: {} };
+}
+
+/**
+ * Run fn with timing as the current request's timing record
+ */
+export function runWithTiming(timing, fn) {
+  return storage.run({ timing, stage: null }, fn);
+}
+
+function addStage(timing, name, ms) {
+  timing.stages[name] = (timing.stages[name] || 0) + ms;
+}
+
+/**
+ * Time fn (sync or async) as a stage of the current request. Inside another
+ * stage the outer one keeps the time, so a Supabase call made while
+ * resolving the user counts as auth rather than db. Concurrent stages of
+ * the same name are summed.
+ * @param {string} name - Stage name
+ * @param {Function} fn - Work to time
+ * @returns {*} fn's result
+ */
+export function timed(name, fn) {
+  const scope = storage.getStore();
+  if (!scope || scope.stage) {
+    return fn();
+  }
+  const started = performance.now();
+  const done = () => addStage(scope.timing, name, performance.now() - started);
+  let result;
+  try {
+    result = storage.run({ timing: scope.timing, stage: name }, fn);
+  } catch (error) {
+    done();
+    throw error;
+  }
+  if (result && typeof result.then === 'function') {
+    return Promise.resolve(result).finally(done);
+  }
+  done();
+  return result;
+}
+
+/**
+ * fetch that charges its round trip to the current request's db stage
+ */
+export function timedFetch(input, init) {
+  return timed('db', () => fetch(input, init));
+}
+
+/**
+ * Build a Server-Timing header value
+ * @param {Object} timing - Timing record
+ * @returns {string} e.g. "auth;dur=1.2, db;dur=8.4, serialize;dur=0.3, total;dur=11.0"
+ */
+export function formatServerTiming(timing) {
+  const total = performance.now() - timing.started;
+  const entries = Object.entries(timing.stages).map(([name, ms]) => `${name};dur=${ms.toFixed(1)}`);
+  entries.push(`total;dur=${total.toFixed(1)}`);
+  return entries.join(', ');
+}
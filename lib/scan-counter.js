@@ -0,0 +1,164 @@
+// Write-behind scan counter
+// Aggregates scan increments per slug in memory and applies them with one
+// increment_scan_counts RPC (or one MongoDB bulkWrite) per flush, so scans
+// don't wait on a database write and hot codes take one row update per
+// interval instead of per scan. At shutdown the buffer is drained: a flush
+// still in flight is awaited, then the scans recorded since are written.
+
+import { supabaseAdmin } from './supabase';
+import { getMongoStore } from './mongo-fallback';
+import { onShutdown } from './shutdown';
+
+const SCAN_FLUSH_INTERVAL_MS = parseInt(process.env.SCAN_FLUSH_INTERVAL_MS || '2000');
+const SCAN_FLUSH_MAX_SLUGS = parseInt(process.env.SCAN_FLUSH_MAX_SLUGS || '500');
+
+let pending = new Map();
+let flushing = null;
+let timer = null;
+// How many of the scans recorded so far are known to be in the database
+let persistedThrough = 0;
+
+const stats = {
+  recorded: 0,
+  flushed: 0,
+  flushes: 0,
+  failedFlushes: 0
+};
+
+/**
+ * Count one scan for a slug; the database is updated on the next flush
+ * @param {string} slug - QR slug
+ */
+export function recordScan(slug) {
+  pending.set(slug, (pending.get(slug) || 0) + 1);
+  stats.recorded++;
+
+  if (pending.size >= SCAN_FLUSH_MAX_SLUGS) {
+    flushScanCounts();
+  } else {
+    scheduleFlush();
+  }
+}
+
+/**
+ * Number of scans recorded so far; compare with flushScanCountsThrough
+ * @returns {number}
+ */
+export function getScanSequence() {
+  return stats.recorded;
+}
+
+/**
+ * Write all pending increments as a single batch
+ * @returns {Promise<number>} Resolves when the in-flight flush completes, with
+ *   the number of recorded scans known to be in the database
+ */
+export function flushScanCounts() {
+  if (flushing) {
+    return flushing;
+  }
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (pending.size === 0) {
+    return Promise.resolve(persistedThrough);
+  }
+
+  const batch = pending;
+  pending = new Map();
+  // Failed batches go back into pending, so once this one is written every
+  // scan recorded up to here is in the database
+  const through = stats.recorded;
+
+  // Sorted so concurrent flushes from several instances lock rows in the same order
+  const slugs = [...batch.keys()].sort();
+  const increments = slugs.map(slug => batch.get(slug));
+
+  flushing = (async () => {
+    try {
+      await writeScanCounts(slugs, increments);
+      persistedThrough = through;
+      stats.flushes++;
+      stats.flushed += increments.reduce((sum, n) => sum + n, 0);
+    } catch (error) {
+      console.error('Error flushing scan counts:', error);
+      stats.failedFlushes++;
+      // Put the batch back so the next flush retries it
+      for (const [slug, count] of batch) {
+        pending.set(slug, (pending.get(slug) || 0) + count);
+      }
+    } finally {
+      flushing = null;
+      if (pending.size > 0) {
+        scheduleFlush();
+      }
+    }
+    return persistedThrough;
+  })();
+
+  return flushing;
+}
+
+/**
+ * Flush until the first `sequence` recorded scans are in the database. A
+ * flush already in flight may have started before some of them, so it is
+ * awaited and followed by another until the target is reached.
+ * @param {number} [sequence] - Target from getScanSequence (default: every
+ *   scan recorded, including ones that arrive while flushing)
+ * @returns {Promise<boolean>} false if a flush failed before the target
+ */
+export async function flushScanCountsThrough(sequence) {
+  while (persistedThrough < (sequence ?? stats.recorded)) {
+    const before = persistedThrough;
+    const started = !flushing;
+    await flushScanCounts();
+    // A failed batch goes back into pending; give up once a flush of our own fails
+    if (started && persistedThrough === before) {
+      return false;
+    }
+  }
+  return true;
+}
+
+async function writeScanCounts(slugs, increments) {
+  if (supabaseAdmin) {
+    const { error } = await supabaseAdmin.rpc('increment_scan_counts', {
+      qr_slugs: slugs,
+      increments
+    });
+    if (error) throw error;
+    return;
+  }
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    await mongoStore.incrementScanCounts(slugs, increments);
+  }
+}
+
+function scheduleFlush() {
+  if (timer || flushing) {
+    return;
+  }
+  timer = setTimeout(() => {
+    timer = null;
+    flushScanCounts();
+  }, SCAN_FLUSH_INTERVAL_MS);
+  timer.unref?.();
+}
+
+export function getScanCounterStats() {
+  let pendingScans = 0;
+  for (const count of pending.values()) {
+    pendingScans += count;
+  }
+  return {
+    ...stats,
+    pendingSlugs: pending.size,
+    pendingScans,
+    flushIntervalMs: SCAN_FLUSH_INTERVAL_MS,
+    maxPendingSlugs: SCAN_FLUSH_MAX_SLUGS
+  };
+}
+
+onShutdown('scan-counter', () => flushScanCountsThrough());
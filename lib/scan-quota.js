@@ -0,0 +1,196 @@
+// Monthly scan quota
+// Tracks scans per QR owner in sharded in-memory counters so the scan path
+// can enforce PLAN_LIMITS.maxScansPerMonth without a database round trip.
+// Each counter is the owner's user_scan_usage total from the last
+// reconciliation plus the scans this instance has seen since; one shard is
+// reconciled per tick so the refresh work stays small and spread out. Usage
+// totals live in Supabase or MongoDB; with neither (demo mode) the quota is
+// counted per process only.
+
+import { supabaseAdmin } from './supabase';
+import { getMongoStore, isMongoConfigured } from './mongo-fallback';
+import { checkPlanLimit } from './user-plans';
+import { flushScanCountsThrough, getScanSequence } from './scan-counter';
+
+const SHARD_COUNT = 16;
+const QUOTA_RECONCILE_INTERVAL_MS = parseInt(process.env.QUOTA_RECONCILE_INTERVAL_MS || '30000');
+const RECONCILE_CHUNK_SIZE = 500;
+
+const shards = Array.from({ length: SHARD_COUNT }, () => new Map());
+let nextShard = 0;
+let timer = null;
+
+const stats = {
+  checks: 0,
+  softLimited: 0,
+  hardLimited: 0,
+  reconciles: 0,
+  failedReconciles: 0
+};
+
+/**
+ * Current month key in UTC, e.g. '2026-10-01'
+ */
+export function getMonthKey(date = new Date()) {
+  return `${date.getUTCFullYear()}-${String(date.getUTCMonth() + 1).padStart(2, '0')}-01`;
+}
+
+function shardFor(ownerId) {
+  let hash = 0;
+  for (let i = 0; i < ownerId.length; i++) {
+    hash = (hash * 31 + ownerId.charCodeAt(i)) | 0;
+  }
+  return shards[Math.abs(hash) % SHARD_COUNT];
+}
+
+function getCounter(ownerId) {
+  const shard = shardFor(ownerId);
+  const month = getMonthKey();
+  let counter = shard.get(ownerId);
+  if (!counter || counter.month !== month) {
+    // New owner or month rollover: start from zero until reconciled
+    counter = { month, base: 0, local: 0, reconciled: false };
+    shard.set(ownerId, counter);
+    ensureTimer();
+  }
+  return counter;
+}
+
+/**
+ * Scans counted for an owner in the current month
+ * @param {string} ownerId - QR owner's user ID
+ * @returns {number}
+ */
+export function getMonthlyScanCount(ownerId) {
+  const counter = getCounter(ownerId);
+  return counter.base + counter.local;
+}
+
+/**
+ * Check whether an owner's QR codes may be scanned again this month
+ * @param {string} ownerId - QR owner's user ID
+ * @returns {Promise<Object>} { allowed, softLimitReached, reason? }
+ */
+export async function checkScanQuota(ownerId) {
+  if (!ownerId) {
+    return { allowed: true, softLimitReached: false };
+  }
+  stats.checks++;
+  const result = await checkPlanLimit(ownerId, 'scan', { currentScanCount: getMonthlyScanCount(ownerId) });
+  if (!result.allowed) {
+    stats.hardLimited++;
+  } else if (result.softLimitReached) {
+    stats.softLimited++;
+  }
+  return result;
+}
+
+/**
+ * Count one scan against an owner's monthly quota
+ * @param {string} ownerId - QR owner's user ID
+ */
+export function recordQuotaScan(ownerId) {
+  if (ownerId) {
+    getCounter(ownerId).local++;
+  }
+}
+
+// user_scan_usage rows for some owners
+async function readScanUsage(month, ownerIds) {
+  if (supabaseAdmin) {
+    const { data, error } = await supabaseAdmin
+      .from('user_scan_usage')
+      .select('user_id, scans')
+      .eq('month', month)
+      .in('user_id', ownerIds);
+    if (error) throw error;
+    return data || [];
+  }
+  const mongoStore = await getMongoStore();
+  return mongoStore ? mongoStore.getScanUsage(month, ownerIds) : [];
+}
+
+/**
+ * Refresh one shard's counters from user_scan_usage
+ * @param {Map} shard - Shard to reconcile
+ */
+async function reconcileShard(shard) {
+  if (!isUsageStored() || shard.size === 0) {
+    return;
+  }
+  const month = getMonthKey();
+  for (const [ownerId, counter] of shard) {
+    if (counter.month !== month) shard.delete(ownerId);
+  }
+  const ownerIds = [...shard.keys()];
+  // recordQuotaScan and recordScan run together, so the first `sequence`
+  // scans are the ones counted in local so far. Once they are in the
+  // database they move from local to base; later ones stay in local (the
+  // last flush may carry a few of those too, counted twice until next pass).
+  const sequence = getScanSequence();
+  const flushedLocal = new Map([...shard.values()].map(counter => [counter, counter.local]));
+
+  if (!(await flushScanCountsThrough(sequence))) {
+    throw new Error('Scan counts could not be flushed; quota left unreconciled');
+  }
+
+  for (let i = 0; i < ownerIds.length; i += RECONCILE_CHUNK_SIZE) {
+    const chunk = ownerIds.slice(i, i + RECONCILE_CHUNK_SIZE);
+    const rows = await readScanUsage(month, chunk);
+
+    const totals = new Map(rows.map(row => [row.user_id, Number(row.scans)]));
+    for (const ownerId of chunk) {
+      const counter = shard.get(ownerId);
+      if (counter && counter.month === month) {
+        counter.base = totals.get(ownerId) || 0;
+        counter.local = Math.max(counter.local - (flushedLocal.get(counter) || 0), 0);
+        counter.reconciled = true;
+      }
+    }
+  }
+}
+
+/**
+ * Reconcile the next shard (called on an interval)
+ */
+export async function reconcileScanQuotas() {
+  const shard = shards[nextShard];
+  nextShard = (nextShard + 1) % SHARD_COUNT;
+  try {
+    await reconcileShard(shard);
+    stats.reconciles++;
+  } catch (error) {
+    console.error('Error reconciling scan quotas:', error);
+    stats.failedReconciles++;
+  }
+}
+
+function isUsageStored() {
+  return !!supabaseAdmin || isMongoConfigured;
+}
+
+function ensureTimer() {
+  if (timer || !isUsageStored()) {
+    return;
+  }
+  timer = setInterval(reconcileScanQuotas, Math.max(Math.floor(QUOTA_RECONCILE_INTERVAL_MS / SHARD_COUNT), 100));
+  timer.unref?.();
+}
+
+export function getScanQuotaStats() {
+  let owners = 0;
+  let unreconciled = 0;
+  for (const shard of shards) {
+    owners += shard.size;
+    for (const counter of shard.values()) {
+      if (!counter.reconciled) unreconciled++;
+    }
+  }
+  return {
+    ...stats,
+    owners,
+    unreconciled,
+    shards: SHARD_COUNT,
+    reconcileIntervalMs: QUOTA_RECONCILE_INTERVAL_MS
+  };
+}
@@ -0,0 +1,58 @@
+// Graceful shutdown hooks
+// Write-behind buffers register a flush here so pending data reaches the
+// database before the process exits. Next.js only leaves SIGTERM/SIGINT to
+// the application when NEXT_MANUAL_SIG_HANDLE=true is set; without it these
+// handlers still run first but the server may exit before they finish.
+
+const SHUTDOWN_TIMEOUT_MS = parseInt(process.env.SHUTDOWN_TIMEOUT_MS || '10000');
+
+const hooks = new Map();
+let installed = false;
+let running = null;
+
+/**
+ * Register a function to run before the process exits
+ * @param {string} name - Hook name (re-registering replaces the previous hook)
+ * @param {Function} fn - Async function to run
+ */
+export function onShutdown(name, fn) {
+  hooks.set(name, fn);
+  installHandlers();
+}
+
+/**
+ * Run all registered hooks once, bounded by SHUTDOWN_TIMEOUT_MS
+ * @returns {Promise<void>}
+ */
+export function runShutdownHooks() {
+  if (!running) {
+    const all = Promise.allSettled([...hooks.entries()].map(async ([name, fn]) => {
+      try {
+        await fn();
+      } catch (error) {
+        console.error(`Shutdown hook "${name}" failed:`, error);
+      }
+    }));
+    const timeout = new Promise(resolve => setTimeout(resolve, SHUTDOWN_TIMEOUT_MS).unref());
+    running = Promise.race([all, timeout]);
+  }
+  return running;
+}
+
+function installHandlers() {
+  if (installed || typeof process === 'undefined' || typeof process.once !== 'function') {
+    return;
+  }
+  installed = true;
+
+  process.once('beforeExit', () => {
+    runShutdownHooks();
+  });
+
+  for (const signal of ['SIGTERM', 'SIGINT']) {
+    process.prependOnceListener(signal, async () => {
+      await runShutdownHooks();
+      process.exit(0);
+    });
+  }
+}
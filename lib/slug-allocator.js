@@ -0,0 +1,73 @@
+// Slug allocation
+// Leases counter blocks from the active storage backend and turns them into
+// slugs (see slug-sequence.js). Uniqueness comes from the counter, so
+// creates never need to check for an existing slug first.
+//
+// Leasing needs SUPABASE_SERVICE_ROLE_KEY (lease_slug_block is not granted to
+// anon). Deployments without it fall back to fully random slugs of the same
+// length, as before the counter existed; the unique index on qr_codes.slug
+// rejects the (vanishingly unlikely) duplicate.
+
+import { supabaseAdmin, isSupabaseConfigured } from './supabase';
+import { getMongoStore } from './mongo-fallback';
+import { SlugAllocator, SLUG_LENGTH, randomChars } from './slug-sequence';
+
+const SLUG_BLOCK_SIZE = parseInt(process.env.SLUG_BLOCK_SIZE || '1000');
+
+// Demo mode without MongoDB keeps codes in memory, so a local counter is enough
+let memoryCounter = 0;
+
+async function leaseBlock(size) {
+  if (isSupabaseConfigured) {
+    const { data, error } = await supabaseAdmin.rpc('lease_slug_block', { block_size: size });
+    if (error) throw error;
+    return Number(data);
+  }
+
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    return mongoStore.leaseSlugBlock(size);
+  }
+
+  const start = memoryCounter;
+  memoryCounter += size;
+  return start;
+}
+
+const allocator = new SlugAllocator({ leaseBlock, blockSize: SLUG_BLOCK_SIZE });
+
+let warnedRandomSlugs = false;
+
+function canLease() {
+  if (!isSupabaseConfigured || supabaseAdmin) return true;
+  if (!warnedRandomSlugs) {
+    console.warn('SUPABASE_SERVICE_ROLE_KEY is not set; allocating random slugs instead of leasing counter blocks');
+    warnedRandomSlugs = true;
+  }
+  return false;
+}
+
+/**
+ * Allocate one unique slug
+ * @returns {Promise<string>}
+ */
+export async function allocateSlug() {
+  const [slug] = await allocateSlugs(1);
+  return slug;
+}
+
+/**
+ * Allocate unique slugs for a batch
+ * @param {number} count - Number of slugs
+ * @returns {Promise<Array<string>>}
+ */
+export async function allocateSlugs(count) {
+  if (!canLease()) {
+    return Array.from({ length: count }, () => randomChars(SLUG_LENGTH));
+  }
+  return allocator.allocate(count);
+}
+
+export function getSlugAllocatorStats() {
+  return allocator.stats();
+}
@@ -0,0 +1,193 @@
+// Slug sequence
+// Slugs start with a global counter value, so they are unique by
+// construction. Each counter value is passed through a fixed 40-bit Feistel
+// permutation (so consecutive codes do not get neighbouring slugs) and
+// written as 7 base62 characters. The permutation is public, so those 7
+// characters alone could be enumerated; every slug therefore ends with 4
+// random base62 characters that a guesser has to hit as well. Counter values
+// are handed out in leased blocks, so most allocations never leave the
+// process. The lease backends live in slug-allocator.js.
+
+import { randomBytes } from 'crypto';
+
+const ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+
+// Counter part, random part, and the whole slug
+export const SEQUENCE_LENGTH = 7;
+export const RANDOM_LENGTH = 4;
+export const SLUG_LENGTH = SEQUENCE_LENGTH + RANDOM_LENGTH;
+const HALF_BITS = 20;
+const HALF_SIZE = 2 ** HALF_BITS;
+const HALF_MASK = HALF_SIZE - 1;
+
+// 2^40 counter values; 62^7 > 2^40, so every value fits in SEQUENCE_LENGTH chars
+export const SLUG_SPACE = HALF_SIZE * HALF_SIZE;
+
+// Upper bound for one lease (matches lease_slug_block in the migrations)
+export const MAX_LEASE_SIZE = 100000;
+
+// Never change these: a different permutation could reissue existing slugs
+const ROUND_KEYS = [0x3c6ef, 0xa54ff, 0x510e5, 0x9b056];
+
+function round(half, key) {
+  return (Math.imul(half ^ key, 0x9e3779b1) >>> 12) & HALF_MASK;
+}
+
+/**
+ * Permute a counter value within [0, SLUG_SPACE) (a bijection)
+ * @param {number} value - Counter value
+ * @returns {number}
+ */
+export function permute(value) {
+  let left = Math.floor(value / HALF_SIZE);
+  let right = value % HALF_SIZE;
+  for (const key of ROUND_KEYS) {
+    [left, right] = [right, left ^ round(right, key)];
+  }
+  return left * HALF_SIZE + right;
+}
+
+/**
+ * Inverse of permute
+ */
+export function unpermute(value) {
+  let left = Math.floor(value / HALF_SIZE);
+  let right = value % HALF_SIZE;
+  for (let i = ROUND_KEYS.length - 1; i >= 0; i--) {
+    [left, right] = [right ^ round(left, ROUND_KEYS[i]), left];
+  }
+  return left * HALF_SIZE + right;
+}
+
+/**
+ * Random base62 characters from crypto.randomBytes
+ * @param {number} length - Number of characters
+ * @returns {string}
+ */
+export function randomChars(length) {
+  let chars = '';
+  while (chars.length < length) {
+    for (const byte of randomBytes(length * 2)) {
+      // 248 = 4 * 62; higher bytes would skew the distribution
+      if (byte < 248 && chars.length < length) chars += ALPHABET[byte % 62];
+    }
+  }
+  return chars;
+}
+
+/**
+ * Turn a counter value into a slug
+ * @param {number} value - Counter value in [0, SLUG_SPACE)
+ * @param {string} [suffix] - RANDOM_LENGTH random characters (drawn here by default)
+ * @returns {string} 11-character base62 slug (7 from the counter, 4 random)
+ */
+export function encodeSlug(value, suffix = randomChars(RANDOM_LENGTH)) {
+  if (!Number.isInteger(value) || value < 0 || value >= SLUG_SPACE) {
+    throw new RangeError(`Slug counter out of range: ${value}`);
+  }
+  let n = permute(value);
+  let slug = '';
+  for (let i = 0; i < SEQUENCE_LENGTH; i++) {
+    slug = ALPHABET[n % 62] + slug;
+    n = Math.floor(n / 62);
+  }
+  return slug + suffix;
+}
+
+/**
+ * Recover the counter value of a slug (null for legacy or foreign slugs)
+ * Slugs issued before the random part was added are 7 characters long and
+ * decode the same way.
+ */
+export function decodeSlug(slug) {
+  if (typeof slug !== 'string' || (slug.length !== SLUG_LENGTH && slug.length !== SEQUENCE_LENGTH)) {
+    return null;
+  }
+  if ([...slug.slice(SEQUENCE_LENGTH)].some(ch => !ALPHABET.includes(ch))) {
+    return null;
+  }
+  let n = 0;
+  for (const ch of slug.slice(0, SEQUENCE_LENGTH)) {
+    const digit = ALPHABET.indexOf(ch);
+    if (digit < 0) return null;
+    n = n * 62 + digit;
+  }
+  return n < SLUG_SPACE ? unpermute(n) : null;
+}
+
+/**
+ * Hands out slugs from leased counter blocks
+ * `leaseBlock(size)` must atomically reserve `size` counter values and
+ * resolve to the first one. One lease is in flight at a time; concurrent
+ * callers wait for it and then share the block.
+ */
+export class SlugAllocator {
+  constructor({ leaseBlock, blockSize = 1000 }) {
+    this.leaseBlock = leaseBlock;
+    this.blockSize = blockSize;
+    this.next = 0;
+    this.end = 0;
+    this.leasing = null;
+    this.leases = 0;
+    this.leasedValues = 0;
+    this.allocated = 0;
+    this.leaseWaitMs = 0;
+  }
+
+  /**
+   * Allocate unique slugs
+   * @param {number} count - Number of slugs
+   * @returns {Promise<Array<string>>}
+   */
+  async allocate(count = 1) {
+    const slugs = [];
+    while (slugs.length < count) {
+      if (this.next >= this.end) {
+        await this.refill(count - slugs.length);
+        continue;
+      }
+      const take = Math.min(count - slugs.length, this.end - this.next);
+      // One randomBytes call for the whole run
+      const random = randomChars(take * RANDOM_LENGTH);
+      for (let i = 0; i < take; i++) {
+        slugs.push(encodeSlug(this.next++, random.slice(i * RANDOM_LENGTH, (i + 1) * RANDOM_LENGTH)));
+      }
+    }
+    this.allocated += count;
+    return slugs;
+  }
+
+  refill(needed) {
+    if (!this.leasing) {
+      // Large batches lease what they need in as few round trips as possible
+      const size = Math.min(Math.max(needed, this.blockSize), MAX_LEASE_SIZE);
+      const started = Date.now();
+      this.leasing = Promise.resolve(this.leaseBlock(size))
+        .then((start) => {
+          if (!Number.isInteger(start) || start < 0 || start + size > SLUG_SPACE) {
+            throw new RangeError(`Invalid slug block lease: ${start}`);
+          }
+          this.next = start;
+          this.end = start + size;
+          this.leases++;
+          this.leasedValues += size;
+        })
+        .finally(() => {
+          this.leaseWaitMs += Date.now() - started;
+          this.leasing = null;
+        });
+    }
+    return this.leasing;
+  }
+
+  stats() {
+    return {
+      allocated: this.allocated,
+      leases: this.leases,
+      leasedValues: this.leasedValues,
+      remainingInBlock: Math.max(this.end - this.next, 0),
+      blockSize: this.blockSize,
+      leaseWaitMs: this.leaseWaitMs
+    };
+  }
+}
@@ -0,0 +1,198 @@
+// Stripe catalog for fiat QR codes
+// Each fiat QR code gets a Stripe Product and Price when it is created or
+// its amount, currency or product name changes, and their ids are kept on
+// the row (qr_codes.stripe_catalog). Checkout then only references the
+// Price, and every Stripe write carries an idempotency key so retries and
+// double taps never create duplicates. A session is reused for the same
+// price and client key within one reuse window (see getCheckoutSession).
+
+import { createHash } from 'crypto';
+import { getStripe } from './stripe';
+import { LruCache } from './lru-cache';
+import { isSupabaseConfigured, supabaseAdmin } from './supabase';
+import { getFallbackStore } from './mongo-fallback';
+import { invalidateQr } from './qr-cache';
+import { QR_TYPES } from './qr-utils';
+
+// Stripe requires expires_at to be 30 minutes to 24 hours out
+const CHECKOUT_SESSION_TTL_S = parseInt(process.env.CHECKOUT_SESSION_TTL_S || '1800');
+// Stop handing out a session this long before it expires
+const CHECKOUT_REUSE_MARGIN_MS = 5 * 60 * 1000;
+// Requests with the same client key share a session within one window. A
+// session expires one TTL after its window ends, which must stay within
+// Stripe's 24 hours.
+const CHECKOUT_REUSE_WINDOW_MS = Math.max(
+  Math.min(CHECKOUT_SESSION_TTL_S * 1000 - CHECKOUT_REUSE_MARGIN_MS, (86400 - CHECKOUT_SESSION_TTL_S) * 1000),
+  60 * 1000
+);
+
+const sessions = new LruCache({ maxEntries: 10000, ttlMs: CHECKOUT_SESSION_TTL_S * 1000 });
+
+const stats = {
+  provisioned: 0,
+  provisionFailures: 0,
+  sessionsCreated: 0,
+  sessionsReused: 0
+};
+
+/**
+ * The Price a fiat QR code's config calls for
+ * @param {Object} qr - QR code row
+ * @returns {Object|null} { unitAmount, currency, name }, or null if not a priced fiat code
+ */
+export function getFiatPriceSpec(qr) {
+  if (qr?.type !== QR_TYPES.FIAT) {
+    return null;
+  }
+  const config = qr.destination_config || {};
+  const unitAmount = Math.round(Number(config.amount) * 100); // Convert to cents
+  if (!Number.isFinite(unitAmount) || unitAmount <= 0) {
+    return null;
+  }
+  return {
+    unitAmount,
+    currency: String(config.currency || 'usd').toLowerCase(),
+    name: config.productName || qr.name || 'NovaTok Payment'
+  };
+}
+
+function matchesSpec(catalog, spec) {
+  return !!catalog?.priceId &&
+    catalog.unitAmount === spec.unitAmount &&
+    catalog.currency === spec.currency &&
+    catalog.name === spec.name;
+}
+
+async function saveCatalog(qr, catalog) {
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const { error } = await supabaseAdmin
+      .from('qr_codes')
+      .update({ stripe_catalog: catalog })
+      .eq('id', qr.id);
+    if (error) throw error;
+    invalidateQr({ id: qr.id, slug: qr.slug });
+  } else {
+    const store = await getFallbackStore();
+    await store.updateQr(qr.id, { stripe_catalog: catalog });
+  }
+  qr.stripe_catalog = catalog;
+}
+
+/**
+ * Make sure a fiat QR code has a Stripe Product and a Price matching its
+ * config, creating or updating them as needed and saving the ids on the row
+ * @param {Object} qr - QR code row
+ * @returns {Promise<Object|null>} { productId, priceId, unitAmount, currency, name }, or null if nothing to price
+ */
+export async function ensureFiatPrice(qr) {
+  const spec = getFiatPriceSpec(qr);
+  const stripe = await getStripe();
+  if (!spec || !stripe) {
+    return null;
+  }
+  const current = qr.stripe_catalog;
+  if (matchesSpec(current, spec)) {
+    return current;
+  }
+
+  let productId = current?.productId;
+  if (!productId) {
+    const product = await stripe.products.create({
+      name: spec.name,
+      metadata: { qr_id: qr.id, qr_slug: qr.slug }
+    }, { idempotencyKey: `qr-product-${qr.id}` });
+    productId = product.id;
+  } else if (current.name !== spec.name) {
+    await stripe.products.update(productId, { name: spec.name });
+  }
+
+  // Prices are immutable, so a new amount or currency means a new Price
+  let priceId = current?.priceId;
+  if (!current || current.unitAmount !== spec.unitAmount || current.currency !== spec.currency) {
+    const price = await stripe.prices.create({
+      product: productId,
+      unit_amount: spec.unitAmount,
+      currency: spec.currency,
+      metadata: { qr_id: qr.id }
+    }, { idempotencyKey: `qr-price-${qr.id}-${spec.unitAmount}-${spec.currency}` });
+    priceId = price.id;
+  }
+
+  const catalog = { productId, priceId, ...spec };
+  await saveCatalog(qr, catalog);
+  stats.provisioned++;
+  return catalog;
+}
+
+/**
+ * Provision a fiat QR code's Price after it was created or updated, without
+ * failing the request (checkout provisions it later if this did not work)
+ * @param {Object} qr - QR code row
+ */
+export async function provisionFiatPrice(qr) {
+  try {
+    return await ensureFiatPrice(qr);
+  } catch (error) {
+    stats.provisionFailures++;
+    console.error('Stripe price provisioning error:', error.message);
+    return null;
+  }
+}
+
+/**
+ * Create a Checkout Session, or reuse the one already created for the same
+ * line item and client key while it is still open
+ * @param {Object} options
+ * @param {Object} options.lineItem - Stripe line item ({ price } or { price_data })
+ * @param {string} options.clientKey - Idempotency key from the client (one per page load); optional
+ * @param {string} options.successUrl - Redirect after payment
+ * @param {string} options.cancelUrl - Redirect on cancel
+ * @param {Object} options.metadata - Session metadata
+ * @returns {Promise<Object>} { id, url, expiresAt, reused }
+ */
+export async function getCheckoutSession({ lineItem, clientKey, successUrl, cancelUrl, metadata }) {
+  const stripe = await getStripe();
+  const now = Date.now();
+  // Stripe keeps an idempotency key for 24 hours, far longer than a session
+  // lives, so the key names the reuse window: a later window gets a new key
+  // and a new session instead of Stripe replaying an expired one. Stripe
+  // also rejects a reused key with different parameters, so they are part of
+  // it, and expires_at is fixed per window (the window's end plus the TTL)
+  // so a retry sends the same value.
+  const reuseWindow = Math.floor(now / CHECKOUT_REUSE_WINDOW_MS);
+  const windowEnd = (reuseWindow + 1) * CHECKOUT_REUSE_WINDOW_MS;
+  const key = clientKey
+    ? 'checkout-' + createHash('sha256')
+      .update(JSON.stringify([lineItem, successUrl, cancelUrl, metadata, clientKey, reuseWindow]))
+      .digest('base64url')
+    : null;
+  const cached = key && sessions.get(key);
+  if (cached && cached.expiresAt - CHECKOUT_REUSE_MARGIN_MS > now) {
+    stats.sessionsReused++;
+    return { ...cached, reused: true };
+  }
+
+  const expiresAt = key
+    ? Math.min(Math.floor(windowEnd / 1000) + CHECKOUT_SESSION_TTL_S, Math.floor(now / 1000) + 86400)
+    : Math.floor(now / 1000) + CHECKOUT_SESSION_TTL_S;
+  const session = await stripe.checkout.sessions.create({
+    payment_method_types: ['card'],
+    line_items: [{ ...lineItem, quantity: 1 }],
+    mode: 'payment',
+    success_url: successUrl,
+    cancel_url: cancelUrl,
+    expires_at: expiresAt,
+    metadata
+  }, key ? { idempotencyKey: key } : {});
+  stats.sessionsCreated++;
+
+  const entry = { id: session.id, url: session.url, expiresAt: (session.expires_at || expiresAt) * 1000 };
+  if (key) {
+    sessions.set(key, entry, windowEnd - Date.now());
+  }
+  return { ...entry, reused: false };
+}
+
+export function getStripeCatalogStats() {
+  return { ...stats, sessions: sessions.stats() };
+}
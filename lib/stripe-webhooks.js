@@ -0,0 +1,482 @@
+// Stripe webhook processing
+// POST /api/stripe/webhook verifies the signature, journals the event in
+// stripe_webhook_events (keyed by event id, so Stripe's retries are spotted
+// as duplicates) and answers 200 right away. A background worker drains the
+// queue in batches: events are replayed in creation order and folded into
+// one plan update per customer, customers are mapped to users with one
+// query, and updateUserPlan runs with bounded concurrency. Subscription
+// updates carry their event time, and user_plans.stripe_event_at keeps the
+// newest one applied, so a late older event never overwrites a newer state
+// even on another instance or after a restart. Events that could not be
+// applied (a write failed, or the customer is not linked to a user yet) stay
+// unprocessed in the journal and are retried by a sweep, with exponential
+// backoff per event (next_attempt_at). The sweep starts with the process, so
+// events left over by a restart are not waiting on the next webhook.
+
+import { getStripe } from './stripe';
+import { isSupabaseConfigured, supabaseAdmin } from './supabase';
+import { getMongoStore } from './mongo-fallback';
+import { LruCache } from './lru-cache';
+import { onShutdown } from './shutdown';
+import { counter } from './metrics';
+import { PLANS, updateUserPlan, getUserIdsByStripeCustomer } from './user-plans';
+
+const STRIPE_WEBHOOK_SECRET = process.env.STRIPE_WEBHOOK_SECRET;
+export const isWebhookConfigured = !!STRIPE_WEBHOOK_SECRET;
+
+const WEBHOOK_FLUSH_INTERVAL_MS = parseInt(process.env.WEBHOOK_FLUSH_INTERVAL_MS || '250');
+const WEBHOOK_BATCH_SIZE = parseInt(process.env.WEBHOOK_BATCH_SIZE || '200');
+const WEBHOOK_APPLY_CONCURRENCY = parseInt(process.env.WEBHOOK_APPLY_CONCURRENCY || '10');
+const WEBHOOK_QUEUE_MAX = parseInt(process.env.WEBHOOK_QUEUE_MAX || '10000');
+// Unprocessed journal entries are first retried this long after arriving,
+// then after twice as long each time, up to the maximum
+const WEBHOOK_RETRY_AFTER_MS = parseInt(process.env.WEBHOOK_RETRY_AFTER_MS || '60000');
+const WEBHOOK_RETRY_MAX_BACKOFF_MS = parseInt(process.env.WEBHOOK_RETRY_MAX_BACKOFF_MS || '3600000');
+// Stripe itself stops retrying after three days
+const WEBHOOK_RETRY_WINDOW_MS = 3 * 24 * 60 * 60 * 1000;
+
+// Price ids for the paid plans; otherwise the plan comes from subscription
+// or price metadata (`plan`) or the price's lookup_key
+const PRICE_PLANS = {
+  [process.env.STRIPE_PRO_PRICE_ID || '']: PLANS.PRO,
+  [process.env.STRIPE_BUSINESS_PRICE_ID || '']: PLANS.BUSINESS
+};
+
+// Subscription statuses that keep the paid plan
+const LIVE_STATUSES = ['active', 'trialing', 'past_due'];
+
+export const HANDLED_EVENT_TYPES = [
+  'checkout.session.completed',
+  'customer.subscription.created',
+  'customer.subscription.updated',
+  'customer.subscription.deleted'
+];
+
+const eventsTotal = counter('stripe_webhook_events_total', 'Stripe webhook events by outcome', ['type', 'outcome']);
+
+// Ids seen by this process, so retries skip the journal write
+const seenEvents = new LruCache({ maxEntries: 50000, ttlMs: WEBHOOK_RETRY_WINDOW_MS });
+// Newest subscription event applied per customer by this process; older ones
+// are skipped without a write (user_plans.stripe_event_at is the real guard)
+const appliedUpTo = new LruCache({ maxEntries: 100000, ttlMs: WEBHOOK_RETRY_WINDOW_MS });
+// Journal for demo mode without a database
+const memoryJournal = new Map();
+// Failed attempts so far for events requeued by the sweep
+const attemptsById = new Map();
+
+let queue = [];
+const queuedIds = new Set();
+let flushing = null;
+let timer = null;
+let sweeper = null;
+
+const stats = {
+  received: 0,
+  duplicates: 0,
+  ignored: 0,
+  applied: 0,
+  merged: 0,
+  superseded: 0,
+  deferred: 0,
+  flushes: 0,
+  failedFlushes: 0
+};
+
+/**
+ * Verify a webhook's signature and parse the event
+ * @param {string} payload - Raw request body
+ * @param {string} signature - Stripe-Signature header
+ * @returns {Promise<Object>} Stripe event (throws if the signature does not match)
+ */
+export async function verifyWebhookEvent(payload, signature) {
+  const stripe = await getStripe();
+  return stripe.webhooks.constructEvent(payload, signature || '', STRIPE_WEBHOOK_SECRET);
+}
+
+// =============================================
+// Journal (stripe_webhook_events)
+// =============================================
+
+async function journalInsert(row) {
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const { data, error } = await supabaseAdmin
+      .from('stripe_webhook_events')
+      .upsert(row, { onConflict: 'id', ignoreDuplicates: true })
+      .select('id');
+    if (error) throw error;
+    return (data || []).length > 0;
+  }
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    return mongoStore.insertWebhookEvent(row);
+  }
+  if (memoryJournal.has(row.id)) {
+    return false;
+  }
+  memoryJournal.set(row.id, { ...row, processed_at: null });
+  return true;
+}
+
+// Delay before retrying an event that failed `attempts` times
+function retryDelay(attempts) {
+  return Math.min(WEBHOOK_RETRY_AFTER_MS * 2 ** Math.max(attempts - 1, 0), WEBHOOK_RETRY_MAX_BACKOFF_MS);
+}
+
+async function journalUpdate(ids, changes) {
+  if (ids.length === 0) {
+    return;
+  }
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const { error } = await supabaseAdmin
+      .from('stripe_webhook_events')
+      .update(changes)
+      .in('id', ids);
+    if (error) throw error;
+    return;
+  }
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    await mongoStore.updateWebhookEvents(ids, changes);
+    return;
+  }
+  ids.forEach(id => Object.assign(memoryJournal.get(id) || {}, changes));
+}
+
+// Unprocessed events that are due, soonest due first, so events backing off
+// do not hold up the ones behind them
+async function journalPending(limit) {
+  const now = Date.now();
+  const after = new Date(now - WEBHOOK_RETRY_WINDOW_MS).toISOString();
+  const due = new Date(now).toISOString();
+  if (isSupabaseConfigured && supabaseAdmin) {
+    const { data, error } = await supabaseAdmin
+      .from('stripe_webhook_events')
+      .select('id, payload, attempts')
+      .is('processed_at', null)
+      .lte('next_attempt_at', due)
+      .gt('received_at', after)
+      .order('next_attempt_at', { ascending: true })
+      .limit(limit);
+    if (error) throw error;
+    return data || [];
+  }
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    return mongoStore.listPendingWebhookEvents(after, due, limit);
+  }
+  return [...memoryJournal.values()]
+    .filter(row => !row.processed_at && row.received_at > after && row.next_attempt_at <= due)
+    .sort((a, b) => (a.next_attempt_at < b.next_attempt_at ? -1 : a.next_attempt_at > b.next_attempt_at ? 1 : 0))
+    .slice(0, limit);
+}
+
+// =============================================
+// Queue
+// =============================================
+
+/**
+ * Journal a verified event and queue it for the worker
+ * @param {Object} event - Stripe event
+ * @returns {Promise<Object>} { status: 'queued' | 'duplicate' | 'ignored' | 'full' }
+ */
+export async function enqueueWebhookEvent(event) {
+  stats.received++;
+  if (!HANDLED_EVENT_TYPES.includes(event.type)) {
+    stats.ignored++;
+    eventsTotal.inc({ type: event.type, outcome: 'ignored' });
+    return { status: 'ignored' };
+  }
+  if (seenEvents.get(event.id) || queuedIds.has(event.id)) {
+    stats.duplicates++;
+    eventsTotal.inc({ type: event.type, outcome: 'duplicate' });
+    return { status: 'duplicate' };
+  }
+  if (queue.length >= WEBHOOK_QUEUE_MAX) {
+    // Not journaled: Stripe retries it once the 503 comes back
+    return { status: 'full' };
+  }
+
+  const receivedAt = Date.now();
+  const isNew = await journalInsert({
+    id: event.id,
+    type: event.type,
+    customer_id: getCustomerId(event),
+    event_created: new Date(event.created * 1000).toISOString(),
+    received_at: new Date(receivedAt).toISOString(),
+    // The worker applies it right away; the sweep only steps in if that fails
+    attempts: 0,
+    next_attempt_at: new Date(receivedAt + WEBHOOK_RETRY_AFTER_MS).toISOString(),
+    payload: event
+  });
+  seenEvents.set(event.id, true);
+  if (!isNew) {
+    stats.duplicates++;
+    eventsTotal.inc({ type: event.type, outcome: 'duplicate' });
+    return { status: 'duplicate' };
+  }
+
+  push(event);
+  startSweeper();
+  return { status: 'queued' };
+}
+
+function push(event) {
+  queue.push(event);
+  queuedIds.add(event.id);
+  if (queue.length >= WEBHOOK_BATCH_SIZE) {
+    flushWebhookEvents();
+  } else {
+    scheduleFlush();
+  }
+}
+
+function getCustomerId(event) {
+  const customer = event.data?.object?.customer;
+  return typeof customer === 'string' ? customer : customer?.id || null;
+}
+
+/**
+ * The plan fields an event sets, or null if it carries no plan change
+ */
+function getPlanUpdate(event) {
+  const object = event.data.object;
+  if (event.type === 'checkout.session.completed') {
+    if (object.mode !== 'subscription') {
+      return null;
+    }
+    // Links the customer to the user who checked out
+    return {
+      userId: object.client_reference_id || object.metadata?.user_id || null,
+      updates: { stripeCustomerId: getCustomerId(event), stripeSubscriptionId: object.subscription || null }
+    };
+  }
+
+  const userId = object.metadata?.user_id || null;
+  if (event.type === 'customer.subscription.deleted' || !LIVE_STATUSES.includes(object.status)) {
+    return {
+      userId,
+      subscription: true,
+      updates: { plan: PLANS.FREE, stripeCustomerId: getCustomerId(event), stripeSubscriptionId: null, currentPeriodEnd: null }
+    };
+  }
+  const price = object.items?.data?.[0]?.price;
+  const plan = [PRICE_PLANS[price?.id], object.metadata?.plan, price?.metadata?.plan, price?.lookup_key]
+    .find(candidate => candidate === PLANS.PRO || candidate === PLANS.BUSINESS);
+  if (!plan) {
+    console.warn(`Stripe subscription ${object.id} has no recognizable plan; set STRIPE_PRO_PRICE_ID/STRIPE_BUSINESS_PRICE_ID`);
+    return null;
+  }
+  // Newer API versions only carry the period end on the subscription item;
+  // without either, the stored period end is left as it is
+  const periodEnd = object.current_period_end ?? object.items?.data?.[0]?.current_period_end;
+  return {
+    userId,
+    subscription: true,
+    updates: {
+      plan,
+      stripeCustomerId: getCustomerId(event),
+      stripeSubscriptionId: object.id,
+      ...(Number.isFinite(periodEnd) && { currentPeriodEnd: new Date(periodEnd * 1000).toISOString() })
+    }
+  };
+}
+
+/**
+ * Fold a batch into one update per customer. Events are replayed oldest
+ * first, so a late-arriving older subscription state never wins.
+ */
+function mergeByCustomer(batch) {
+  const customers = new Map();
+  const noop = [];
+  const ordered = [...batch].sort((a, b) => a.created - b.created);
+  for (const event of ordered) {
+    const customerId = getCustomerId(event);
+    const change = customerId && getPlanUpdate(event);
+    if (!change) {
+      noop.push(event.id);
+      continue;
+    }
+    if (change.subscription && event.created < (appliedUpTo.get(customerId) || 0)) {
+      stats.superseded++;
+      eventsTotal.inc({ type: event.type, outcome: 'superseded' });
+      noop.push(event.id);
+      continue;
+    }
+    let merged = customers.get(customerId);
+    if (!merged) {
+      merged = { customerId, userId: null, updates: {}, eventIds: [], events: [], subscriptionCreated: 0 };
+      customers.set(customerId, merged);
+    }
+    merged.userId = change.userId || merged.userId;
+    Object.assign(merged.updates, change.updates);
+    if (change.subscription) {
+      merged.subscriptionCreated = event.created;
+      merged.updates.stripeEventAt = new Date(event.created * 1000).toISOString();
+    }
+    if (merged.eventIds.length > 0) {
+      stats.merged++;
+    }
+    merged.eventIds.push(event.id);
+    merged.events.push(event);
+  }
+  return { customers: [...customers.values()], noop };
+}
+
+async function applyBatch(batch) {
+  const { customers, noop } = mergeByCustomer(batch);
+  const processedIds = [...noop];
+  const deferred = [];
+
+  // Customers without a user id in the event are looked up in one query
+  const unlinked = customers.filter(merged => !merged.userId).map(merged => merged.customerId);
+  const userIds = await getUserIdsByStripeCustomer(unlinked);
+
+  const ready = [];
+  for (const merged of customers) {
+    merged.userId = merged.userId || userIds.get(merged.customerId);
+    if (merged.userId) {
+      ready.push(merged);
+    } else {
+      // The checkout that links this customer may still be on its way
+      stats.deferred++;
+      deferred.push(merged);
+    }
+  }
+
+  for (let i = 0; i < ready.length; i += WEBHOOK_APPLY_CONCURRENCY) {
+    const chunk = ready.slice(i, i + WEBHOOK_APPLY_CONCURRENCY);
+    const results = await Promise.allSettled(chunk.map(merged => updateUserPlan(merged.userId, merged.updates)));
+    results.forEach((result, j) => {
+      const merged = chunk[j];
+      if (result.status === 'fulfilled' && result.value === null) {
+        // user_plans already holds a newer subscription event
+        processedIds.push(...merged.eventIds);
+        stats.superseded += merged.eventIds.length;
+        merged.events.forEach(event => eventsTotal.inc({ type: event.type, outcome: 'superseded' }));
+      } else if (result.status === 'fulfilled') {
+        processedIds.push(...merged.eventIds);
+        if (merged.subscriptionCreated) {
+          appliedUpTo.set(merged.customerId, Math.max(merged.subscriptionCreated, appliedUpTo.get(merged.customerId) || 0));
+        }
+        stats.applied += merged.eventIds.length;
+        merged.events.forEach(event => eventsTotal.inc({ type: event.type, outcome: 'applied' }));
+      } else {
+        deferred.push(merged);
+        merged.events.forEach(event => eventsTotal.inc({ type: event.type, outcome: 'failed' }));
+        console.error(`Stripe webhook update for ${merged.customerId} failed:`, result.reason);
+      }
+    });
+  }
+
+  await journalUpdate(processedIds, { processed_at: new Date().toISOString(), last_error: null });
+  for (const merged of deferred) {
+    const attempts = Math.max(...merged.eventIds.map(id => attemptsById.get(id) || 0)) + 1;
+    await journalUpdate(merged.eventIds, {
+      last_error: merged.userId ? 'update failed' : 'customer not linked to a user',
+      attempts,
+      next_attempt_at: new Date(Date.now() + retryDelay(attempts)).toISOString()
+    });
+  }
+}
+
+/**
+ * Apply queued events in batches of WEBHOOK_BATCH_SIZE
+ * @returns {Promise<void>} Resolves when the queue has been drained or a batch failed
+ */
+export function flushWebhookEvents() {
+  if (flushing) {
+    return flushing;
+  }
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (queue.length === 0) {
+    return Promise.resolve();
+  }
+
+  flushing = (async () => {
+    while (queue.length > 0) {
+      const batch = queue.splice(0, WEBHOOK_BATCH_SIZE);
+      try {
+        await applyBatch(batch);
+        stats.flushes++;
+      } catch (error) {
+        // Still unprocessed in the journal; the sweep picks them up again
+        console.error('Error applying Stripe webhook events:', error);
+        stats.failedFlushes++;
+      } finally {
+        batch.forEach(event => {
+          queuedIds.delete(event.id);
+          attemptsById.delete(event.id);
+        });
+      }
+    }
+  })().finally(() => {
+    flushing = null;
+    if (queue.length > 0) {
+      scheduleFlush();
+    }
+  });
+
+  return flushing;
+}
+
+function scheduleFlush() {
+  if (timer || flushing) {
+    return;
+  }
+  timer = setTimeout(() => {
+    timer = null;
+    flushWebhookEvents();
+  }, WEBHOOK_FLUSH_INTERVAL_MS);
+  timer.unref?.();
+}
+
+/**
+ * Requeue journaled events that were never applied (crash, failed write,
+ * or a customer that was not linked yet)
+ * @returns {Promise<number>} Events requeued
+ */
+export async function sweepWebhookEvents() {
+  const rows = await journalPending(WEBHOOK_BATCH_SIZE);
+  let requeued = 0;
+  for (const row of rows) {
+    if (!queuedIds.has(row.id) && queue.length < WEBHOOK_QUEUE_MAX) {
+      attemptsById.set(row.id, row.attempts || 0);
+      push(row.payload);
+      requeued++;
+    }
+  }
+  return requeued;
+}
+
+function sweep() {
+  sweepWebhookEvents().catch(error => console.error('Stripe webhook sweep failed:', error));
+}
+
+function startSweeper() {
+  if (sweeper) {
+    return;
+  }
+  sweeper = setInterval(sweep, WEBHOOK_RETRY_AFTER_MS);
+  sweeper.unref?.();
+}
+
+export function getWebhookStats() {
+  return {
+    ...stats,
+    queued: queue.length,
+    queueMax: WEBHOOK_QUEUE_MAX,
+    batchSize: WEBHOOK_BATCH_SIZE
+  };
+}
+
+onShutdown('stripe-webhooks', flushWebhookEvents);
+
+// Pick up events an earlier process journaled but never applied without
+// waiting for the next webhook to reach this instance
+if (isWebhookConfigured) {
+  startSweeper();
+  setTimeout(sweep, 0).unref?.();
+}
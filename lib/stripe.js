@@ -1,19 +1,55 @@
 // Stripe configuration with graceful degradation
 
+import { histogram } from './metrics';
+
 const stripeSecretKey = process.env.STRIPE_SECRET_KEY;
 const stripePublishableKey = process.env.NEXT_PUBLIC_STRIPE_PUBLISHABLE_KEY;
+// Point the client at stripe-mock (e.g. http://localhost:12111) in development and tests
+const stripeApiBase = process.env.STRIPE_API_BASE;
 
 export const isStripeConfigured = !!(stripeSecretKey && stripePublishableKey);
 
-// Server-side Stripe instance
+const requestDuration = histogram('stripe_request_duration_seconds', 'Stripe API latency', ['method', 'path', 'status']);
+
+let stripeClient = null;
+
+// Object ids (cs_..., cus_..., sub_...) would give every call its own series
+function normalizeStripePath(path) {
+  return path.split('?')[0].replace(/\/[a-z]+_(?=[A-Za-z_]*[0-9A-Z])[A-Za-z0-9_]+/g, '/:id');
+}
+
+function getApiHostOptions() {
+  if (!stripeApiBase) {
+    return {};
+  }
+  const url = new URL(stripeApiBase);
+  return {
+    host: url.hostname,
+    port: Number(url.port) || (url.protocol === 'http:' ? 80 : 443),
+    protocol: url.protocol.replace(':', '')
+  };
+}
+
+// Server-side Stripe instance (one client, so connections are reused)
 export async function getStripe() {
   if (!stripeSecretKey) {
     return null;
   }
-  const Stripe = (await import('stripe')).default;
-  return new Stripe(stripeSecretKey, {
-    apiVersion: '2023-10-16',
-  });
+  if (!stripeClient) {
+    const Stripe = (await import('stripe')).default;
+    stripeClient = new Stripe(stripeSecretKey, {
+      apiVersion: '2023-10-16',
+      ...getApiHostOptions()
+    });
+    stripeClient.on('response', (event) => {
+      requestDuration.observe({
+        method: event.method,
+        path: normalizeStripePath(event.path),
+        status: event.status
+      }, event.elapsed);
+    });
+  }
+  return stripeClient;
 }
 
 // Get Stripe status for UI
@@ -1,23 +1,77 @@
 import { createClient } from '@supabase/supabase-js';
+import { timedFetch } from './request-timing';
+import { counter, histogram } from './metrics';
 
 const supabaseUrl = process.env.NEXT_PUBLIC_SUPABASE_URL;
 const supabaseAnonKey = process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY;
+const serviceRoleKey = process.env.SUPABASE_SERVICE_ROLE_KEY;
+
+export const isSupabaseConfigured = !!(supabaseUrl && supabaseAnonKey);
+
+const queryDuration = histogram('supabase_query_duration_seconds', 'Supabase table query latency', ['table', 'operation']);
+const rpcDuration = histogram('supabase_rpc_duration_seconds', 'Supabase RPC latency', ['function']);
+const authDuration = histogram('supabase_auth_duration_seconds', 'Supabase auth API latency', ['endpoint']);
+const requestErrors = counter('supabase_errors_total', 'Failed Supabase requests (HTTP errors and network failures)', ['target']);
+
+const OPERATIONS = { GET: 'select', HEAD: 'count', POST: 'insert', PATCH: 'update', PUT: 'upsert', DELETE: 'delete' };
 
-// 🚨 Hard fail early if misconfigured
-if (!supabaseUrl || !supabaseAnonKey) {
-  console.error('❌ Supabase env vars missing');
+// Map a Supabase REST/auth URL to its metric and labels
+function classifyRequest(input, init) {
+  const url = new URL(typeof input === 'string' || input instanceof URL ? input : input.url);
+  const method = (init?.method || input.method || 'GET').toUpperCase();
+  const [service, , name, rest] = url.pathname.split('/').filter(Boolean);
+  if (service === 'rest' && name === 'rpc') {
+    return { metric: rpcDuration, labels: { function: rest }, target: `rpc:${rest}` };
+  }
+  if (service === 'rest') {
+    return { metric: queryDuration, labels: { table: name, operation: OPERATIONS[method] || method }, target: name };
+  }
+  return { metric: authDuration, labels: { endpoint: name || service }, target: service };
+}
+
+// Every round trip is recorded in /api/metrics and charged to the calling
+// API request's Server-Timing db stage
+async function instrumentedFetch(input, init) {
+  const { metric, labels, target } = classifyRequest(input, init);
+  const started = performance.now();
+  try {
+    const response = await timedFetch(input, init);
+    if (response.status >= 400) {
+      requestErrors.inc({ target });
+    }
+    return response;
+  } catch (error) {
+    requestErrors.inc({ target });
+    throw error;
+  } finally {
+    metric.observe(labels, performance.now() - started);
+  }
+}
+
+const clientOptions = { global: { fetch: instrumentedFetch } };
+
+// ⚠️ Without credentials the app falls back to MongoDB or demo mode
+if (!isSupabaseConfigured) {
+  console.warn('⚠️ Supabase env vars missing, using fallback storage');
 }
 
 // ✅ Client-side Supabase (auth, queries)
-export const supabase = createClient(
-  supabaseUrl,
-  supabaseAnonKey
-);
+export const supabase = isSupabaseConfigured
+  ? createClient(supabaseUrl, supabaseAnonKey, clientOptions)
+  : null;
 
 // ✅ Server-side admin client ONLY (never import in client components)
-const serviceRoleKey = process.env.SUPABASE_SERVICE_ROLE_KEY;
-
 export const supabaseAdmin =
   supabaseUrl && serviceRoleKey
-    ? createClient(supabaseUrl, serviceRoleKey)
+    ? createClient(supabaseUrl, serviceRoleKey, clientOptions)
     : null;
+
+// Get Supabase status for UI
+export function getSupabaseStatus() {
+  return {
+    configured: isSupabaseConfigured,
+    url: supabaseUrl ? 'Set' : 'Missing',
+    anonKey: supabaseAnonKey ? 'Set' : 'Missing',
+    serviceRoleKey: serviceRoleKey ? 'Set' : 'Missing'
+  };
+}
@@ -0,0 +1,100 @@
+// User agent classification
+// User-Agent strings are reduced to device type, OS family and browser
+// family, stored on events as small integer codes (indexes into the lists
+// below). Results are memoized per distinct string, since a handful of
+// strings make up most traffic.
+
+import { LruCache } from './lru-cache';
+
+// Codes are stored in qr_events (ua_device, ua_os, ua_browser): only ever
+// append to these lists. ua_browser_family() in supabase-migrations.sql
+// mirrors UA_BROWSERS.
+export const UA_DEVICES = ['other', 'desktop', 'mobile', 'tablet', 'bot'];
+export const UA_OS = ['other', 'windows', 'macos', 'ios', 'android', 'linux', 'chromeos'];
+export const UA_BROWSERS = ['other', 'chrome', 'safari', 'firefox', 'edge', 'samsung', 'bot'];
+
+const UA_CACHE_SIZE = parseInt(process.env.UA_CACHE_SIZE || '5000');
+// Longer strings are truncated before matching and caching
+const UA_MAX_LENGTH = 512;
+
+const parsed = new LruCache({ maxEntries: UA_CACHE_SIZE, ttlMs: 24 * 60 * 60 * 1000 });
+
+const UNKNOWN = Object.freeze({ device: 0, os: 0, browser: 0 });
+
+/**
+ * Classify a user agent string into a coarse browser family
+ * @param {string} userAgent - Raw User-Agent header
+ * @returns {string} Family name
+ */
+export function classifyUserAgentFamily(userAgent) {
+  if (!userAgent) return 'other';
+  const ua = userAgent.toLowerCase();
+  // Crawlers and link unfurlers (Slackbot, Twitterbot, facebookexternalhit, WhatsApp previews, ...)
+  if (/bot|crawler|spider|preview|facebookexternalhit|whatsapp\/|embedly/.test(ua)) return 'bot';
+  if (ua.includes('samsungbrowser')) return 'samsung';
+  if (ua.includes('edg/') || ua.includes('edga/') || ua.includes('edgios/')) return 'edge';
+  if (ua.includes('firefox/') || ua.includes('fxios/')) return 'firefox';
+  if (ua.includes('chrome/') || ua.includes('crios/')) return 'chrome';
+  if (ua.includes('safari/')) return 'safari';
+  return 'other';
+}
+
+function classifyOs(ua) {
+  if (ua.includes('windows')) return 'windows';
+  if (ua.includes('iphone') || ua.includes('ipad') || ua.includes('ipod')) return 'ios';
+  if (ua.includes('android')) return 'android';
+  if (ua.includes('cros')) return 'chromeos';
+  if (ua.includes('mac os x') || ua.includes('macintosh')) return 'macos';
+  if (ua.includes('linux')) return 'linux';
+  return 'other';
+}
+
+function classifyDevice(ua, os, browser) {
+  if (browser === 'bot') return 'bot';
+  if (ua.includes('ipad') || ua.includes('tablet') || (os === 'android' && !ua.includes('mobile'))) return 'tablet';
+  if (ua.includes('mobi') || ua.includes('iphone') || ua.includes('ipod')) return 'mobile';
+  if (os === 'other') return 'other';
+  return 'desktop';
+}
+
+/**
+ * Classify a User-Agent string into device, OS and browser codes
+ * @param {string} userAgent - Raw User-Agent header
+ * @returns {Object} Frozen { device, os, browser } indexes into UA_DEVICES, UA_OS, UA_BROWSERS
+ */
+export function parseUserAgent(userAgent) {
+  if (!userAgent || typeof userAgent !== 'string') {
+    return UNKNOWN;
+  }
+  const key = userAgent.length > UA_MAX_LENGTH ? userAgent.slice(0, UA_MAX_LENGTH) : userAgent;
+  let codes = parsed.get(key);
+  if (codes === undefined) {
+    const ua = key.toLowerCase();
+    const browser = classifyUserAgentFamily(ua);
+    const os = classifyOs(ua);
+    codes = Object.freeze({
+      device: UA_DEVICES.indexOf(classifyDevice(ua, os, browser)),
+      os: UA_OS.indexOf(os),
+      browser: UA_BROWSERS.indexOf(browser)
+    });
+    parsed.set(key, codes);
+  }
+  return codes;
+}
+
+/**
+ * Names for stored codes (for rows read back from qr_events)
+ * @param {Object} row - Row with ua_device, ua_os, ua_browser
+ * @returns {Object} { device, os, browser }
+ */
+export function describeUserAgent(row) {
+  return {
+    device: UA_DEVICES[row?.ua_device] || 'other',
+    os: UA_OS[row?.ua_os] || 'other',
+    browser: UA_BROWSERS[row?.ua_browser] || row?.ua_family || 'other'
+  };
+}
+
+export function getUserAgentStats() {
+  return parsed.stats();
+}
@@ -2,6 +2,8 @@
 // Manages subscription plans (Free/Pro/Business) with Supabase integration
 
 import { supabase, supabaseAdmin, isSupabaseConfigured } from './supabase';
+import { LruCache } from './lru-cache';
+import { getMongoStore } from './mongo-fallback';
 
 // Plan types
 export const PLANS = {
@@ -41,8 +43,27 @@ export const PLAN_LIMITS = {
   }
 };
 
+// Scans allowed past maxScansPerMonth before scans are refused (soft -> hard limit)
+export const SCAN_QUOTA_GRACE = parseFloat(process.env.SCAN_QUOTA_GRACE || '0.1');
+
 // Demo mode plan storage
 let demoUserPlans = new Map();
+// Demo mode stripe_event_at per user (kept out of the plan objects the API returns)
+const demoStripeEventAt = new Map();
+
+// Resolved plans keyed by user id. Entries never outlive the subscription's
+// current_period_end, so an expiring plan is recomputed right when it lapses.
+const PLAN_CACHE_TTL_MS = parseInt(process.env.PLAN_CACHE_TTL_MS || '300000');
+const planCache = new LruCache({
+  maxEntries: parseInt(process.env.PLAN_CACHE_MAX_ENTRIES || '10000'),
+  ttlMs: PLAN_CACHE_TTL_MS
+});
+
+// user_plans rows fetched per query in getUserPlans
+const BULK_PLAN_CHUNK_SIZE = 500;
+
+// PostgREST error code for .single() matching no rows
+const NOT_FOUND = 'PGRST116';
 
 /**
  * Get user's plan information
@@ -55,6 +76,11 @@ export async function getUserPlan(userId) {
   }
 
   if (isSupabaseConfigured && supabaseAdmin) {
+    const cached = planCache.get(userId);
+    if (cached) {
+      return cached;
+    }
+
     try {
       const { data, error } = await supabaseAdmin
         .from('user_plans')
@@ -62,26 +88,35 @@ export async function getUserPlan(userId) {
         .eq('user_id', userId)
         .single();
 
-      if (error || !data) {
-        // No plan found, return free plan
+      if (error && error.code !== NOT_FOUND) {
+        // Transient failure: serve the free plan without caching it, so a
+        // paying user is not held on free limits for PLAN_CACHE_TTL_MS
+        console.error('Error fetching user plan:', error);
         return getDefaultPlan(userId);
       }
 
-      // Check if subscription is still active for paid plans
-      const effectivePlan = getEffectivePlan(data);
-
-      return {
-        userId: data.user_id,
-        plan: data.plan,
-        effectivePlan,
-        stripeCustomerId: data.stripe_customer_id,
-        stripeSubscriptionId: data.stripe_subscription_id,
-        currentPeriodEnd: data.current_period_end,
-        isActive: isSubscriptionActive(data),
-        limits: PLAN_LIMITS[effectivePlan],
-        createdAt: data.created_at,
-        updatedAt: data.updated_at
-      };
+      if (!data) {
+        // No plan found, return free plan
+        return cachePlan(getDefaultPlan(userId));
+      }
+
+      return cachePlan(formatPlan(data));
+    } catch (error) {
+      console.error('Error fetching user plan:', error);
+      return getDefaultPlan(userId);
+    }
+  }
+
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    const cached = planCache.get(userId);
+    if (cached) {
+      return cached;
+    }
+
+    try {
+      const row = await mongoStore.getUserPlanRow(userId);
+      return cachePlan(row ? formatPlan(row) : getDefaultPlan(userId));
     } catch (error) {
       console.error('Error fetching user plan:', error);
       return getDefaultPlan(userId);
@@ -96,40 +131,184 @@ export async function getUserPlan(userId) {
   return getDefaultPlan(userId);
 }
 
+/**
+ * Get plans for many users at once (admin and reporting paths)
+ * @param {Array<string>} userIds - User IDs
+ * @returns {Promise<Map<string, Object>>} Plan object per user ID
+ */
+export async function getUserPlans(userIds) {
+  const plans = new Map();
+  const missing = [];
+  const mongoStore = isSupabaseConfigured && supabaseAdmin ? null : await getMongoStore();
+  const useCache = (isSupabaseConfigured && supabaseAdmin) || mongoStore;
+
+  for (const userId of new Set(userIds.filter(Boolean))) {
+    const cached = useCache ? planCache.get(userId) : demoUserPlans.get(userId);
+    if (cached) {
+      plans.set(userId, cached);
+    } else {
+      missing.push(userId);
+    }
+  }
+
+  if (missing.length > 0 && isSupabaseConfigured && supabaseAdmin) {
+    for (let i = 0; i < missing.length; i += BULK_PLAN_CHUNK_SIZE) {
+      const chunk = missing.slice(i, i + BULK_PLAN_CHUNK_SIZE);
+      const { data, error } = await supabaseAdmin
+        .from('user_plans')
+        .select('*')
+        .in('user_id', chunk);
+
+      if (error) {
+        console.error('Error fetching user plans:', error);
+        throw error;
+      }
+
+      const now = Date.now();
+      for (const row of data || []) {
+        plans.set(row.user_id, cachePlan(formatPlan(row, now)));
+      }
+    }
+  } else if (missing.length > 0 && mongoStore) {
+    for (let i = 0; i < missing.length; i += BULK_PLAN_CHUNK_SIZE) {
+      const rows = await mongoStore.getUserPlanRows(missing.slice(i, i + BULK_PLAN_CHUNK_SIZE));
+      const now = Date.now();
+      for (const row of rows) {
+        plans.set(row.user_id, cachePlan(formatPlan(row, now)));
+      }
+    }
+  }
+
+  for (const userId of missing) {
+    if (!plans.has(userId)) {
+      plans.set(userId, getDefaultPlan(userId));
+    }
+  }
+
+  return plans;
+}
+
+/**
+ * Map Stripe customer ids to the users they belong to (webhook processing)
+ * @param {Array<string>} customerIds - Stripe customer IDs
+ * @returns {Promise<Map<string, string>>} User ID per known customer ID
+ */
+export async function getUserIdsByStripeCustomer(customerIds) {
+  const userIds = new Map();
+  const unique = [...new Set(customerIds.filter(Boolean))];
+  if (unique.length === 0) {
+    return userIds;
+  }
+
+  if (isSupabaseConfigured && supabaseAdmin) {
+    for (let i = 0; i < unique.length; i += BULK_PLAN_CHUNK_SIZE) {
+      const { data, error } = await supabaseAdmin
+        .from('user_plans')
+        .select('user_id, stripe_customer_id')
+        .in('stripe_customer_id', unique.slice(i, i + BULK_PLAN_CHUNK_SIZE));
+
+      if (error) throw error;
+      for (const row of data || []) {
+        userIds.set(row.stripe_customer_id, row.user_id);
+      }
+    }
+    return userIds;
+  }
+
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    for (let i = 0; i < unique.length; i += BULK_PLAN_CHUNK_SIZE) {
+      const rows = await mongoStore.getUserPlanRowsByCustomer(unique.slice(i, i + BULK_PLAN_CHUNK_SIZE));
+      for (const row of rows) {
+        userIds.set(row.stripe_customer_id, row.user_id);
+      }
+    }
+    return userIds;
+  }
+
+  // Demo mode
+  const wanted = new Set(unique);
+  for (const plan of demoUserPlans.values()) {
+    if (wanted.has(plan.stripeCustomerId)) {
+      userIds.set(plan.stripeCustomerId, plan.userId);
+    }
+  }
+  return userIds;
+}
+
+/**
+ * Drop a cached plan (e.g. after an out-of-band change)
+ * @param {string} userId - User ID
+ */
+export function invalidateUserPlan(userId) {
+  planCache.delete(userId);
+}
+
+export function getPlanCacheStats() {
+  return planCache.stats();
+}
+
+/**
+ * Cache a resolved plan until the earlier of the cache TTL and period end
+ */
+function cachePlan(plan) {
+  let ttlMs = PLAN_CACHE_TTL_MS;
+  if (plan.effectivePlan !== PLANS.FREE && plan.currentPeriodEnd) {
+    ttlMs = Math.min(ttlMs, new Date(plan.currentPeriodEnd).getTime() - Date.now());
+  }
+  planCache.set(plan.userId, plan, ttlMs);
+  return plan;
+}
+
+/**
+ * Convert a user_plans row into a plan object
+ * @param {Object} data - user_plans row
+ * @param {number} now - Timestamp to evaluate expiry against
+ */
+function formatPlan(data, now = Date.now()) {
+  const periodEnd = data.current_period_end ? new Date(data.current_period_end).getTime() : null;
+  const effectivePlan = getEffectivePlan(data.plan, periodEnd, now);
+
+  return {
+    userId: data.user_id,
+    plan: data.plan,
+    effectivePlan,
+    stripeCustomerId: data.stripe_customer_id,
+    stripeSubscriptionId: data.stripe_subscription_id,
+    currentPeriodEnd: data.current_period_end,
+    isActive: isSubscriptionActive(data.plan, periodEnd, now),
+    limits: PLAN_LIMITS[effectivePlan],
+    createdAt: data.created_at,
+    updatedAt: data.updated_at
+  };
+}
+
 /**
  * Get the effective plan (considering expiration)
  */
-function getEffectivePlan(planData) {
-  if (planData.plan === PLANS.FREE) {
+function getEffectivePlan(plan, periodEnd, now) {
+  if (plan === PLANS.FREE) {
     return PLANS.FREE;
   }
 
   // For paid plans, check if subscription is still valid
-  if (planData.current_period_end) {
-    const endDate = new Date(planData.current_period_end);
-    if (endDate < new Date()) {
-      // Subscription expired
-      return PLANS.FREE;
-    }
+  if (periodEnd !== null && periodEnd < now) {
+    // Subscription expired
+    return PLANS.FREE;
   }
 
-  return planData.plan;
+  return plan;
 }
 
 /**
  * Check if subscription is active
  */
-function isSubscriptionActive(planData) {
-  if (planData.plan === PLANS.FREE) {
+function isSubscriptionActive(plan, periodEnd, now) {
+  if (plan === PLANS.FREE) {
     return true; // Free is always "active"
   }
 
-  if (!planData.current_period_end) {
-    return false;
-  }
-
-  const endDate = new Date(planData.current_period_end);
-  return endDate > new Date();
+  return periodEnd !== null && periodEnd > now;
 }
 
 /**
@@ -188,40 +367,41 @@ export async function createUserPlan(userId, email = null) {
       if (error) {
         // If duplicate key error, plan was created by trigger
         if (error.code === '23505') {
+          invalidateUserPlan(userId);
           return getUserPlan(userId);
         }
         throw error;
       }
 
-      return {
-        userId: data.user_id,
-        plan: data.plan,
-        effectivePlan: data.plan,
-        stripeCustomerId: null,
-        stripeSubscriptionId: null,
-        currentPeriodEnd: null,
-        isActive: true,
-        limits: PLAN_LIMITS[data.plan],
-        createdAt: data.created_at,
-        updatedAt: data.updated_at
-      };
+      return cachePlan(formatPlan(data));
     } catch (error) {
       console.error('Error creating user plan:', error);
       throw error;
     }
   }
 
-  // Demo mode
-  const newPlan = getDefaultPlan(userId);
-  demoUserPlans.set(userId, newPlan);
-  return newPlan;
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    // Upsert keeps an existing plan untouched
+    return cachePlan(formatPlan(await mongoStore.createUserPlanRow(userId, PLANS.FREE)));
+  }
+
+  // Demo mode (keeps an existing plan, like the upsert above)
+  if (!demoUserPlans.has(userId)) {
+    demoUserPlans.set(userId, getDefaultPlan(userId));
+  }
+  return demoUserPlans.get(userId);
 }
 
 /**
  * Update user plan (for Stripe webhook handlers)
+ * With updates.stripeEventAt (the Stripe event's creation time, ISO), the
+ * write only happens if no newer event was applied before, and records it
+ * in user_plans.stripe_event_at; the check is part of the update itself, so
+ * it holds across instances and restarts.
  * @param {string} userId - User ID
  * @param {Object} updates - Plan updates
- * @returns {Promise<Object>} Updated plan object
+ * @returns {Promise<Object|null>} Updated plan object, or null if a newer event was already applied
  */
 export async function updateUserPlan(userId, updates) {
   if (!userId) {
@@ -241,39 +421,63 @@ export async function updateUserPlan(userId, updates) {
   if (updates.currentPeriodEnd !== undefined) {
     allowedUpdates.current_period_end = updates.currentPeriodEnd;
   }
+  const eventAt = updates.stripeEventAt || null;
+  if (eventAt) {
+    allowedUpdates.stripe_event_at = eventAt;
+  }
   allowedUpdates.updated_at = new Date().toISOString();
 
   if (isSupabaseConfigured && supabaseAdmin) {
     try {
-      const { data, error } = await supabaseAdmin
+      let query = supabaseAdmin
         .from('user_plans')
         .update(allowedUpdates)
-        .eq('user_id', userId)
-        .select()
-        .single();
+        .eq('user_id', userId);
+      if (eventAt) {
+        query = query.or(`stripe_event_at.is.null,stripe_event_at.lt."${eventAt}"`);
+      }
+      const { data, error } = await query.select().maybeSingle();
 
       if (error) throw error;
+      if (!data) {
+        // Either the row is missing or it already holds a newer event
+        const { data: existing, error: lookupError } = await supabaseAdmin
+          .from('user_plans')
+          .select('user_id')
+          .eq('user_id', userId)
+          .maybeSingle();
+        if (lookupError) throw lookupError;
+        if (!existing || !eventAt) throw new Error(`No plan row for user ${userId}`);
+        return null;
+      }
+
+      return cachePlan(formatPlan(data));
+    } catch (error) {
+      invalidateUserPlan(userId);
+      console.error('Error updating user plan:', error);
+      throw error;
+    }
+  }
 
-      const effectivePlan = getEffectivePlan(data);
-      return {
-        userId: data.user_id,
-        plan: data.plan,
-        effectivePlan,
-        stripeCustomerId: data.stripe_customer_id,
-        stripeSubscriptionId: data.stripe_subscription_id,
-        currentPeriodEnd: data.current_period_end,
-        isActive: isSubscriptionActive(data),
-        limits: PLAN_LIMITS[effectivePlan],
-        createdAt: data.created_at,
-        updatedAt: data.updated_at
-      };
+  const mongoStore = await getMongoStore();
+  if (mongoStore) {
+    try {
+      const row = await mongoStore.updateUserPlanRow(userId, allowedUpdates, { olderThan: eventAt });
+      return row ? cachePlan(formatPlan(row)) : null;
     } catch (error) {
+      invalidateUserPlan(userId);
       console.error('Error updating user plan:', error);
       throw error;
     }
   }
 
   // Demo mode
+  if (eventAt && demoStripeEventAt.get(userId) >= eventAt) {
+    return null;
+  }
+  if (eventAt) {
+    demoStripeEventAt.set(userId, eventAt);
+  }
   const existingPlan = demoUserPlans.get(userId) || getDefaultPlan(userId);
   const updatedPlan = {
     ...existingPlan,
@@ -308,14 +512,41 @@ export async function checkPlanLimit(userId, action, context = {}) {
       if (limits.maxQrCodes === -1) {
         return { allowed: true };
       }
-      if (context.currentQrCount >= limits.maxQrCodes) {
+      // requestedCount lets bulk imports check the whole batch at once
+      if (context.currentQrCount + (context.requestedCount || 1) > limits.maxQrCodes) {
+        const remaining = Math.max(limits.maxQrCodes - context.currentQrCount, 0);
         return { 
           allowed: false, 
-          reason: `You've reached the maximum of ${limits.maxQrCodes} QR codes on the ${userPlan.effectivePlan} plan. Upgrade to create more.`
+          remaining,
+          reason: context.requestedCount > 1 && remaining > 0
+            ? `This import needs ${context.requestedCount} QR codes but only ${remaining} remain on the ${userPlan.effectivePlan} plan. Upgrade to create more.`
+            : `You've reached the maximum of ${limits.maxQrCodes} QR codes on the ${userPlan.effectivePlan} plan. Upgrade to create more.`
         };
       }
       return { allowed: true };
 
+    case 'scan': {
+      if (limits.maxScansPerMonth === null) {
+        return { allowed: true, softLimitReached: false };
+      }
+      const hardLimit = Math.ceil(limits.maxScansPerMonth * (1 + SCAN_QUOTA_GRACE));
+      if (context.currentScanCount >= hardLimit) {
+        return {
+          allowed: false,
+          softLimitReached: true,
+          reason: `This QR code's owner has used all ${limits.maxScansPerMonth.toLocaleString('en-US')} monthly scans on the ${userPlan.effectivePlan} plan.`
+        };
+      }
+      if (context.currentScanCount >= limits.maxScansPerMonth) {
+        return {
+          allowed: true,
+          softLimitReached: true,
+          reason: `You've reached the ${limits.maxScansPerMonth.toLocaleString('en-US')} monthly scans included in the ${userPlan.effectivePlan} plan. Upgrade to keep your codes scanning.`
+        };
+      }
+      return { allowed: true, softLimitReached: false };
+    }
+
     case 'use_custom_domain':
       if (!limits.customDomains) {
         return { 
@@ -410,4 +641,5 @@ export function getPlanComparison() {
 // Export for demo mode testing
 export function resetDemoPlans() {
   demoUserPlans.clear();
+  demoStripeEventAt.clear();
 }
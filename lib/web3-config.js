@@ -17,6 +17,7 @@ export const CHAIN_CONFIG = {
 // Contract Addresses (from env)
 export const NOVA_TOKEN_ADDRESS = process.env.NEXT_PUBLIC_NOVA_TOKEN_ADDRESS || '0x0000000000000000000000000000000000000000';
 export const NFT_CONTRACT_ADDRESS = process.env.NEXT_PUBLIC_NFT_CONTRACT_ADDRESS || '0x0000000000000000000000000000000000000000';
+export const MARKETPLACE_ADDRESS = process.env.NEXT_PUBLIC_MARKETPLACE_ADDRESS || '0x0000000000000000000000000000000000000000';
 export const CHAIN_ID = parseInt(process.env.NEXT_PUBLIC_CHAIN_ID || '11155111');
 
 // WalletConnect config
@@ -26,6 +27,7 @@ export const isWalletConnectConfigured = !!WALLETCONNECT_PROJECT_ID;
 // Check if contracts are configured (not zero address)
 export const isNovaTokenConfigured = NOVA_TOKEN_ADDRESS !== '0x0000000000000000000000000000000000000000';
 export const isNFTContractConfigured = NFT_CONTRACT_ADDRESS !== '0x0000000000000000000000000000000000000000';
+export const isMarketplaceConfigured = MARKETPLACE_ADDRESS !== '0x0000000000000000000000000000000000000000';
 
 // ERC-20 ABI (minimal for token transfers)
 export const ERC20_ABI = [
@@ -94,14 +96,33 @@ export const ERC721_ABI = [
   }
 ];
 
+// Marketplace ABI (the listing read used by the indexer)
+export const MARKETPLACE_ABI = [
+  {
+    "inputs": [{"name": "listingId", "type": "uint256"}],
+    "name": "getListing",
+    "outputs": [
+      {"name": "seller", "type": "address"},
+      {"name": "nftContract", "type": "address"},
+      {"name": "tokenId", "type": "uint256"},
+      {"name": "price", "type": "uint256"},
+      {"name": "active", "type": "bool"}
+    ],
+    "stateMutability": "view",
+    "type": "function"
+  }
+];
+
 // Get Web3 status for UI
 export function getWeb3Status() {
   return {
     walletConnectConfigured: isWalletConnectConfigured,
     novaTokenConfigured: isNovaTokenConfigured,
     nftContractConfigured: isNFTContractConfigured,
+    marketplaceConfigured: isMarketplaceConfigured,
     chainId: CHAIN_ID,
     novaAddress: NOVA_TOKEN_ADDRESS,
-    nftAddress: NFT_CONTRACT_ADDRESS
+    nftAddress: NFT_CONTRACT_ADDRESS,
+    marketplaceAddress: MARKETPLACE_ADDRESS
   };
 }
@@ -0,0 +1,62 @@
+// QR encoder fixed vectors
+// Checks lib/qr-encoder.js against module matrices generated with the Python
+// qrcode package (8.2, optimize=0, border=0) at the version, error correction
+// level and mask listed for each vector. Data encoding, error correction and
+// module placement must match it exactly. The mask is the encoder's own
+// choice (the penalty scoring qrcode.react uses), which can differ from the
+// one Python qrcode picks, so it is pinned here rather than cross-checked.
+//
+//   node scripts/qr-encoder-vectors.mjs
+
+import { createHash } from 'crypto';
+import { encodeQr } from '../lib/qr-encoder.js';
+
+const BASE = 'https://novatok.app/q/';
+
+// Deterministic URL-safe filler so long vectors stay readable here
+function filler(length) {
+  const alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789-_/?=&';
+  return Array.from({ length }, (_, i) => alphabet[(i * 7) % alphabet.length]).join('');
+}
+
+// [text, requested ecc, version, ecc used, mask, sha256 of the rows as '0'/'1' joined by '\n']
+const VECTORS = [
+  ['HELLO WORLD', 'M', 1, 'Q', 0, '7cb519f187a1f6d6294385b11fd9d65487509b897a600c9c5e6398297cd45222'],
+  ['01234567890123456789', 'Q', 1, 'Q', 6, 'd7954d5c236d5cf2fae234cf890280f49b2711be87544f5f17ab0e3a75753c09'],
+  [BASE + 'aZ9kQ2x', 'L', 2, 'L', 1, '27542114adfce2f187315cd621c38e9af2c57ff5ef233ee4073d10549ced5af6'],
+  [BASE + 'aZ9kQ2x', 'H', 4, 'H', 6, '2880defffc76626c346921d7902c8045c073ce1597df7802b39620454ed38ffd'],
+  ['NovaTok QR Hub — naïve ✓', 'L', 2, 'L', 3, 'fd4929b249b187e99d56462611e584ec0ef55f9938b10090c6cbe04ba9708859'],
+  [BASE + filler(60), 'M', 5, 'M', 0, 'ee632982a3f1935434e70790987929ba90fce997c3361ed76382e2f30946b78e'],
+  [BASE + filler(150), 'Q', 11, 'Q', 6, '7378b204ba33139a20aa03b1e1525c08ed6a09aaf06da586e02599070442a3d0'],
+  [BASE + filler(300), 'H', 19, 'H', 2, 'de34467ce4c7af6b925344b2b4a162ce376b84da36979b98ac40731c80ade742'],
+  [BASE + filler(500), 'L', 16, 'L', 2, 'c4d80482c3b9eaa275420f4d4d46034ffb7647fb6e3871d52ed77ea4c80e151d'],
+  [BASE + filler(900), 'M', 25, 'M', 4, '070aa0963484e10bd049c48dac33f857792e18aef3191de0b95f56a655f83768'],
+  ['1234567890'.repeat(150), 'L', 17, 'L', 5, '914aa83a7592675a97f9b03bca43fb355bd91eaff1ce206bde421cb0b7b396ca'],
+  ['NOVATOK ' + 'ABC123$%*+-./: '.repeat(60), 'Q', 24, 'Q', 0, 'd906e368de17eb77df78e102f5449da9f4944b87a36bac634a7ba0331ebbd073'],
+  [BASE + filler(1300), 'L', 26, 'L', 2, 'aca8b9ce2b9859407e70f89845fa918ed2ac44cb67af9ac29e30b8e4b0177831'],
+  [BASE + filler(1700), 'M', 34, 'M', 2, 'e82ded7ed522e3fd337f6dbef0209c5266ddb4bf5bc7ab58daaa6ae4ab46ed70'],
+  [BASE + filler(2250), 'L', 35, 'L', 2, 'b09581ac222dc4f38daaa6fbe364e5a0cfe8f772aaa987159926c6ff53b7c3f6']
+];
+
+function matrixHash(modules) {
+  const rows = modules.map(row => row.map(dark => (dark ? '1' : '0')).join('')).join('\n');
+  return createHash('sha256').update(rows).digest('hex');
+}
+
+let failures = 0;
+for (const [text, requestedEcc, version, ecc, mask, sha256] of VECTORS) {
+  const label = `${JSON.stringify(text.length > 40 ? text.slice(0, 40) + '…' : text)} (${text.length} chars, ${requestedEcc})`;
+  const qr = encodeQr(text, requestedEcc);
+  const actual = { version: qr.version, ecc: qr.ecc, mask: qr.mask, sha256: matrixHash(qr.modules) };
+  const expected = { version, ecc, mask, sha256 };
+  const mismatched = Object.keys(expected).filter(key => actual[key] !== expected[key]);
+  if (mismatched.length > 0) {
+    failures++;
+    console.log(`FAIL ${label}: ${mismatched.map(key => `${key} ${actual[key]} != ${expected[key]}`).join(', ')}`);
+  } else {
+    console.log(`ok   ${label}: version ${version}-${ecc}, mask ${mask}`);
+  }
+}
+
+console.log(`\n${VECTORS.length - failures}/${VECTORS.length} vectors match`);
+process.exit(failures > 0 ? 1 : 0);
@@ -0,0 +1,141 @@
+// Local JSON-RPC stand-in for the NFT/marketplace indexer
+// Answers eth_call for tokenURI, ownerOf and getListing (see MARKETPLACE_ABI
+// in lib/web3-config.js) with deterministic data, accepts JSON-RPC batches,
+// and serves the token metadata JSON itself so the off-chain fetch is
+// exercised too. Token and listing ids >= 1000000 revert. Tokens 900000 to
+// 949999 point their tokenURI at the cloud metadata address and 950000 to
+// 999999 at https://localhost, both of which the indexer must refuse.
+//
+//   node scripts/rpc-standin.mjs [--port 8545] [--latency 0] [--chain-id 11155111]
+//
+// Then start the app with:
+//   WEB3_RPC_URL=http://127.0.0.1:8545
+//   NEXT_PUBLIC_NFT_CONTRACT_ADDRESS=0x1111111111111111111111111111111111111111
+//   NEXT_PUBLIC_MARKETPLACE_ADDRESS=0x2222222222222222222222222222222222222222
+//   METADATA_ALLOWED_HOSTS=127.0.0.1:8545
+//
+// and run `python backend_test.py --chain` against it.
+
+import { createServer } from 'http';
+
+function parseArgs() {
+  const args = { port: 8545, latency: 0, chainId: 11155111 };
+  const argv = process.argv.slice(2);
+  for (let i = 0; i < argv.length; i += 2) {
+    const key = argv[i].replace(/^--/, '').replace(/-(\w)/g, (_, c) => c.toUpperCase());
+    if (!(key in args)) throw new Error(`Unknown option: ${argv[i]}`);
+    args[key] = Number(argv[i + 1]);
+  }
+  return args;
+}
+
+const args = parseArgs();
+const NFT_CONTRACT = '0x1111111111111111111111111111111111111111';
+const REVERT_FROM = 1000000n;
+const METADATA_SERVICE_FROM = 900000n;
+const LOCALHOST_FROM = 950000n;
+
+const SELECTORS = {
+  '0xc87b56dd': 'tokenURI',
+  '0x6352211e': 'ownerOf',
+  '0x107a274a': 'getListing'
+};
+
+const uint = (value) => BigInt(value).toString(16).padStart(64, '0');
+const address = (value) => value.slice(2).toLowerCase().padStart(64, '0');
+
+function encodeString(text) {
+  const hex = Buffer.from(text, 'utf8').toString('hex');
+  return uint(32) + uint(hex.length / 2) + hex.padEnd(Math.ceil(hex.length / 64) * 64, '0');
+}
+
+function ownerOf(tokenId) {
+  return '0x' + (tokenId * 7919n + 1n).toString(16).padStart(40, '0').slice(-40);
+}
+
+function handleCall({ data }) {
+  const name = SELECTORS[data.slice(0, 10)];
+  if (!name) {
+    throw { code: -32000, message: 'execution reverted: unknown selector' };
+  }
+  const id = BigInt('0x' + data.slice(10, 74));
+  if (id >= REVERT_FROM) {
+    throw { code: 3, message: `execution reverted: nonexistent ${name === 'getListing' ? 'listing' : 'token'}` };
+  }
+  switch (name) {
+    case 'tokenURI':
+      if (id >= LOCALHOST_FROM) {
+        return '0x' + encodeString(`https://localhost:${args.port}/metadata/${id}.json`);
+      }
+      if (id >= METADATA_SERVICE_FROM) {
+        return '0x' + encodeString('http://169.254.169.254/latest/meta-data/');
+      }
+      return '0x' + encodeString(`http://127.0.0.1:${args.port}/metadata/${id}.json`);
+    case 'ownerOf':
+      return '0x' + address(ownerOf(id));
+    case 'getListing':
+      return '0x' + address(ownerOf(id + 1n)) + address(NFT_CONTRACT) + uint(id + 1000n) +
+        uint((id + 1n) * 10n ** 16n) + uint(id % 5n === 0n ? 0 : 1);
+  }
+}
+
+function handle(request) {
+  const reply = (body) => ({ jsonrpc: '2.0', id: request.id, ...body });
+  try {
+    switch (request.method) {
+      case 'eth_chainId':
+        return reply({ result: '0x' + args.chainId.toString(16) });
+      case 'eth_blockNumber':
+        return reply({ result: '0x1' });
+      case 'eth_call':
+        return reply({ result: handleCall(request.params[0]) });
+      default:
+        return reply({ error: { code: -32601, message: `Method not found: ${request.method}` } });
+    }
+  } catch (error) {
+    return reply({ error: error.code !== undefined ? error : { code: -32603, message: String(error) } });
+  }
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+let batches = 0;
+let calls = 0;
+
+const server = createServer(async (req, res) => {
+  const metadata = req.url.match(/^\/metadata\/(\d+)\.json$/);
+  if (req.method === 'GET' && metadata) {
+    await sleep(args.latency);
+    res.writeHead(200, { 'Content-Type': 'application/json' });
+    res.end(JSON.stringify({
+      name: `Stand-in NFT #${metadata[1]}`,
+      description: 'Served by scripts/rpc-standin.mjs',
+      image: `ipfs://bafystandin/${metadata[1]}.png`,
+      attributes: [{ trait_type: 'Parity', value: BigInt(metadata[1]) % 2n ? 'odd' : 'even' }]
+    }));
+    return;
+  }
+
+  let body = '';
+  for await (const chunk of req) body += chunk;
+  let payload;
+  try {
+    payload = JSON.parse(body);
+  } catch {
+    res.writeHead(400, { 'Content-Type': 'application/json' });
+    res.end(JSON.stringify({ jsonrpc: '2.0', id: null, error: { code: -32700, message: 'Parse error' } }));
+    return;
+  }
+
+  await sleep(args.latency);
+  const requests = Array.isArray(payload) ? payload : [payload];
+  batches++;
+  calls += requests.length;
+  console.log(`batch #${batches}: ${requests.length} call(s), ${calls} total`);
+  const responses = requests.map(handle);
+  res.writeHead(200, { 'Content-Type': 'application/json' });
+  res.end(JSON.stringify(Array.isArray(payload) ? responses : responses[0]));
+});
+
+server.listen(args.port, '127.0.0.1', () => {
+  console.log(`JSON-RPC stand-in listening on http://127.0.0.1:${args.port} (chain ${args.chainId})`);
+});
@@ -0,0 +1,121 @@
+// Slug allocator benchmark
+// Compares the block-leased sequence allocator with the old 8-hex-character
+// random slugs: allocation throughput, and collisions when several server
+// instances allocate concurrently from one shared counter.
+//
+//   node scripts/slug-benchmark.mjs [--slugs 1000000] [--instances 8] [--block 1000] [--lease-ms 5]
+
+import { randomUUID } from 'crypto';
+import { SlugAllocator, decodeSlug } from '../lib/slug-sequence.js';
+
+function parseArgs() {
+  const args = { slugs: 1000000, instances: 8, block: 1000, leaseMs: 5 };
+  const argv = process.argv.slice(2);
+  for (let i = 0; i < argv.length; i += 2) {
+    const key = argv[i].replace(/^--/, '').replace(/-(\w)/g, (_, c) => c.toUpperCase());
+    if (!(key in args)) throw new Error(`Unknown option: ${argv[i]}`);
+    args[key] = Number(argv[i + 1]);
+  }
+  return args;
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Stands in for lease_slug_block: one shared counter with round-trip latency
+function createSharedCounter(latencyMs) {
+  let next = 0;
+  let calls = 0;
+  return {
+    async leaseBlock(size) {
+      calls++;
+      await sleep(latencyMs);
+      const start = next;
+      next += size;
+      return start;
+    },
+    get calls() {
+      return calls;
+    }
+  };
+}
+
+function legacySlug() {
+  return randomUUID().replace(/-/g, '').substring(0, 8);
+}
+
+function rate(count, ms) {
+  return Math.round(count / (ms / 1000)).toLocaleString('en-US');
+}
+
+async function benchmarkSequence({ slugs, instances, block, leaseMs }) {
+  const counter = createSharedCounter(leaseMs);
+  const allocators = Array.from({ length: instances }, () => new SlugAllocator({ leaseBlock: counter.leaseBlock, blockSize: block }));
+  const perInstance = Math.ceil(slugs / instances);
+  const seen = new Set();
+  let collisions = 0;
+
+  const started = performance.now();
+  await Promise.all(allocators.map(async (allocator) => {
+    // Mix single creates with bulk imports, as the API does
+    for (let made = 0; made < perInstance;) {
+      const count = made % 10 === 0 ? Math.min(250, perInstance - made) : 1;
+      for (const slug of await allocator.allocate(count)) {
+        if (seen.has(slug)) collisions++;
+        seen.add(slug);
+      }
+      made += count;
+    }
+  }));
+  const elapsed = performance.now() - started;
+
+  const roundTrip = [...seen].slice(0, 10000).every(slug => decodeSlug(slug) !== null);
+  return { total: seen.size + collisions, collisions, elapsed, leases: counter.calls, roundTrip };
+}
+
+function benchmarkLegacy({ slugs }) {
+  const seen = new Set();
+  let collisions = 0;
+  const started = performance.now();
+  for (let i = 0; i < slugs; i++) {
+    const slug = legacySlug();
+    if (seen.has(slug)) collisions++;
+    seen.add(slug);
+  }
+  return { total: slugs, collisions, elapsed: performance.now() - started };
+}
+
+// Probability of at least one collision among n random 32-bit slugs
+function birthdayProbability(n) {
+  return 1 - Math.exp(-(n * (n - 1)) / (2 * 2 ** 32));
+}
+
+const args = parseArgs();
+console.log(`Allocating ${args.slugs.toLocaleString('en-US')} slugs (${args.instances} instances, block ${args.block}, ${args.leaseMs} ms per lease)\n`);
+
+const sequence = await benchmarkSequence(args);
+const legacy = benchmarkLegacy(args);
+
+console.table({
+  'sequence (11 base62)': {
+    slugs: sequence.total,
+    collisions: sequence.collisions,
+    'slugs/sec': rate(sequence.total, sequence.elapsed),
+    'db round trips': sequence.leases
+  },
+  'legacy (8 hex)': {
+    slugs: legacy.total,
+    collisions: legacy.collisions,
+    'slugs/sec': rate(legacy.total, legacy.elapsed),
+    'db round trips': 'n/a (no check)'
+  }
+});
+
+console.log('\nLegacy collision odds (at least one duplicate among n codes):');
+for (const n of [10000, 100000, 1000000, 10000000]) {
+  console.log(`  ${n.toLocaleString('en-US').padStart(12)} codes: ${(birthdayProbability(n) * 100).toFixed(2)}%`);
+}
+
+if (sequence.collisions > 0 || !sequence.roundTrip) {
+  console.error('\nSequence allocator produced duplicate or undecodable slugs');
+  process.exit(1);
+}
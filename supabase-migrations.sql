@@ -85,13 +85,16 @@ CREATE POLICY "Users can update own QR codes" ON qr_codes
 CREATE POLICY "Users can delete own QR codes" ON qr_codes
   FOR DELETE USING (auth.uid() = user_id);
 
--- Public policy for QR resolution (anyone can look up a QR by slug)
-CREATE POLICY "Anyone can view active QR by slug" ON qr_codes
-  FOR SELECT USING (is_active = true);
+-- No public read policy: scans are resolved server-side with the service
+-- role, and an anon SELECT would let anyone list every active code
+DROP POLICY IF EXISTS "Anyone can view active QR by slug" ON qr_codes;
 
 -- Index for fast slug lookups
 CREATE INDEX IF NOT EXISTS idx_qr_codes_slug ON qr_codes(slug);
-CREATE INDEX IF NOT EXISTS idx_qr_codes_user_id ON qr_codes(user_id);
+-- Keyset pagination for GET /api/qr: newest first, id breaks ties.
+-- Also serves plain user_id lookups, so the single-column index is dropped.
+CREATE INDEX IF NOT EXISTS idx_qr_codes_user_created ON qr_codes(user_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_qr_codes_user_id;
 
 -- =============================================
 -- 3. QR Events Table (Analytics)
@@ -126,9 +129,8 @@ CREATE POLICY "Users can view events for own QR codes" ON qr_events
     )
   );
 
--- Allow inserting events (for anonymous tracking)
-CREATE POLICY "Anyone can insert events" ON qr_events
-  FOR INSERT WITH CHECK (true);
+-- No insert policy: the API records events with the service role, after
+-- checking the code exists and filling in country and user agent itself
 
 -- Indexes
 CREATE INDEX IF NOT EXISTS idx_qr_events_qr_code_id ON qr_events(qr_code_id);
@@ -146,6 +148,43 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- Monthly scan totals per QR owner, read by the scan quota reconciler
+-- (lib/scan-quota.js) to enforce plan_limits.max_scans_per_month
+CREATE TABLE IF NOT EXISTS user_scan_usage (
+  user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+  month DATE NOT NULL,
+  scans BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, month)
+);
+
+-- Enable RLS
+ALTER TABLE user_scan_usage ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own scan usage" ON user_scan_usage
+  FOR SELECT USING (auth.uid() = user_id);
+
+-- Batched variant used by the write-behind scan counter (lib/scan-counter.js):
+-- applies many aggregated increments in one statement and adds them to the
+-- owners' monthly usage
+CREATE OR REPLACE FUNCTION increment_scan_counts(qr_slugs TEXT[], increments INTEGER[])
+RETURNS VOID AS $$
+BEGIN
+  WITH applied AS (
+    UPDATE qr_codes
+    SET scan_count = qr_codes.scan_count + batch.increment, updated_at = NOW()
+    FROM unnest(qr_slugs, increments) AS batch(slug, increment)
+    WHERE qr_codes.slug = batch.slug
+    RETURNING qr_codes.user_id, batch.increment
+  )
+  INSERT INTO user_scan_usage AS u (user_id, month, scans)
+  SELECT user_id, date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE, SUM(increment)
+  FROM applied
+  WHERE user_id IS NOT NULL
+  GROUP BY user_id
+  ON CONFLICT (user_id, month) DO UPDATE SET scans = u.scans + EXCLUDED.scans;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- =============================================
 -- 5. User Plans Table (Subscription Management)
 -- =============================================
@@ -295,6 +334,505 @@ ON CONFLICT (plan) DO UPDATE SET
   api_access = EXCLUDED.api_access,
   white_label = EXCLUDED.white_label;
 
+-- =============================================
+-- 10. Analytics rollups
+-- =============================================
+-- Hourly and daily event counts per QR code, maintained incrementally by a
+-- statement-level trigger on qr_events so analytics never scan raw events.
+-- Hourly buckets are kept for 7 days; daily buckets for the owner's plan
+-- analytics_retention_days (see prune_event_rollups).
+
+ALTER TABLE qr_events ADD COLUMN IF NOT EXISTS ua_family TEXT;
+
+CREATE TABLE IF NOT EXISTS qr_event_rollups_hourly (
+  qr_code_id UUID NOT NULL REFERENCES qr_codes(id) ON DELETE CASCADE,
+  bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+  event_type TEXT NOT NULL,
+  country TEXT NOT NULL DEFAULT '',
+  ua_family TEXT NOT NULL DEFAULT 'other',
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (qr_code_id, bucket, event_type, country, ua_family)
+);
+
+CREATE TABLE IF NOT EXISTS qr_event_rollups_daily (
+  qr_code_id UUID NOT NULL REFERENCES qr_codes(id) ON DELETE CASCADE,
+  bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+  event_type TEXT NOT NULL,
+  country TEXT NOT NULL DEFAULT '',
+  ua_family TEXT NOT NULL DEFAULT 'other',
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (qr_code_id, bucket, event_type, country, ua_family)
+);
+
+-- Enable RLS
+ALTER TABLE qr_event_rollups_hourly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE qr_event_rollups_daily ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view hourly rollups for own QR codes" ON qr_event_rollups_hourly
+  FOR SELECT USING (
+    EXISTS (
+      SELECT 1 FROM qr_codes
+      WHERE qr_codes.id = qr_event_rollups_hourly.qr_code_id
+      AND qr_codes.user_id = auth.uid()
+    )
+  );
+
+CREATE POLICY "Users can view daily rollups for own QR codes" ON qr_event_rollups_daily
+  FOR SELECT USING (
+    EXISTS (
+      SELECT 1 FROM qr_codes
+      WHERE qr_codes.id = qr_event_rollups_daily.qr_code_id
+      AND qr_codes.user_id = auth.uid()
+    )
+  );
+
+-- Indexes for retention pruning (lookups use the primary key prefix)
+CREATE INDEX IF NOT EXISTS idx_qr_event_rollups_hourly_bucket ON qr_event_rollups_hourly(bucket);
+CREATE INDEX IF NOT EXISTS idx_qr_event_rollups_daily_bucket ON qr_event_rollups_daily(bucket);
+
+-- One upsert per (qr, bucket, type, country, ua_family) per insert statement,
+-- so a multi-row batch from the ingestion queue costs two small upserts
+CREATE OR REPLACE FUNCTION rollup_qr_events()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO qr_event_rollups_hourly AS r (qr_code_id, bucket, event_type, country, ua_family, count)
+  SELECT qr_code_id, date_trunc('hour', created_at, 'UTC'), event_type,
+         COALESCE(country, ''), COALESCE(ua_family, 'other'), COUNT(*)
+  FROM new_events
+  GROUP BY 1, 2, 3, 4, 5
+  ON CONFLICT (qr_code_id, bucket, event_type, country, ua_family)
+  DO UPDATE SET count = r.count + EXCLUDED.count;
+
+  INSERT INTO qr_event_rollups_daily AS r (qr_code_id, bucket, event_type, country, ua_family, count)
+  SELECT qr_code_id, date_trunc('day', created_at, 'UTC'), event_type,
+         COALESCE(country, ''), COALESCE(ua_family, 'other'), COUNT(*)
+  FROM new_events
+  GROUP BY 1, 2, 3, 4, 5
+  ON CONFLICT (qr_code_id, bucket, event_type, country, ua_family)
+  DO UPDATE SET count = r.count + EXCLUDED.count;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS qr_events_rollup ON qr_events;
+CREATE TRIGGER qr_events_rollup
+  AFTER INSERT ON qr_events
+  REFERENCING NEW TABLE AS new_events
+  FOR EACH STATEMENT EXECUTE FUNCTION rollup_qr_events();
+
+-- Drop rollups that fall outside the owner's plan retention.
+-- Schedule daily, e.g. with pg_cron:
+--   SELECT cron.schedule('prune-event-rollups', '15 3 * * *', 'SELECT prune_event_rollups()');
+CREATE OR REPLACE FUNCTION prune_event_rollups()
+RETURNS VOID AS $$
+BEGIN
+  CREATE TEMP TABLE rollup_retention ON COMMIT DROP AS
+  SELECT q.id AS qr_code_id, l.analytics_retention_days AS days
+  FROM qr_codes q
+  JOIN plan_limits l ON l.plan = get_effective_plan(q.user_id);
+
+  DELETE FROM qr_event_rollups_hourly r
+  USING rollup_retention t
+  WHERE t.qr_code_id = r.qr_code_id
+    AND r.bucket < NOW() - make_interval(days => LEAST(t.days, 7));
+
+  DELETE FROM qr_event_rollups_daily r
+  USING rollup_retention t
+  WHERE t.qr_code_id = r.qr_code_id
+    AND r.bucket < NOW() - make_interval(days => t.days);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- =============================================
+-- 11. Slug allocation
+-- =============================================
+-- Slugs are derived from this counter (see lib/slug-sequence.js). Servers
+-- lease blocks of values, so there is one row update per block rather than
+-- per QR code, and no slug ever needs a uniqueness check before insert.
+CREATE TABLE IF NOT EXISTS qr_slug_counter (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  next_value BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO qr_slug_counter (id, next_value) VALUES (true, 0) ON CONFLICT DO NOTHING;
+
+-- No policies: the counter is only reachable through lease_slug_block
+ALTER TABLE qr_slug_counter ENABLE ROW LEVEL SECURITY;
+
+-- Reserve block_size counter values; returns the first one
+CREATE OR REPLACE FUNCTION lease_slug_block(block_size INTEGER)
+RETURNS BIGINT AS $$
+DECLARE
+  block_start BIGINT;
+BEGIN
+  IF block_size < 1 OR block_size > 100000 THEN
+    RAISE EXCEPTION 'block_size must be between 1 and 100000';
+  END IF;
+
+  UPDATE qr_slug_counter
+  SET next_value = next_value + block_size
+  WHERE id
+  RETURNING next_value - block_size INTO block_start;
+
+  RETURN block_start;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION lease_slug_block(INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- =============================================
+-- 12. Chain metadata cache
+-- =============================================
+-- Shared cache for the NFT/marketplace indexer (lib/nft-indexer.js): token
+-- metadata and listing state read from the chain, refreshed in the
+-- background after refresh_at. Written only by the service role.
+CREATE TABLE IF NOT EXISTS chain_metadata_cache (
+  key TEXT PRIMARY KEY,
+  value JSONB NOT NULL,
+  fetched_at TIMESTAMPTZ NOT NULL,
+  refresh_at TIMESTAMPTZ NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- No policies: only the service role reads and writes it
+ALTER TABLE chain_metadata_cache ENABLE ROW LEVEL SECURITY;
+
+-- =============================================
+-- 13. Stripe catalog for fiat QR codes
+-- =============================================
+-- Product/Price ids provisioned by lib/stripe-catalog.js, with the amount,
+-- currency and name they were created for:
+-- { productId, priceId, unitAmount, currency, name }
+ALTER TABLE qr_codes ADD COLUMN IF NOT EXISTS stripe_catalog JSONB;
+
+-- =============================================
+-- 14. Stripe webhook journal
+-- =============================================
+-- Every handled Stripe event, keyed by its id so redeliveries are ignored.
+-- lib/stripe-webhooks.js applies them to user_plans in the background and
+-- sets processed_at. Rows still unprocessed at next_attempt_at (a minute
+-- after arrival) are retried, backing off exponentially with each failed
+-- attempt. Written only by the service role.
+CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+  id TEXT PRIMARY KEY,
+  type TEXT NOT NULL,
+  customer_id TEXT,
+  event_created TIMESTAMPTZ NOT NULL,
+  received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  processed_at TIMESTAMPTZ,
+  last_error TEXT,
+  payload JSONB NOT NULL
+);
+
+ALTER TABLE stripe_webhook_events ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE stripe_webhook_events ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+-- The retry sweep only looks at unprocessed rows, soonest due first
+DROP INDEX IF EXISTS idx_stripe_webhook_events_pending;
+CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_due
+  ON stripe_webhook_events(next_attempt_at) WHERE processed_at IS NULL;
+
+-- Creation time of the newest subscription event applied to a plan; older
+-- events are not written over it (checked in the UPDATE itself)
+ALTER TABLE user_plans ADD COLUMN IF NOT EXISTS stripe_event_at TIMESTAMPTZ;
+
+-- No policies: only the service role reads and writes it
+ALTER TABLE stripe_webhook_events ENABLE ROW LEVEL SECURITY;
+
+-- =============================================
+-- 15. Partitioned analytics events
+-- =============================================
+-- qr_events is range-partitioned by UTC day on created_at (qr_events_YYYYMMDD)
+-- with a BRIN index on created_at. Retention never deletes rows one by one:
+-- once a day is older than a plan's analytics_retention_days, its partition
+-- is rewritten without the events of owners on that plan (once per plan
+-- tier it outlives), and it is dropped whole once it is older than every
+-- plan's retention. Rows for a day without a partition land in
+-- qr_events_default and are moved out when that day's partition is created.
+-- Schedule daily, e.g. with pg_cron:
+--   SELECT cron.schedule('maintain-qr-events', '30 3 * * *', 'CALL maintain_qr_event_partitions()');
+
+-- One row per daily partition; compacted_days is the largest plan retention
+-- whose events have already been removed from it
+CREATE TABLE IF NOT EXISTS qr_event_partitions (
+  day DATE PRIMARY KEY,
+  compacted_days INTEGER NOT NULL DEFAULT 0
+);
+
+-- No policies: only the maintenance functions read and write it
+ALTER TABLE qr_event_partitions ENABLE ROW LEVEL SECURITY;
+
+-- Create the daily partitions from from_day (default today) through
+-- days_ahead days from now; returns how many were created
+CREATE OR REPLACE FUNCTION ensure_qr_event_partitions(from_day DATE DEFAULT NULL, days_ahead INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+DECLARE
+  today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+  d DATE;
+  part TEXT;
+  lo TIMESTAMPTZ;
+  hi TIMESTAMPTZ;
+  created INTEGER := 0;
+BEGIN
+  FOR d IN
+    SELECT generate_series(COALESCE(from_day, today), today + days_ahead, INTERVAL '1 day')::date
+  LOOP
+    part := 'qr_events_' || to_char(d, 'YYYYMMDD');
+    CONTINUE WHEN to_regclass('public.' || part) IS NOT NULL;
+    lo := d::timestamp AT TIME ZONE 'UTC';
+    hi := (d + 1)::timestamp AT TIME ZONE 'UTC';
+
+    -- Build the partition detached, move in any rows the default partition
+    -- caught for this day, then attach it. The CHECK lets the attach skip
+    -- its validation scan.
+    EXECUTE format('CREATE TABLE %I (LIKE qr_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    EXECUTE format(
+      'WITH moved AS (DELETE FROM qr_events_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+      'INSERT INTO %I SELECT * FROM moved',
+      lo, hi, part);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at >= %L AND created_at < %L)',
+      part, part || '_bounds', lo, hi);
+    EXECUTE format('ALTER TABLE qr_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, part || '_bounds');
+    -- Partitions are only read through qr_events and its policies
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part);
+
+    INSERT INTO qr_event_partitions (day) VALUES (d) ON CONFLICT DO NOTHING;
+    created := created + 1;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Rewrite one day's partition keeping only the events of owners whose plan
+-- retention is longer than tier days (event_retention is built by
+-- maintain_qr_event_partitions). The copy runs under a SHARE lock on that
+-- day alone; qr_events itself is only locked for the detach/attach swap,
+-- and gives up after lock_timeout rather than queueing every insert behind
+-- it. Returns false if the day was skipped (it is retried on the next run).
+CREATE OR REPLACE FUNCTION compact_qr_event_partition(p_day DATE, tier INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+  part TEXT := 'qr_events_' || to_char(p_day, 'YYYYMMDD');
+  tmp TEXT := 'qr_events_' || to_char(p_day, 'YYYYMMDD') || '_compact';
+  lo TIMESTAMPTZ := p_day::timestamp AT TIME ZONE 'UTC';
+  hi TIMESTAMPTZ := (p_day + 1)::timestamp AT TIME ZONE 'UTC';
+BEGIN
+  PERFORM set_config('lock_timeout', '5s', true);
+
+  EXECUTE format('LOCK TABLE %I IN SHARE MODE', part);
+  EXECUTE format('CREATE TABLE %I (LIKE qr_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', tmp);
+  EXECUTE format(
+    'INSERT INTO %I SELECT e.* FROM %I e JOIN event_retention r ON r.qr_code_id = e.qr_code_id WHERE r.days > %s',
+    tmp, part, tier);
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at >= %L AND created_at < %L)',
+    tmp, tmp || '_bounds', lo, hi);
+  EXECUTE format('ALTER TABLE qr_events DETACH PARTITION %I', part);
+  EXECUTE format('DROP TABLE %I', part);
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', tmp, part);
+  EXECUTE format('ALTER TABLE qr_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+  EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, tmp || '_bounds');
+  EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part);
+
+  UPDATE qr_event_partitions SET compacted_days = tier WHERE day = p_day;
+  RETURN true;
+EXCEPTION WHEN lock_not_available THEN
+  RAISE NOTICE 'Skipping % for now: could not lock it within lock_timeout', part;
+  RETURN false;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Earlier versions defined maintain_qr_event_partitions as a function
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'maintain_qr_event_partitions' AND prokind = 'f') THEN
+    DROP FUNCTION maintain_qr_event_partitions();
+  END IF;
+END $$;
+
+-- Create the coming week's partitions and apply plan retention. A procedure
+-- so that every partition is dropped or rewritten in its own transaction:
+-- DROP and DETACH lock qr_events in ACCESS EXCLUSIVE mode until commit, so
+-- one transaction over many days would block all event inserts and reads
+-- for the whole run. Run it with CALL, outside a transaction block.
+-- (Procedures that COMMIT cannot be SECURITY DEFINER; compaction itself
+-- runs in compact_qr_event_partition.)
+CREATE OR REPLACE PROCEDURE maintain_qr_event_partitions()
+AS $$
+DECLARE
+  today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+  max_days INTEGER;
+  p RECORD;
+  have_retention BOOLEAN := false;
+BEGIN
+  PERFORM ensure_qr_event_partitions(today, 7);
+  COMMIT;
+  SELECT MAX(analytics_retention_days) INTO max_days FROM plan_limits;
+
+  -- Older than every plan's retention: drop the whole day
+  FOR p IN SELECT day FROM qr_event_partitions WHERE day < today - max_days ORDER BY day LOOP
+    EXECUTE format('DROP TABLE IF EXISTS %I', 'qr_events_' || to_char(p.day, 'YYYYMMDD'));
+    DELETE FROM qr_event_partitions WHERE day = p.day;
+    COMMIT;
+  END LOOP;
+
+  -- Older than some plans' retention: rewrite the day keeping only the
+  -- events of owners whose plan still covers it
+  FOR p IN
+    SELECT e.day, t.days AS tier
+    FROM qr_event_partitions e
+    CROSS JOIN LATERAL (
+      SELECT MAX(analytics_retention_days) AS days
+      FROM plan_limits
+      WHERE analytics_retention_days < today - e.day
+    ) t
+    WHERE t.days > e.compacted_days
+    ORDER BY e.day
+  LOOP
+    IF NOT have_retention THEN
+      -- One snapshot of every code's retention for the whole run
+      DROP TABLE IF EXISTS event_retention;
+      CREATE TEMP TABLE event_retention AS
+      SELECT q.id AS qr_code_id, l.analytics_retention_days AS days
+      FROM qr_codes q
+      JOIN plan_limits l ON l.plan = get_effective_plan(q.user_id);
+      CREATE INDEX ON event_retention(qr_code_id);
+      have_retention := true;
+    END IF;
+
+    PERFORM compact_qr_event_partition(p.day, p.tier);
+    COMMIT;
+  END LOOP;
+
+  DROP TABLE IF EXISTS event_retention;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION ensure_qr_event_partitions(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION compact_qr_event_partition(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON PROCEDURE maintain_qr_event_partitions() FROM PUBLIC, anon, authenticated;
+
+-- Convert the original heap table once. Events older than the longest plan
+-- retention are not carried over.
+DO $$
+DECLARE
+  oldest TIMESTAMPTZ;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'public.qr_events'::regclass) = 'p' THEN
+    RETURN;
+  END IF;
+
+  ALTER TABLE qr_events RENAME TO qr_events_legacy;
+  ALTER TABLE qr_events_legacy RENAME CONSTRAINT qr_events_pkey TO qr_events_legacy_pkey;
+
+  -- The partition key has to be part of the primary key
+  CREATE TABLE qr_events (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    qr_code_id UUID REFERENCES qr_codes(id) ON DELETE CASCADE,
+    event_type TEXT NOT NULL CHECK (event_type IN (
+      'scan',
+      'clicked',
+      'paid',
+      'minted',
+      'redirect'
+    )),
+    country TEXT,
+    user_agent TEXT,
+    ip_hash TEXT, -- Hashed IP for privacy
+    metadata JSONB DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    ua_family TEXT,
+    PRIMARY KEY (id, created_at)
+  ) PARTITION BY RANGE (created_at);
+
+  CREATE TABLE qr_events_default PARTITION OF qr_events DEFAULT;
+
+  -- Straight into the default partition, so the rollup trigger (already
+  -- applied to these rows) does not fire again
+  INSERT INTO qr_events_default (id, qr_code_id, event_type, country, user_agent, ip_hash, metadata, created_at, ua_family)
+  SELECT id, qr_code_id, event_type, country, user_agent, ip_hash, metadata, created_at, ua_family
+  FROM qr_events_legacy
+  WHERE created_at >= NOW() - make_interval(days => (SELECT MAX(analytics_retention_days) FROM plan_limits));
+
+  SELECT MIN(created_at) INTO oldest FROM qr_events_default;
+  PERFORM ensure_qr_event_partitions((COALESCE(oldest, NOW()) AT TIME ZONE 'UTC')::date, 7);
+
+  DROP TABLE qr_events_legacy;
+END;
+$$;
+
+ALTER TABLE qr_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE qr_events_default ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view events for own QR codes" ON qr_events;
+CREATE POLICY "Users can view events for own QR codes" ON qr_events
+  FOR SELECT USING (
+    EXISTS (
+      SELECT 1 FROM qr_codes
+      WHERE qr_codes.id = qr_events.qr_code_id
+      AND qr_codes.user_id = auth.uid()
+    )
+  );
+
+-- Inserts go through the API (service role) only
+DROP POLICY IF EXISTS "Anyone can insert events" ON qr_events;
+
+-- Rows arrive in created_at order, so a BRIN index stays a few pages per
+-- partition; per-code lookups are bounded by time as well
+DROP INDEX IF EXISTS idx_qr_events_created_at;
+DROP INDEX IF EXISTS idx_qr_events_qr_code_id;
+CREATE INDEX IF NOT EXISTS idx_qr_events_created_brin ON qr_events USING BRIN (created_at);
+CREATE INDEX IF NOT EXISTS idx_qr_events_qr_code_created ON qr_events(qr_code_id, created_at);
+
+DROP TRIGGER IF EXISTS qr_events_rollup ON qr_events;
+CREATE TRIGGER qr_events_rollup
+  AFTER INSERT ON qr_events
+  REFERENCING NEW TABLE AS new_events
+  FOR EACH STATEMENT EXECUTE FUNCTION rollup_qr_events();
+
+SELECT ensure_qr_event_partitions();
+
+-- =============================================
+-- 16. Event enrichment codes
+-- =============================================
+-- The API derives an event's country from the client address and reduces
+-- its User-Agent to device/OS/browser codes (lib/user-agent.js), so new rows
+-- leave user_agent and ua_family NULL. Codes index the lists in
+-- lib/user-agent.js; ua_browser_family mirrors UA_BROWSERS.
+ALTER TABLE qr_events ADD COLUMN IF NOT EXISTS ua_device SMALLINT;
+ALTER TABLE qr_events ADD COLUMN IF NOT EXISTS ua_os SMALLINT;
+ALTER TABLE qr_events ADD COLUMN IF NOT EXISTS ua_browser SMALLINT;
+
+CREATE OR REPLACE FUNCTION ua_browser_family(code SMALLINT)
+RETURNS TEXT AS $$
+  SELECT (ARRAY['other', 'chrome', 'safari', 'firefox', 'edge', 'samsung', 'bot'])[code + 1];
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Rollups keep grouping by browser family name
+CREATE OR REPLACE FUNCTION rollup_qr_events()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO qr_event_rollups_hourly AS r (qr_code_id, bucket, event_type, country, ua_family, count)
+  SELECT qr_code_id, date_trunc('hour', created_at, 'UTC'), event_type,
+         COALESCE(country, ''), COALESCE(ua_family, ua_browser_family(ua_browser), 'other'), COUNT(*)
+  FROM new_events
+  GROUP BY 1, 2, 3, 4, 5
+  ON CONFLICT (qr_code_id, bucket, event_type, country, ua_family)
+  DO UPDATE SET count = r.count + EXCLUDED.count;
+
+  INSERT INTO qr_event_rollups_daily AS r (qr_code_id, bucket, event_type, country, ua_family, count)
+  SELECT qr_code_id, date_trunc('day', created_at, 'UTC'), event_type,
+         COALESCE(country, ''), COALESCE(ua_family, ua_browser_family(ua_browser), 'other'), COUNT(*)
+  FROM new_events
+  GROUP BY 1, 2, 3, 4, 5
+  ON CONFLICT (qr_code_id, bucket, event_type, country, ua_family)
+  DO UPDATE SET count = r.count + EXCLUDED.count;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- =============================================
 -- Done! Your NovaTok QR Hub database is ready.
 -- =============================================